@@ -0,0 +1,65 @@
+"""
+Benchmark: raw RGBC → calibrated RGB transform.
+
+    python -m benchmarks.calibration [--samples 64] [--repeat 2000]
+
+比較逐步的 normalize → remove_clear_channel → calibrate_rgb 流程與預先計算的
+Calibration.apply() (單筆) / apply_batch() (N×4)，並確認三者結果一致。
+"""
+
+import argparse
+import json
+import timeit
+
+import numpy as np
+
+from hw_agent.services.calibration import (
+    calibrate_rgb,
+    get_calibration,
+    normalize,
+    remove_clear_channel,
+)
+
+
+def _pipeline(raw) -> np.ndarray:
+    return np.clip(calibrate_rgb(remove_clear_channel(normalize(raw))), 0, 255)
+
+
+def run(samples: int, repeat: int) -> dict:
+    rng = np.random.default_rng(0)
+    raws = np.column_stack(
+        [rng.uniform(0, 40000, (samples, 3)), rng.uniform(2000, 45000, samples)]
+    )
+    rows = raws.tolist()
+    cal = get_calibration()
+    out = np.empty((samples, 3))
+
+    expected = np.array([_pipeline(r) for r in raws])
+    max_diff = max(
+        float(np.abs(np.array([cal.apply(r) for r in rows]) - expected).max()),
+        float(np.abs(cal.apply_batch(raws) - expected).max()),
+    )
+
+    def per_sample(fn) -> float:
+        return timeit.timeit(lambda: fn(rows[0]), number=repeat) / repeat * 1e6
+
+    batch_us = timeit.timeit(lambda: cal.apply_batch(raws, out), number=repeat)
+    return {
+        "samples": samples,
+        "pipeline_us_per_sample": per_sample(_pipeline),
+        "apply_us_per_sample": per_sample(cal.apply),
+        "apply_batch_us_per_sample": batch_us / repeat / samples * 1e6,
+        "max_abs_diff": max_diff,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.samples, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
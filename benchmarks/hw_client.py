@@ -0,0 +1,147 @@
+"""
+Benchmark: concurrent agent reads through hw_client vs. a plain AsyncClient.
+
+    python -m benchmarks.hw_client [--subscribers 16] [--rounds 50] [--interval 0.02]
+
+在同一個 process 以 uvicorn 於本機 port 啟動模擬 agent (HW_BACKEND=sim，走真正的
+TCP 連線)，讓 --subscribers 個呼叫者各以約 --interval 秒的間隔 (隨機錯開)
+讀取 --rounds 次 /color：
+
+- baseline：預設設定的 httpx.AsyncClient，每個呼叫各自送出請求
+- single_flight：hw_client.get_color()，停用 TTL 快取 (只合併進行中的請求)
+- hw_client：hw_client.get_color()，使用 settings.hw_client_cache_ttls
+
+比較 agent 實際收到的請求數、每次呼叫的延遲 (p50 / p99) 與總時間。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import time
+from collections import Counter
+from typing import Awaitable, Callable, List
+
+# 必須在匯入 core / hw_agent 之前設定
+os.environ.setdefault("HW_BACKEND", "sim")
+os.environ.setdefault("CORE_BASE_URL", "http://core")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _CountingApp:
+    """ASGI wrapper counting the HTTP requests the agent receives, by path."""
+
+    def __init__(self, app):
+        self.app = app
+        self.counts: Counter = Counter()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.counts[scope["path"]] += 1
+        await self.app(scope, receive, send)
+
+
+async def _load(
+    agent: _CountingApp,
+    read: Callable[[], Awaitable],
+    subscribers: int,
+    rounds: int,
+    interval: float,
+) -> dict:
+    latencies: List[float] = []
+
+    async def subscriber() -> None:
+        for _ in range(rounds):
+            await asyncio.sleep(random.uniform(0.5, 1.5) * interval)
+            started = time.perf_counter()
+            await read()
+            latencies.append(time.perf_counter() - started)
+
+    before = agent.counts["/color"]
+    started = time.perf_counter()
+    await asyncio.gather(*(subscriber() for _ in range(subscribers)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "agent_requests": agent.counts["/color"] - before,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p99_ms": latencies[int(0.99 * (len(latencies) - 1))] * 1e3,
+        "wall_time": wall,
+    }
+
+
+async def run(subscribers: int, rounds: int, interval: float) -> dict:
+    import httpx
+    import uvicorn
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    os.environ["HW_AGENT_BASE_URL"] = base_url
+
+    from core.config import settings
+    from core.services import hw_client
+    from hw_agent.main import app as agent_app
+
+    agent = _CountingApp(agent_app)
+    server = uvicorn.Server(
+        uvicorn.Config(agent, port=port, log_level="warning", lifespan="on")
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        async with httpx.AsyncClient(base_url=base_url) as plain:
+
+            async def baseline_read():
+                response = await plain.get("/color")
+                response.raise_for_status()
+                return response.json()
+
+            await baseline_read()  # 暖機
+            baseline = await _load(agent, baseline_read, subscribers, rounds, interval)
+
+        results = {}
+        ttls = dict(settings.hw_client_cache_ttls)
+        for name, mode_ttls in (("single_flight", {}), ("hw_client", ttls)):
+            settings.hw_client_cache_ttls = mode_ttls
+            hw_client._stats.clear()
+            await hw_client.get_color()
+            results[name] = await _load(
+                agent, hw_client.get_color, subscribers, rounds, interval
+            )
+            results[name]["cache"] = hw_client.cache_stats()["/color"]
+            await hw_client.close_client()
+        settings.hw_client_cache_ttls = ttls
+    finally:
+        server.should_exit = True
+        await serving
+    return {
+        "subscribers": subscribers,
+        "rounds": rounds,
+        "interval": interval,
+        "baseline": baseline,
+        **results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.02)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.subscribers, args.rounds, args.interval))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
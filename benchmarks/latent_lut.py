@@ -0,0 +1,73 @@
+"""
+Benchmark: sRGB → latent via mixbox vs. the precomputed lookup table.
+
+    python -m benchmarks.latent_lut [--samples 100000] [--size 64]
+
+量測逐筆與批次吞吐量，以及查表相對 mixbox.rgb_to_latent 的誤差。
+"""
+
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("HW_AGENT_BASE_URL", "http://localhost:9000")
+os.environ.setdefault("CORE_BASE_URL", "http://localhost:8000")
+
+import mixbox
+import numpy as np
+
+from core.config import settings
+from core.services import latent_lut
+
+
+def _rate(fn, n: int) -> float:
+    start = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=100_000)
+    parser.add_argument("--size", type=int, default=settings.latent_lut_size)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings.latent_lut_size = args.size
+    start = time.perf_counter()
+    latent_lut.get_lut()
+    load_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(args.seed)
+    colors = rng.integers(0, 256, size=(args.samples, 3))
+    as_tuples = [tuple(c) for c in colors.tolist()]
+    per_call_n = min(args.samples, 20_000)
+
+    exact = np.array([mixbox.rgb_to_latent(c) for c in as_tuples])
+    approx = latent_lut.lookup(colors)
+    err = np.abs(approx - exact)
+
+    result = {
+        "lut_size": args.size,
+        "samples": args.samples,
+        "load_or_build_s": load_s,
+        "mixbox_per_call_per_s": _rate(
+            lambda: [mixbox.rgb_to_latent(c) for c in as_tuples[:per_call_n]],
+            per_call_n,
+        ),
+        "lut_per_call_per_s": _rate(
+            lambda: [latent_lut.lookup(c) for c in as_tuples[:per_call_n]],
+            per_call_n,
+        ),
+        "lut_batch_per_s": _rate(lambda: latent_lut.lookup(colors), args.samples),
+        "max_abs_error": float(err.max()),
+        "mean_abs_error": float(err.mean()),
+        "max_abs_error_per_dim": err.max(axis=0).tolist(),
+        "max_l2_error": float(np.linalg.norm(approx - exact, axis=1).max()),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
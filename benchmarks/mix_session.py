@@ -0,0 +1,164 @@
+"""
+End-to-end benchmark: core `/mix` sessions against an in-process simulated agent.
+
+    python -m benchmarks.mix_session [--speedup 20] [--corpus targets.json]
+                                     [--output bench.json]
+
+core 與 hw_agent (HW_BACKEND=sim) 跑在同一個 process，透過 httpx 的
+ASGITransport 互相呼叫 (不需開 port)。對 corpus 中的每個目標色：清空模擬杯、
+呼叫 core POST /mix、等待 session 結束，再從 app.state.last_mix_report 取出
+每輪各階段耗時、收斂所需輪數 (iterations = 量測次數，corrections = 初始配方
+之後的追加次數)、追加後誤差反而變大的次數 (overshoots) 與總時間，結果以
+JSON 輸出以便比較不同版本。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# 必須在匯入 core / hw_agent 之前設定
+os.environ.setdefault("HW_BACKEND", "sim")
+os.environ.setdefault("HW_AGENT_BASE_URL", "http://agent")
+os.environ.setdefault("CORE_BASE_URL", "http://core")
+os.environ.setdefault("TELEMETRY_DIR", tempfile.mkdtemp(prefix="bench_telemetry"))
+
+DEFAULT_CORPUS: List[List[int]] = [
+    [120, 60, 90],
+    [200, 120, 60],
+    [90, 140, 160],
+    [180, 180, 170],
+    [60, 60, 70],
+    [210, 90, 120],
+    [150, 170, 80],
+    [100, 110, 180],
+]
+
+PHASES = ["palette_fetch", "latent", "nnls", "dose", "status_wait", "sensor_read"]
+
+
+def _summarize(sessions: List[dict]) -> dict:
+    n = len(sessions) or 1
+    phase_totals = {p: 0.0 for p in PHASES}
+    for s in sessions:
+        for p, v in s["phases"].items():
+            phase_totals[p] = phase_totals.get(p, 0.0) + v
+    return {
+        "sessions": len(sessions),
+        "converged": sum(s["converged"] for s in sessions),
+        "mean_iterations": sum(s["iterations"] for s in sessions) / n,
+        "mean_corrections": sum(s["corrections"] for s in sessions) / n,
+        "mean_wall_time": sum(s["wall_time"] for s in sessions) / n,
+        "mean_initial_error": sum(s["errors"][0] for s in sessions if s["errors"]) / n,
+        "mean_final_error": sum(s["final_error"] or 0.0 for s in sessions) / n,
+        "mean_overshoots": sum(s["overshoots"] for s in sessions) / n,
+        "mean_total_volume": sum(s["total_volume"] for s in sessions) / n,
+        "mean_phase_time": {p: v / n for p, v in phase_totals.items()},
+    }
+
+
+async def run(corpus: List[List[int]]) -> dict:
+    import httpx
+
+    from core.main import app as core_app
+    from core.services import hw_client
+    from hw_agent.main import app as agent_app
+
+    hw_client._client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=agent_app), base_url="http://agent"
+    )
+    sessions = []
+    async with agent_app.router.lifespan_context(agent_app):
+        async with core_app.router.lifespan_context(core_app):
+            agent = hw_client._client
+            core = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=core_app), base_url="http://core"
+            )
+            for target in corpus:
+                await agent.post("/sim/reset")
+                started = time.perf_counter()
+                response = await core.post("/mix", json={"target": target})
+                response.raise_for_status()
+                task = core_app.state.current_mix_task
+                while core_app.state.status_state not in ("finished", "error"):
+                    if task.done():
+                        break
+                    await asyncio.sleep(0.01)
+                wall_time = time.perf_counter() - started
+                await task  # 等待 core 結束 3 秒的 finished 停留
+
+                report = core_app.state.last_mix_report
+                iterations = report["iterations"]
+                phases = dict(report["setup"])
+                for it in iterations:
+                    for p, v in it["timings"].items():
+                        phases[p] = phases.get(p, 0.0) + v
+                state = (await agent.get("/sim/state")).json()
+                sessions.append(
+                    {
+                        "target": target,
+                        "state": report["state"],
+                        "converged": report["converged"],
+                        "iterations": len(iterations),
+                        "corrections": sum(bool(it["recipe"]) for it in iterations),
+                        "wall_time": wall_time,
+                        "final_rgb": iterations[-1]["rgb"] if iterations else None,
+                        "final_error": iterations[-1]["error"] if iterations else None,
+                        "errors": [it["error"] for it in iterations],
+                        "overshoots": sum(
+                            b["error"] > a["error"]
+                            for a, b in zip(iterations, iterations[1:])
+                        ),
+                        "total_volume": sum(state["dispensed"].values()),
+                        "phases": phases,
+                        "per_iteration": [it["timings"] for it in iterations],
+                    }
+                )
+                print(
+                    f"{target}: {len(iterations)} measurements, "
+                    f"{wall_time:.2f} s, converged={report['converged']}"
+                )
+            await core.aclose()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sim_speedup": float(os.environ["SIM_SPEEDUP"]),
+            "controller": os.environ["MIX_CONTROLLER"],
+        },
+        "summary": _summarize(sessions),
+        "sessions": sessions,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--speedup", type=float, default=20.0)
+    parser.add_argument(
+        "--controller", choices=["iterative", "predictive"], default="iterative"
+    )
+    parser.add_argument("--corpus", type=Path, help="JSON list of [R, G, B] targets")
+    parser.add_argument("--output", type=Path, help="write results to this file")
+    args = parser.parse_args()
+
+    os.environ["SIM_SPEEDUP"] = str(args.speedup)
+    os.environ["MIX_CONTROLLER"] = args.controller
+    corpus = json.loads(args.corpus.read_text()) if args.corpus else DEFAULT_CORPUS
+    result = asyncio.run(run(corpus))
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(text)
+        print(json.dumps(result["summary"], indent=2))
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
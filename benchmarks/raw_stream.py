@@ -0,0 +1,137 @@
+"""
+Benchmark: binary raw RGBC frame stream vs. polling the JSON GET /color.
+
+    python -m benchmarks.raw_stream [--seconds 3] [--speedup 10] [--repeat 20000]
+
+1. 解碼成本 (µs / 讀值)：JSON 讀值 (json.loads + core 的 RGBColorArray 驗證)
+   與 raw_stream.decode() (np.frombuffer，單一 frame 與 32 個 frame 一批)。
+2. 端對端：在同一個 process 以 uvicorn 於本機 port 啟動模擬 agent (感測器
+   integration time 依 --speedup 縮短)，各跑 --seconds 秒：
+   - poll：httpx 依序輪詢 GET /color
+   - stream：core.services.raw_stream.RawStream 接收 /ws/raw
+   比較每秒的請求數與不重複讀值數 (/color 在兩個 frame 之間回傳相同的中位數)、
+   每個讀值的傳輸 bytes 與遺漏的 frame。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+import timeit
+
+# 必須在匯入 core / hw_agent 之前設定
+os.environ.setdefault("HW_BACKEND", "sim")
+os.environ.setdefault("HW_AGENT_BASE_URL", "http://agent")
+os.environ.setdefault("CORE_BASE_URL", "http://core")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def decode_costs(repeat: int) -> dict:
+    import numpy as np
+
+    from core.models import RGBColorArray
+    from core.services.raw_stream import FRAME_DTYPE, decode
+
+    body = json.dumps([182, 188, 152]).encode()
+    frame = np.zeros(1, FRAME_DTYPE)
+    frame[0] = (1234, time.time(), (4282, 5383, 4276, 14719))
+    one = frame.tobytes()
+    batch = np.repeat(frame, 32).tobytes()
+
+    def us(fn, per: int = 1) -> float:
+        return timeit.timeit(fn, number=repeat) / repeat / per * 1e6
+
+    return {
+        "json_us": us(lambda: RGBColorArray.model_validate(json.loads(body))),
+        "binary_us": us(lambda: decode(one)),
+        "binary_batch32_us": us(lambda: decode(batch), per=32),
+        "json_body_bytes": len(body),
+        "frame_bytes": len(one),
+    }
+
+
+async def end_to_end(seconds: float) -> dict:
+    import httpx
+    import uvicorn
+
+    from core.services.raw_stream import RawStream
+    from hw_agent.drivers import colorsensor
+    from hw_agent.main import app as agent_app
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(
+        uvicorn.Config(agent_app, port=port, log_level="warning", lifespan="on")
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        # poll：依序輪詢 JSON /color，計算回應內容 (含 headers) 與讀值數
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            await client.get("/color")
+            polls, poll_bytes, changes, last = 0, 0, 0, None
+            seq_start = colorsensor.latestFrame()[0]
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                response = await client.get("/color")
+                polls += 1
+                changes += response.content != last
+                last = response.content
+                poll_bytes += len(response.content) + sum(
+                    len(k) + len(v) + 4 for k, v in response.headers.raw
+                )
+            produced = colorsensor.latestFrame()[0] - seq_start
+
+        stream = RawStream(base_url, capacity=4096)
+        stream.start()
+        await stream.wait(5.0)
+        start = stream.stats()
+        await asyncio.sleep(seconds)
+        end = stream.stats()
+        await stream.close()
+    finally:
+        server.should_exit = True
+        await serving
+
+    frames = end["frames"] - start["frames"]
+    return {
+        "sensor_rate_hz": produced / seconds,
+        "poll": {
+            "requests_per_s": polls / seconds,
+            "distinct_readings_per_s": changes / seconds,
+            "bytes_per_reading": poll_bytes / max(polls, 1),
+        },
+        "stream": {
+            "frames_per_s": frames / seconds,
+            "messages": end["messages"] - start["messages"],
+            "bytes_per_frame": (end["bytes"] - start["bytes"]) / max(frames, 1),
+            "missed": end["missed"] - start["missed"],
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--speedup", type=float, default=10.0)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+    os.environ["SIM_SPEEDUP"] = str(args.speedup)
+
+    result = {
+        "decode": decode_costs(args.repeat),
+        "end_to_end": asyncio.run(end_to_end(args.seconds)),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: mix sessions with and without the learned initial-recipe correction.
+
+    python -m benchmarks.recipe_model [--train 48] [--test 16] [--flow-spread 0.25]
+                                      [--speedup 50] [--output bench.json]
+
+模擬「實機與模型不一致」的情況：各 pump 流量依 SIM_FLOW_SPREAD 偏離名目值，
+且不做 pump 校正。先以 --train 個目標色 (palette 顏料的隨機混合，保證可達成)
+跑混色並記錄 telemetry，以此訓練 core/services/recipe_model.py，再對另外
+--test 個目標色分別在停用 / 啟用模型下各跑一次，比較平均量測次數、追加次數、
+初始誤差與 overshoot。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+_tmp = tempfile.mkdtemp(prefix="bench_recipe_model")
+# 必須在匯入 core / hw_agent 之前設定
+os.environ.setdefault("TELEMETRY_DIR", os.path.join(_tmp, "telemetry"))
+os.environ.setdefault("RECIPE_MODEL_PATH", os.path.join(_tmp, "recipe_model.npz"))
+os.environ.setdefault("PUMP_CALIBRATION_PATH", os.path.join(_tmp, "pumps.json"))
+os.environ.setdefault("JOB_DB_PATH", os.path.join(_tmp, "jobs.sqlite3"))
+
+from benchmarks.mix_session import run as run_sessions
+
+SUMMARY_KEYS = (
+    "converged",
+    "mean_iterations",
+    "mean_corrections",
+    "mean_initial_error",
+    "mean_final_error",
+    "mean_overshoots",
+    "mean_total_volume",
+)
+
+
+def make_corpus(n: int, seed: int) -> List[List[int]]:
+    """Random reachable targets: mixbox mixes of 2–3 palette paints."""
+    import mixbox
+    import numpy as np
+
+    from hw_agent.services.palette import get_palette
+
+    rng = random.Random(seed)
+    palette = get_palette()
+    corpus = []
+    for _ in range(n):
+        paints = rng.sample(palette, rng.randint(2, 3))
+        weights = np.array([rng.uniform(0.2, 1.0) for _ in paints])
+        latent = sum(
+            w / weights.sum() * np.array(mixbox.rgb_to_latent(p["rgb"]))
+            for w, p in zip(weights, paints)
+        )
+        corpus.append([int(c) for c in mixbox.latent_to_rgb(latent)])
+    return corpus
+
+
+def _summary(result: dict) -> dict:
+    return {k: result["summary"][k] for k in SUMMARY_KEYS}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--train", type=int, default=48)
+    parser.add_argument("--test", type=int, default=16)
+    parser.add_argument("--flow-spread", type=float, default=0.25)
+    parser.add_argument("--speedup", type=float, default=50.0)
+    parser.add_argument(
+        "--controller", choices=["iterative", "predictive"], default="iterative"
+    )
+    parser.add_argument("--output", type=Path, help="write results to this file")
+    args = parser.parse_args()
+
+    os.environ["SIM_SPEEDUP"] = str(args.speedup)
+    os.environ["SIM_FLOW_SPREAD"] = str(args.flow_spread)
+    os.environ["MIX_CONTROLLER"] = args.controller
+
+    from core.config import settings
+    from core.services import palette_cache, recipe_model
+    from hw_agent.services.palette import get_palette
+
+    settings.use_recipe_model = False
+    train_result = asyncio.run(run_sessions(make_corpus(args.train, seed=1)))
+
+    palette, palette_latent = palette_cache.get_palette_latent(get_palette())
+    started = time.perf_counter()
+    model = recipe_model.train(palette, palette_latent)
+    train_time = time.perf_counter() - started
+    recipe_model.set_model(model)
+    print(f"Trained recipe model: {model.info()}")
+
+    test_corpus = make_corpus(args.test, seed=2)
+    baseline = asyncio.run(run_sessions(test_corpus))
+    settings.use_recipe_model = True
+    corrected = asyncio.run(run_sessions(test_corpus))
+
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "controller": args.controller,
+            "sim_flow_spread": args.flow_spread,
+            "sim_speedup": args.speedup,
+        },
+        "model": {**model.info(), "train_time": train_time},
+        "train": _summary(train_result),
+        "nnls": _summary(baseline),
+        "learned": _summary(corrected),
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
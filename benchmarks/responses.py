@@ -0,0 +1,127 @@
+"""
+Benchmark: hot read endpoints with and without FAST_RESPONSES.
+
+    python -m benchmarks.responses [--requests 5000]
+
+直接以 ASGI 介面呼叫 core 與 hw_agent (HW_BACKEND=sim) 的 GET /color、
+GET /status (不經網路與 HTTP client，只量測伺服器端的處理成本)，以及 core
+/ws/color 每則訊息的傳送 (WebSocket 的 send 為空操作)，分別在預設模式
+(response_model 驗證 + 標準庫 json) 與 fast 模式 (fast_json) 下計算
+每秒可處理的請求 / 訊息數。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+# 必須在匯入 core / hw_agent 之前設定
+os.environ.setdefault("HW_BACKEND", "sim")
+os.environ.setdefault("HW_AGENT_BASE_URL", "http://agent")
+os.environ.setdefault("CORE_BASE_URL", "http://core")
+_tmp = tempfile.mkdtemp(prefix="bench_responses")
+os.environ.setdefault("TELEMETRY_DIR", os.path.join(_tmp, "telemetry"))
+os.environ.setdefault("JOB_DB_PATH", os.path.join(_tmp, "jobs.sqlite3"))
+
+
+async def _get(app, path: str, n: int) -> float:
+    """Requests per second of GET `path` called directly on the ASGI app."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(dict(scope), receive, send)  # 暖機 (建立 middleware stack)
+    started = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    elapsed = time.perf_counter() - started
+    if set(status) != {200}:
+        raise RuntimeError(f"GET {path} returned {set(status)}")
+    return n / elapsed
+
+
+async def _ws_send(n: int) -> float:
+    """Messages per second of core's /ws/color send path."""
+    from starlette.websockets import WebSocket
+
+    from core.main import _send_json
+
+    async def receive():
+        return {"type": "websocket.connect"}
+
+    async def send(message):
+        pass
+
+    ws = WebSocket({"type": "websocket", "path": "/ws/color"}, receive, send)
+    await ws.accept()
+    payload = [182, 188, 152]
+    started = time.perf_counter()
+    for _ in range(n):
+        await _send_json(ws, payload)
+    return n / (time.perf_counter() - started)
+
+
+async def run(n: int) -> dict:
+    import fast_json
+    from core.config import settings as core_settings
+    from core.main import app as core_app
+    from core.services.sampler import sensor_sampler
+    from hw_agent.config import settings as agent_settings
+    from hw_agent.main import app as agent_app
+
+    results = {}
+    async with agent_app.router.lifespan_context(agent_app):
+        async with core_app.router.lifespan_context(core_app):
+            # core /color 直接使用 sampler 的最新讀值，不向 agent 讀取
+            core_settings.sensor_max_age = float("inf")
+            sensor_sampler._latest = [120, 130, 90]
+            sensor_sampler._latest_at = asyncio.get_running_loop().time()
+            await asyncio.sleep(0.2)  # 等 agent 的 ring buffer 填入樣本
+
+            for mode, fast in (("default", False), ("fast", True)):
+                core_settings.fast_responses = fast
+                agent_settings.fast_responses = fast
+                results[mode] = {
+                    "core_color_rps": await _get(core_app, "/color", n),
+                    "core_status_rps": await _get(core_app, "/status", n),
+                    "agent_color_rps": await _get(agent_app, "/color", n),
+                    "agent_status_rps": await _get(agent_app, "/status", n),
+                    "ws_color_msgs_per_s": await _ws_send(n * 10),
+                }
+    results["speedup"] = {
+        k: results["fast"][k] / results["default"][k] for k in results["default"]
+    }
+    results["orjson"] = fast_json.ORJSON
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark: job throughput of the multi-station scheduler vs. number of stations.
+
+    python -m benchmarks.scheduler [--stations 1 2 4] [--jobs 8] [--speedup 20]
+                                   [--output bench.json]
+
+對每個工作站數 N，以 uvicorn 啟動 N 個模擬 agent (HW_BACKEND=sim) 子行程，
+建立一個 N 站的 Scheduler，一次提交 --jobs 個混色工作 (輪流使用預設目標色)，
+量測全部完成所需時間與每分鐘完成數。每個工作開始前會清空該站的模擬杯
+(相當於換杯)。工作站之間互不共用狀態，理想上吞吐量應隨 N 線性成長
+(speedup_vs_1 ≈ N)。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# 必須在匯入 core 之前設定
+os.environ.setdefault("HW_AGENT_BASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("CORE_BASE_URL", "http://core")
+os.environ.setdefault(
+    "JOB_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench_jobs.sqlite3")
+)
+os.environ.setdefault("TELEMETRY_DIR", tempfile.mkdtemp(prefix="bench_telemetry"))
+
+from benchmarks.mix_session import DEFAULT_CORPUS
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while True:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Agent at {url} did not start")
+            await asyncio.sleep(0.2)
+
+
+async def run_pool(stations: int, jobs: int, speedup: float) -> dict:
+    import httpx
+
+    from core.main import app as core_app
+    from core.services import hw_client
+    from core.services.scheduler import FINAL_STATES, Scheduler
+
+    class SimScheduler(Scheduler):
+        async def _execute(self, station, job):
+            async with httpx.AsyncClient(base_url=station.base_url) as client:
+                await client.post("/sim/reset")  # 換杯
+            await super()._execute(station, job)
+
+    env = dict(os.environ, HW_BACKEND="sim", SIM_SPEEDUP=str(speedup))
+    urls, procs = [], []
+    for _ in range(stations):
+        port = _free_port()
+        urls.append(f"http://127.0.0.1:{port}")
+        procs.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "hw_agent.main:app"]
+                + ["--port", str(port), "--log-level", "warning"],
+                env=env,
+                stdout=subprocess.DEVNULL,
+            )
+        )
+    try:
+        await asyncio.gather(*(_wait_ready(url) for url in urls))
+        scheduler = SimScheduler({f"s{i}": url for i, url in enumerate(urls)})
+        await scheduler.start(core_app)
+
+        started = time.perf_counter()
+        submitted = [
+            await scheduler.submit(
+                DEFAULT_CORPUS[i % len(DEFAULT_CORPUS)], client=f"c{i % 3}"
+            )
+            for i in range(jobs)
+        ]
+        while not all(job.status_state in FINAL_STATES for job in submitted):
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        await scheduler.stop()
+        await hw_client.close_client()
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+    per_station = {s.name: s.completed for s in scheduler.stations}
+    return {
+        "stations": stations,
+        "jobs": jobs,
+        "finished": sum(j.status_state == "finished" for j in submitted),
+        "elapsed": elapsed,
+        "jobs_per_min": jobs / elapsed * 60,
+        "jobs_per_station": per_station,
+    }
+
+
+async def run(station_counts: List[int], jobs: int, speedup: float) -> dict:
+    results = []
+    for n in station_counts:
+        result = await run_pool(n, jobs, speedup)
+        print(f"{n} station(s): {result['elapsed']:.2f} s for {jobs} jobs")
+        results.append(result)
+    base = results[0]["jobs_per_min"] / results[0]["stations"]
+    for r in results:
+        r["speedup_vs_1"] = r["jobs_per_min"] / base
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sim_speedup": speedup,
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--speedup", type=float, default=20.0)
+    parser.add_argument("--output", type=Path, help="write results to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.stations, args.jobs, args.speedup))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark: agent color reads and event-loop responsiveness on the simulated sensor.
+
+    HW_BACKEND=sim python -m benchmarks.sensor_read [--requests 200]
+
+量測 color_service.getColor() 的延遲，以及感測器讀取期間 event loop 的最大延遲
+(若感測器 I/O 跑在 event loop 上，這個數字會接近一個 integration time)。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("HW_BACKEND", "sim")
+
+import numpy as np
+
+from hw_agent.services import color as color_service
+
+
+async def _loop_lag(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def run(requests: int) -> dict:
+    color_service.start_sampling()
+    await color_service.getColor()  # 等待第一筆讀值
+
+    stop, lags = asyncio.Event(), []
+    lag_task = asyncio.create_task(_loop_lag(stop, lags))
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        t = time.perf_counter()
+        await color_service.getColor()
+        latencies.append(time.perf_counter() - t)
+        await asyncio.sleep(0)
+    wall = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    await color_service.stop_sampling()
+
+    lat = np.array(latencies) * 1e3
+    return {
+        "requests": requests,
+        "requests_per_s": requests / wall,
+        "latency_ms_p50": float(np.percentile(lat, 50)),
+        "latency_ms_p99": float(np.percentile(lat, 99)),
+        "loop_lag_ms_max": float(max(lags) * 1e3) if lags else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: change-only /ws/status (deltas + heartbeat) latency and bandwidth.
+
+    python -m benchmarks.ws_status [--clients 16] [--changes 50] [--interval 0.05]
+
+在同一個 process 以 uvicorn 於本機 port 啟動 core，--clients 個 WebSocket
+客戶端訂閱 /ws/status，以 mix._set_state() 每 --interval 秒變更一次狀態，
+共 --changes 次，量測：
+- 變更到各客戶端收到 delta 的延遲 (p50 / p99 / max, ms) 與是否有遺漏的版本
+- 每個客戶端收到的 bytes，以及舊版 (每秒推送一份完整狀態) 在相同時間內的
+  bytes 估算 (完整 payload 大小 × 秒數)；舊版的平均延遲約為推送週期的一半 (500 ms)
+- 斷線後以 ?since= 重新連線時補送的 delta 數
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import tempfile
+import time
+
+# 必須在匯入 core 之前設定
+os.environ.setdefault("HW_AGENT_BASE_URL", "http://agent")
+os.environ.setdefault("CORE_BASE_URL", "http://core")
+_tmp = tempfile.mkdtemp(prefix="bench_ws_status")
+os.environ.setdefault("TELEMETRY_DIR", os.path.join(_tmp, "telemetry"))
+os.environ.setdefault("JOB_DB_PATH", os.path.join(_tmp, "jobs.sqlite3"))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _subscribe(url: str, received: list, done: asyncio.Event) -> int:
+    """Collect (perf_counter, message) until `done`; return the bytes received."""
+    from websockets.asyncio.client import connect
+
+    total = 0
+    async with connect(url) as ws:
+        while not done.is_set():
+            try:
+                message = await asyncio.wait_for(ws.recv(), 0.1)
+            except asyncio.TimeoutError:
+                continue
+            received.append((time.perf_counter(), json.loads(message)))
+            total += len(message)
+    return total
+
+
+async def run(clients: int, changes: int, interval: float) -> dict:
+    import uvicorn
+
+    from core.main import app
+    from core.services import mix
+
+    port = _free_port()
+    url = f"ws://127.0.0.1:{port}/ws/status"
+    server = uvicorn.Server(
+        uvicorn.Config(app, port=port, log_level="warning", lifespan="on")
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        feed = app.state.status_feed
+        done = asyncio.Event()
+        received = [[] for _ in range(clients)]
+        tasks = [asyncio.create_task(_subscribe(url, r, done)) for r in received]
+        while not all(received):  # 等所有客戶端收到第一份 snapshot
+            await asyncio.sleep(0.01)
+
+        published = {}
+        started = time.perf_counter()
+        for i in range(changes):
+            state = "running" if i % 10 else "accepted"
+            await mix._set_state(app.state, state, f"Iteration {i}")
+            published[feed.version] = time.perf_counter()
+            await asyncio.sleep(interval)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.2)
+        done.set()
+        sizes = await asyncio.gather(*tasks)
+
+        # 重新連線：從第一個變更之前的版本接續
+        resumed = []
+        since = min(published) - 1
+        resume_done = asyncio.Event()
+        resume = asyncio.create_task(
+            _subscribe(f"{url}?since={since}&epoch={feed.epoch}", resumed, resume_done)
+        )
+        while len(resumed) < changes:
+            await asyncio.sleep(0.01)
+        resume_done.set()
+        await resume
+
+        legacy_payload = len(
+            json.dumps(
+                {
+                    "state": feed.snapshot["state"],
+                    "message": feed.snapshot["message"],
+                    "timestamp": feed.snapshot["timestamp"],
+                }
+            )
+        )
+    finally:
+        server.should_exit = True
+        await serving
+
+    latencies, missing = [], 0
+    for messages in received:
+        versions = {m["version"]: t for t, m in messages if m["type"] == "delta"}
+        missing += len(set(published) - set(versions))
+        latencies += [
+            (versions[v] - t) * 1000 for v, t in published.items() if v in versions
+        ]
+    latencies.sort()
+    return {
+        "clients": clients,
+        "changes": changes,
+        "latency_ms": {
+            "p50": statistics.median(latencies),
+            "p99": latencies[int(len(latencies) * 0.99) - 1],
+            "max": latencies[-1],
+        },
+        "missing_versions": missing,
+        "bytes_per_client": statistics.mean(sizes),
+        "legacy_bytes_per_client_estimate": legacy_payload * elapsed,
+        "resumed_deltas": sum(m["type"] == "delta" for _, m in resumed),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--changes", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.clients, args.changes, args.interval))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # core/config.py
 from pathlib import Path
+from typing import Dict, Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,10 +9,82 @@ class Settings(BaseSettings):
     hw_agent_base_url: str
     core_base_url: str
 
+    # hw_agent HTTP client (見 core/services/hw_client.py)
+    hw_client_timeout: float = 5.0  # 預設讀取逾時 (s)
+    hw_client_connect_timeout: float = 2.0
+    # 各端點的讀取逾時 (s)，環境變數以 JSON 設定，例如 HW_CLIENT_TIMEOUTS={"/color": 1}
+    hw_client_timeouts: Dict[str, float] = {
+        "/status": 2.0,
+        "/color": 3.0,
+        "/palette": 5.0,
+        "/dose": 10.0,
+        "/stop": 3.0,
+    }
+    hw_client_max_connections: int = 32  # 每個 agent 的連線上限
+    hw_client_max_keepalive: int = 16  # 保持連線 (keep-alive) 的閒置連線數
+    hw_client_keepalive_expiry: float = 30.0  # 閒置連線保留時間 (s)
+    hw_client_retries: int = 2  # 冪等 GET 與 /stop 的重試次數
+    hw_client_retry_backoff: float = 0.05  # 第一次重試前的最長等待 (s)，之後倍增
+    # HTTP/2 需安裝 extra "http2" (h2)；httpx 只在 https 連線上協商 HTTP/2
+    hw_client_http2: bool = False
+    # 讀取快取的存活時間 (s)：None = 直到 invalidate()，未列出 = 只合併不快取
+    hw_client_cache_ttls: Dict[str, Optional[float]] = {
+        "/palette": None,
+        "/color": 0.05,
+        "/status": 0.02,
+    }
+
+    # 混色控制器："iterative" 或 "predictive" (見 core/services/controller.py)
+    mix_controller: Literal["iterative", "predictive"] = "iterative"
+
+    # 熱路徑端點跳過 response_model 驗證，以 fast_json (orjson) 直接序列化
+    fast_responses: bool = False
+
+    # /ws/status 只在狀態變更時推送；閒置超過此秒數送一次 heartbeat
+    status_heartbeat: float = 15.0
+
+    # 多工作站排程 (見 core/services/scheduler.py)
+    # 逗號分隔的 agent 清單，每項為 "name=url" 或 "url"，例如
+    # STATIONS=a=http://10.0.0.11:9000,b=http://10.0.0.12:9000
+    # 留空時只有一個工作站，即 hw_agent_base_url
+    stations: str = ""
+    job_history_size: int = 1000  # 保留於記憶體中的已結束工作數
+    job_db_path: Optional[Path] = None  # 工作佇列資料庫，預設 core/data/jobs.sqlite3
+
+    # 混色紀錄 (見 core/services/telemetry.py)
+    telemetry_dir: Optional[Path] = None  # .npz shard 目錄，預設 core/data/telemetry
+    telemetry_shard_size: int = 256  # 每個 shard 的 session 數
+    telemetry_flush_interval: float = 60.0  # 未滿一個 shard 時最多隔多久寫入 (s)
+
+    # 初始配方修正模型 (見 core/services/recipe_model.py)
+    use_recipe_model: bool = True
+    recipe_model_path: Optional[Path] = None  # 預設 core/data/recipe_model.npz
+
+    # 初始配方 LRU 快取
+    recipe_cache_size: int = 1024  # 最多保留的配方數
+    recipe_cache_quantum: int = 1  # 目標 RGB 量化間距 (1 = 不量化)
+    recipe_cache_path: Optional[Path] = None  # 設定後於關機時寫入磁碟、啟動時載入
+
+    # sRGB → latent 查表 (見 core/services/latent_lut.py)
+    use_latent_lut: bool = True
+    latent_lut_size: int = 64  # 每通道格點數，64 與 mixbox 內部格點對齊
+    latent_lut_path: Optional[Path] = None  # 預設 core/data/latent_lut_{size}.npy
+
+    # 共用感測器取樣 (見 core/services/sampler.py)
+    sensor_sample_rate_hz: float = 10.0  # 背景讀取頻率
+    sensor_queue_size: int = 1  # 每個 /ws/color 訂閱者最多暫存的讀值數
+    sensor_max_age: float = 0.2  # 讀值在此秒數內視為夠新，可直接重用
+
+    # agent raw RGBC frame 串流 (見 core/services/raw_stream.py)
+    raw_stream_buffer: int = 1024  # ring buffer 保留的 frame 數
+    raw_stream_timeout: float = 2.0  # GET /color/raw 等待第一批 frame 的上限 (s)
+    raw_stream_max_age: float = 2.0  # 最新 frame 超過此秒數未更新即視為無效 (503)
+
     # v2 的設定項都放到 model_config
     model_config = SettingsConfigDict(
         env_file=Path(__file__).resolve().parent.parent / ".env",
         env_file_encoding="utf-8",
+        extra="ignore",  # .env 與 hw_agent 共用
     )
 
 
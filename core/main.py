@@ -6,9 +6,11 @@ from fastapi import (
     WebSocketDisconnect,
     HTTPException,
     BackgroundTasks,
+    Query,
 )
 from fastapi import status as http_status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 import random, datetime
 import asyncio
@@ -16,15 +18,37 @@ import asyncio
 
 from .models import (
     RGBColorArray,
+    RawColorResponse,
     MixRequest,
     MessageResponse,
     StatusResponse,
     State,
     DoseRequest,
+    BatchRecipeRequest,
+    BatchRecipeResponse,
+    RecipeModelResponse,
+    RecipeModelTrainRequest,
+    JobRequest,
+    JobResponse,
+    StationResponse,
+    TelemetryStatsResponse,
 )
+from typing import List, Optional
 
 from .services import hw_client, mix as mix_service
 from .services import gamma as gamma_service
+from .services import palette_cache
+from .services import recipe as recipe_service
+from .services import recipe_cache
+from .services import recipe_model
+from .services import telemetry
+from .services.raw_stream import raw_stream
+from .services.sampler import sensor_sampler
+from .services.scheduler import FINAL_STATES, scheduler
+from .services.status_feed import StatusFeed, delta_message, heartbeat_message
+from .config import settings
+import fast_json
+import metrics
 
 
 # --------------------------------------------------------------------------- #
@@ -37,11 +61,26 @@ async def lifespan(app: FastAPI):
     app.state.status_state = State.idle
     app.state.status_message = "Core is idle."
     app.state.status_lock = asyncio.Lock()
+    app.state.timestamp = datetime.datetime.now().isoformat()
+    app.state.status_feed = StatusFeed()
+    app.state.status_feed.publish(
+        app.state.status_state, app.state.status_message, app.state.timestamp
+    )
     app.state.current_mix_task = None  # 用於追蹤當前混色任務的 ayncio.Task
+    recipe_cache.load()
+    telemetry.start()
+    recipe_service.start_pool()
+    await scheduler.start(app)
 
     yield
     # -- Shutdown Logic -- #
     print("Shutting down...")
+    await scheduler.stop()
+    await asyncio.to_thread(telemetry.stop)  # 寫入尚未存檔的混色紀錄
+    recipe_cache.save()
+    await asyncio.to_thread(recipe_service.stop_pool)
+    await sensor_sampler.close()
+    await raw_stream.close()
     await hw_client.close_client()  # Close the shared HTTP client
 
 
@@ -68,6 +107,7 @@ PRIVATE_NET_REGEX = (  # Only allow private network origins
     r"(?::\d+)?$"  # allowing :port
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[],
@@ -87,6 +127,12 @@ async def ping() -> MessageResponse:
     return {"ok": True, "message": "Core API is reachable."}
 
 
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def read_metrics():
+    """Latency histograms in Prometheus text format."""
+    return metrics.metrics_response()
+
+
 @app.get("/status", response_model=StatusResponse, tags=["health"])
 async def status() -> StatusResponse:
     """Current runtime state of the mixer core."""
@@ -95,7 +141,15 @@ async def status() -> StatusResponse:
         "state": app.state.status_state,
         "message": f"{app.state.status_message}",
         "timestamp": timestamp,
+        "version": app.state.status_feed.version,
+        "epoch": app.state.status_feed.epoch,
+        "palette_cache": palette_cache.stats(),
+        "recipe_cache": recipe_cache.stats(),
+        "agent_cache": hw_client.cache_stats(),
     }
+    if settings.fast_responses:
+        # 其餘欄位皆由 core 自行產生，只需確認 state 是合法值
+        return fast_json.JSONResponse({**payload, "state": State(payload["state"])})
     return payload
 
 
@@ -105,17 +159,43 @@ async def status() -> StatusResponse:
 @app.get("/color", response_model=RGBColorArray, tags=["sensor"])
 async def read_color() -> RGBColorArray:
     """Read RGB value from the color sensor (scaled 0 - 255)."""
-    payload = await hw_client.get_color()
-    payload = gamma_service.gamma_correction(payload)
+    payload = await sensor_sampler.get_color()
     if payload is None:
         raise HTTPException(
             status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Color sensor not available.",
         )
-
+    payload = gamma_service.gamma_correction(payload)
+    if settings.fast_responses:
+        # gamma_correction 保證 shape (3,) 的 uint8，即 RGBColorArray 的條件
+        return fast_json.JSONResponse(payload.tolist())
     return payload
 
 
+@app.get("/color/raw", response_model=RawColorResponse, tags=["sensor"])
+async def read_color_raw(
+    samples: int = Query(5, ge=1, le=1000, description="Frames to take the median of."),
+) -> RawColorResponse:
+    """Calibrated float RGB from the agent's binary raw RGBC frame stream."""
+    raw_stream.start()
+    age = raw_stream.age()
+    if age is None or age > settings.raw_stream_max_age:
+        await raw_stream.wait(settings.raw_stream_timeout)
+    age = raw_stream.age()
+    reading = raw_stream.reading(samples)
+    if (
+        reading is None
+        or not raw_stream.connected
+        or age is None
+        or age > settings.raw_stream_max_age  # 斷線或感測器停住時不回傳舊讀值
+    ):
+        raise HTTPException(
+            status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Raw sensor stream not available.",
+        )
+    return {**reading, "stream": raw_stream.stats()}
+
+
 @app.get("/palette", response_model=list, tags=["sensor"])
 async def read_palette() -> list:
     """Read the color palette from the hardware agent."""
@@ -123,59 +203,253 @@ async def read_palette() -> list:
     return payload
 
 
+@app.post("/palette/refresh", response_model=list, tags=["sensor"])
+async def refresh_palette() -> list:
+    """Drop the cached palette and read it again from the hardware agent."""
+    hw_client.invalidate("/palette")
+    palette_cache.invalidate()
+    payload = await hw_client.get_palette()
+    if not payload:
+        raise HTTPException(
+            status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Color palette not available.",
+        )
+    return payload
+
+
+async def _current_palette():
+    """The agent's palette and its latent matrix (cached; fetched once if empty)."""
+    if (cached := palette_cache.current()) is not None:
+        return cached
+    # 快取為空時才向 agent 讀取一次 palette (唯讀，不會觸發任何硬體動作)
+    palette = await hw_client.get_palette()
+    if not palette:
+        raise HTTPException(
+            status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Color palette not available.",
+        )
+    return palette_cache.get_palette_latent(palette)
+
+
+@app.post("/recipes/batch", response_model=BatchRecipeResponse, tags=["recipe"])
+async def batch_recipes(req: BatchRecipeRequest) -> BatchRecipeResponse:
+    """Compute the initial recipe for each target without starting a mix."""
+    if req.palette is not None:
+        palette, palette_latent = palette_cache.latent_matrix(
+            [item.model_dump() for item in req.palette]
+        )
+    else:
+        palette, palette_latent = await _current_palette()
+
+    targets = [t.root for t in req.targets]
+    recipes = await asyncio.to_thread(
+        recipe_service.batch_recipes,
+        palette,
+        palette_latent,
+        targets,
+        req.total_volume,
+        recipe_model.get_model(palette),
+    )
+    return [{"target": t, "recipe": r} for t, r in zip(targets, recipes)]
+
+
+@app.get("/recipes/model", response_model=RecipeModelResponse, tags=["recipe"])
+async def get_recipe_model() -> RecipeModelResponse:
+    """The learned initial-recipe correction currently served."""
+    model = recipe_model.current()
+    if model is None:
+        raise HTTPException(
+            status_code=http_status.HTTP_404_NOT_FOUND,
+            detail="No recipe model has been trained.",
+        )
+    return model.info()
+
+
+@app.post("/recipes/model/train", response_model=RecipeModelResponse, tags=["recipe"])
+async def train_recipe_model(req: RecipeModelTrainRequest) -> RecipeModelResponse:
+    """Fit the initial-recipe correction from the recorded mix sessions."""
+    palette, palette_latent = await _current_palette()
+    try:
+        model = await asyncio.to_thread(
+            recipe_model.train, palette, palette_latent, req.ridge, req.since
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+    recipe_model.set_model(model)
+    return model.info()
+
+
+@app.get("/telemetry/stats", response_model=TelemetryStatsResponse, tags=["mix"])
+async def telemetry_stats(
+    since: Optional[datetime.datetime] = Query(
+        None, description="Only sessions started at or after this time (ISO 8601)."
+    ),
+    controller: Optional[str] = Query(None, description="Only this mix controller."),
+) -> TelemetryStatsResponse:
+    """Aggregate convergence statistics over the recorded mix sessions."""
+    result = await asyncio.to_thread(telemetry.stats, since, controller)
+    return {**result, "writer": telemetry.writer_stats()}
+
+
 # --------------------------------------------------------------------------- #
 # WebSocket endpoints
 # --------------------------------------------------------------------------- #
+async def _send_json(ws: WebSocket, payload) -> None:
+    if settings.fast_responses:
+        await fast_json.send_json(ws, payload)
+    else:
+        await ws.send_json(payload)
+
+
 @app.websocket("/ws/color")
 async def ws_color(ws: WebSocket):
     await ws.accept()
+    queue = sensor_sampler.subscribe()
     try:
         while True:
-            payload = await hw_client.get_color()
-            if payload is None:
-                continue  # Skip if sensor is currently not available
-            await ws.send_json(payload)
-            await asyncio.sleep(0.1)
+            payload = await queue.get()
+            await _send_json(ws, payload)
     except WebSocketDisconnect:
         pass
+    finally:
+        sensor_sampler.unsubscribe(queue)
 
 
 @app.websocket("/ws/status")
-async def ws_status(ws: WebSocket):
+async def ws_status(
+    ws: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None
+):
+    """
+    Push status changes as they happen (see core/services/status_feed.py).
+
+    第一則訊息為完整 snapshot (帶 epoch 與 version)，之後每次狀態變更送出
+    只含變動欄位的 delta，閒置時送 heartbeat。帶 ?since=<version>&epoch=<epoch>
+    重新連線時，若該版本仍在歷史中則直接補送其後的 delta。
+    """
+    await ws.accept()
+    feed: StatusFeed = app.state.status_feed
+    try:
+        resumed = feed.resume(since, epoch) if since is not None else None
+        if resumed is None:
+            await _send_json(ws, feed.snapshot_message())
+            version, last, changes = feed.version, feed.snapshot, []
+        else:
+            version, (last, changes) = since, resumed
+        while True:
+            for v, snapshot in changes:
+                await _send_json(ws, delta_message(v, last, snapshot))
+                version, last = v, snapshot
+            if not await feed.wait(version, settings.status_heartbeat):
+                await _send_json(ws, heartbeat_message(version))
+            if feed.lost(version):
+                # 送出時阻塞太久，中間的版本已不在歷史中
+                await _send_json(ws, feed.snapshot_message())
+                version, last = feed.version, feed.snapshot
+            changes = feed.changes(version)
+    except WebSocketDisconnect:
+        pass
+
+
+@app.websocket("/ws/jobs/{job_id}")
+async def ws_job(ws: WebSocket, job_id: str):
+    """Push the job state on every change until it finishes, then close."""
     await ws.accept()
+    job = scheduler.get(job_id)
+    if job is None:
+        await ws.close(code=1008, reason="Job not found.")
+        return
     try:
         while True:
-            timestamp = datetime.datetime.now().isoformat()
-            payload = {
-                "state": app.state.status_state,
-                "message": f"{app.state.status_message}",
-                "timestamp": timestamp,
-            }
-            await ws.send_json(payload)
-            await asyncio.sleep(1)
+            payload = job.to_dict()
+            await _send_json(ws, payload)
+            if payload["state"] in FINAL_STATES:
+                break
+            async with job.status_changed:
+                await job.status_changed.wait_for(lambda: job.to_dict() != payload)
+        await ws.close()
     except WebSocketDisconnect:
         pass
 
 
+# --------------------------------------------------------------------------- #
+# Job queue (multi-station)
+# --------------------------------------------------------------------------- #
+@app.post("/jobs", response_model=JobResponse, status_code=202, tags=["jobs"])
+async def submit_job(req: JobRequest) -> JobResponse:
+    """Queue a mixing job; it runs on the next free station (survives restarts)."""
+    job = await scheduler.submit(
+        req.target.root, req.controller, req.priority, req.client
+    )
+    return job.to_dict()
+
+
+@app.get("/jobs", response_model=List[JobResponse], tags=["jobs"])
+async def list_jobs() -> List[JobResponse]:
+    """All queued, running and recently finished jobs, oldest first."""
+    return [job.to_dict() for job in scheduler.jobs()]
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse, tags=["jobs"])
+async def get_job(job_id: str) -> JobResponse:
+    """State of a single job."""
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=http_status.HTTP_404_NOT_FOUND, detail="Job not found."
+        )
+    return job.to_dict()
+
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse, tags=["jobs"])
+async def cancel_job(job_id: str) -> JobResponse:
+    """Cancel a queued job, or stop a running one and halt its station's pumps."""
+    job = await scheduler.cancel(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=http_status.HTTP_404_NOT_FOUND, detail="Job not found."
+        )
+    return job.to_dict()
+
+
+@app.get("/stations", response_model=List[StationResponse], tags=["jobs"])
+async def list_stations() -> List[StationResponse]:
+    """Stations in the pool and the job each one is running."""
+    return [station.to_dict() for station in scheduler.stations]
+
+
 # --------------------------------------------------------------------------- #
 # Mutating endpoints
 # --------------------------------------------------------------------------- #
 @app.post("/mix", response_model=StatusResponse, status_code=202, tags=["mix"])
 async def mix(req: MixRequest) -> StatusResponse:
-    """Start a color mixing session."""
+    """Start a color mixing session on the default agent."""
     if app.state.current_mix_task and not app.state.current_mix_task.done():
         raise HTTPException(
             status_code=http_status.HTTP_409_CONFLICT,
             detail="A mixing session is already in progress.",
         )
+    # 預設 agent 也在工作站池中時，需先向排程器借用該工作站
+    station = scheduler.station_for(settings.hw_agent_base_url)
+    if station is not None and not await scheduler.reserve(station):
+        raise HTTPException(
+            status_code=http_status.HTTP_409_CONFLICT,
+            detail="The station is running a scheduled job.",
+        )
 
     async with app.state.status_lock:
         app.state.status_state = State.accepted
         app.state.status_message = "Mix request accepted."
         app.state.timestamp = datetime.datetime.now().isoformat()
+        app.state.status_feed.publish(
+            State.accepted, app.state.status_message, app.state.timestamp
+        )
         app.state.current_mix_task = asyncio.create_task(
-            mix_service.start_mix(app, req.target.root)
+            mix_service.start_mix(app, req.target.root, req.controller)
         )
+        if station is not None:
+            scheduler.release_when_done(station, app.state.current_mix_task)
 
     timestamp = datetime.datetime.now().isoformat()
     return StatusResponse(
@@ -213,6 +487,12 @@ async def dose(req: DoseRequest) -> StatusResponse:
             status_code=http_status.HTTP_409_CONFLICT,
             detail="A mixing session is currently in progress. Please wait until it finishes.",
         )
+    station = scheduler.station_for(settings.hw_agent_base_url)
+    if station is not None and station.busy:
+        raise HTTPException(
+            status_code=http_status.HTTP_409_CONFLICT,
+            detail="The station is running a scheduled job.",
+        )
 
     payload = [x.model_dump() for x in req.root]
     response = await hw_client.dose_color(payload)
@@ -233,6 +513,9 @@ async def stop() -> MessageResponse:
             await app.state.current_mix_task
         except asyncio.CancelledError:
             pass
+    station = scheduler.station_for(settings.hw_agent_base_url)
+    if station is not None and station.job is not None:
+        await scheduler.cancel(station.job.id)
 
     response = await hw_client.halt_pumps()
     print(response.get("message"))
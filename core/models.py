@@ -2,8 +2,9 @@
 
 from __future__ import annotations
 
+import datetime
 from enum import Enum
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field, RootModel, conint, conlist
 
@@ -37,6 +38,17 @@ class RGBColorArray(
     """RGB color after scaling (0 - 255)."""
 
 
+# --------------------------------------------------------------------------- #
+# Domain objects
+# --------------------------------------------------------------------------- #
+class PaintItem(BaseModel):
+    """A single paint record in the palette."""
+
+    id: int = Field(..., description="ID of the color, starting from 0.")
+    name: str = Field(..., examples=["magenta"])
+    rgb: RGBColorArray = Field(..., description="sRGB color (0 - 255)")
+
+
 # --------------------------------------------------------------------------- #
 # Request & response models
 # --------------------------------------------------------------------------- #
@@ -47,6 +59,126 @@ class MessageResponse(BaseModel):
     message: str = Field(..., description="Human-readable message.")
 
 
+class CacheStats(BaseModel):
+    """Hit/miss counters of an in-process cache."""
+
+    hits: int = Field(..., description="Number of cache hits.")
+    misses: int = Field(..., description="Number of cache misses.")
+    palette_hash: Optional[str] = Field(
+        None, description="Content hash of the currently cached palette."
+    )
+
+
+class RecipeCacheStats(BaseModel):
+    """Statistics of the initial-recipe LRU cache."""
+
+    hits: int = Field(..., description="Number of cache hits.")
+    misses: int = Field(..., description="Number of cache misses.")
+    evictions: int = Field(..., description="Number of evicted entries.")
+    size: int = Field(..., description="Number of cached recipes.")
+    capacity: int = Field(..., description="Maximum number of cached recipes.")
+    hit_rate: float = Field(..., description="hits / (hits + misses).")
+
+
+class DistributionSummary(BaseModel):
+    """Mean and percentiles of a per-session quantity."""
+
+    mean: float
+    p50: float
+    p90: float
+    max: float
+
+
+class ControllerTelemetry(BaseModel):
+    """Convergence of the sessions run by one mix controller."""
+
+    sessions: int
+    convergence_rate: float
+    iterations_mean: float
+
+
+class TelemetryWriterStats(BaseModel):
+    """State of the background telemetry writer."""
+
+    running: bool
+    pending: int = Field(..., description="Sessions not yet written to a shard.")
+    dropped: int = Field(..., description="Reports that could not be recorded.")
+    directory: str = Field(..., description="Shard directory.")
+
+
+class TelemetryStatsResponse(BaseModel):
+    """Aggregate convergence statistics over recorded mix sessions."""
+
+    sessions: int = Field(..., description="Number of matching sessions.")
+    shards: int = Field(..., description="Number of shards read.")
+    converged: int = 0
+    convergence_rate: Optional[float] = None
+    states: Dict[str, int] = Field({}, description="Sessions per final state.")
+    iterations: Optional[DistributionSummary] = None
+    final_error: Optional[DistributionSummary] = Field(
+        None, description="Latent error of the last iteration."
+    )
+    total_volume: Optional[DistributionSummary] = Field(
+        None, description="Total dispensed volume (mL)."
+    )
+    duration: Optional[DistributionSummary] = Field(
+        None, description="Session wall time (s)."
+    )
+    error_by_iteration: List[float] = Field(
+        [], description="Mean latent error at each iteration index."
+    )
+    by_controller: Dict[str, ControllerTelemetry] = {}
+    writer: Optional[TelemetryWriterStats] = None
+
+
+class RawStreamStats(BaseModel):
+    """State and counters of the agent's raw RGBC frame stream."""
+
+    connected: bool
+    frames: int = Field(..., description="Frames received.")
+    messages: int = Field(..., description="Binary messages received.")
+    bytes: int = Field(..., description="Binary payload bytes received.")
+    missed: int = Field(..., description="Frames skipped according to seq gaps.")
+    reconnects: int = Field(..., description="Connection attempts after the first.")
+    last_seq: Optional[int] = Field(None, description="Seq of the newest frame.")
+    epoch: Optional[str] = Field(
+        None, description="Agent boot id; seq restarts in every epoch."
+    )
+    age: Optional[float] = Field(
+        None, description="Seconds since the newest frame arrived."
+    )
+
+
+class RawColorResponse(BaseModel):
+    """Calibrated color from the latest raw sensor frames."""
+
+    rgb: List[float] = Field(
+        ...,
+        description="Median calibrated linear RGB (0 - 255, before gamma), unrounded.",
+    )
+    rgbc: List[float] = Field(..., description="Median raw RGBC counts.")
+    samples: int = Field(..., description="Frames the median was taken over.")
+    seq: int = Field(..., description="Seq of the newest frame used.")
+    timestamp: float = Field(
+        ..., description="Agent time of the newest frame (unix s)."
+    )
+    stream: RawStreamStats
+
+
+class AgentReadStats(BaseModel):
+    """Counters of the single-flight read cache for one agent endpoint."""
+
+    calls: int = Field(..., description="Number of reads requested.")
+    hits: int = Field(..., description="Reads answered from the cache.")
+    shared: int = Field(..., description="Reads that joined an in-flight request.")
+    fetches: int = Field(..., description="Reads sent to the agent.")
+    errors: int = Field(..., description="Fetches that failed (not cached).")
+    ttl: Optional[float] = Field(
+        ..., description="Cache lifetime (s); null = until invalidated."
+    )
+    saved: float = Field(..., description="Fraction of reads not sent to the agent.")
+
+
 class StatusResponse(BaseModel):
     """Current runtime status of the mixer core."""
 
@@ -55,6 +187,21 @@ class StatusResponse(BaseModel):
     timestamp: Optional[str] = Field(
         ..., description="Timestamp of the response in ISO 8601 format."
     )
+    version: Optional[int] = Field(
+        None, description="Status version, usable as /ws/status?since=."
+    )
+    epoch: Optional[str] = Field(
+        None, description="Status feed epoch (changes when core restarts)."
+    )
+    palette_cache: Optional[CacheStats] = Field(
+        None, description="Statistics of the palette latent cache."
+    )
+    recipe_cache: Optional[RecipeCacheStats] = Field(
+        None, description="Statistics of the initial-recipe cache."
+    )
+    agent_cache: Optional[Dict[str, AgentReadStats]] = Field(
+        None, description="Agent read cache statistics, by endpoint."
+    )
 
 
 class ErrorResponse(BaseModel):
@@ -73,6 +220,60 @@ class MixRequest(BaseModel):
         None,
         description="Optional message to pass to the algorithm (for logging, etc.).",
     )
+    controller: Optional[Literal["iterative", "predictive"]] = Field(
+        None, description="Mixing controller to use; defaults to the core setting."
+    )
+
+
+class JobRequest(BaseModel):
+    """Request to queue a color mixing job on the station pool."""
+
+    target: RGBColorArray = Field(
+        ..., description="Target RGB color to be mixed (scaled 0 - 255)."
+    )
+    controller: Optional[Literal["iterative", "predictive"]] = Field(
+        None, description="Mixing controller to use; defaults to the core setting."
+    )
+    priority: int = Field(
+        0, description="Higher priorities are scheduled first (default 0)."
+    )
+    client: str = Field(
+        "default",
+        max_length=64,
+        description="Submitter ID; jobs of equal priority are served round-robin across clients.",
+    )
+
+
+class JobResponse(BaseModel):
+    """State of a queued, running or finished mixing job."""
+
+    id: str
+    target: RGBColorArray
+    controller: Optional[str] = None
+    priority: int
+    client: str
+    state: Literal[
+        "queued", "accepted", "running", "finished", "error", "cancelling", "cancelled"
+    ]
+    message: Optional[str] = Field(None, description="Detail message.")
+    timestamp: str = Field(..., description="Time of the last state change.")
+    submitted_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    station: Optional[str] = Field(None, description="Station running the job.")
+    converged: Optional[bool] = None
+    total_volume: Optional[float] = Field(None, description="Dispensed volume (mL).")
+    iterations: int = Field(0, description="Number of sensor measurements so far.")
+
+
+class StationResponse(BaseModel):
+    """A hardware agent in the station pool."""
+
+    name: str
+    base_url: str
+    busy: bool
+    job: Optional[str] = Field(None, description="ID of the job being run.")
+    completed: int = Field(..., description="Number of jobs run on this station.")
 
 
 class DoseItem(BaseModel):
@@ -93,3 +294,57 @@ class DoseRequest(
     ]
 ):
     """List of colors to be mixed in one operation."""
+
+
+class BatchRecipeRequest(BaseModel):
+    """Request to compute initial recipes for many target colors at once."""
+
+    targets: conlist(RGBColorArray, min_length=1, max_length=100_000) = Field(
+        ..., description="Target RGB colors (scaled 0 - 255)."
+    )
+    total_volume: float = Field(
+        60, gt=0, description="Total volume of each recipe (mL)."
+    )
+    palette: Optional[conlist(PaintItem, min_length=1)] = Field(
+        None,
+        description="Palette to solve against; defaults to the last palette reported by the agent.",
+    )
+
+
+class RecipeResult(BaseModel):
+    """Initial recipe computed for one target color."""
+
+    target: RGBColorArray
+    recipe: List[DoseItem]
+
+
+class BatchRecipeResponse(RootModel[List[RecipeResult]]):
+    """Initial recipes, in the same order as the requested targets."""
+
+
+class RecipeModelTrainRequest(BaseModel):
+    """Request to fit the initial-recipe correction from mix telemetry."""
+
+    ridge: float = Field(1e-2, gt=0, description="L2 regularization strength.")
+    since: Optional[datetime.datetime] = Field(
+        None, description="Only train on sessions started after this time."
+    )
+
+
+class RecipeModelResponse(BaseModel):
+    """Learned correction applied on top of the NNLS initial recipe."""
+
+    palette_ids: List[int] = Field(..., description="Paints the model applies to.")
+    version: str = Field(..., description="Training time, used as the version.")
+    trained_at: str
+    samples: int = Field(..., description="Number of training sessions.")
+    ridge: float
+    baseline_rmse: float = Field(
+        ..., description="RMS error of the NNLS proportions on the training set."
+    )
+    loo_rmse: float = Field(
+        ..., description="Leave-one-out RMS error of the corrected proportions."
+    )
+    enabled: bool = Field(
+        ..., description="Whether the model is applied (loo_rmse < baseline_rmse)."
+    )
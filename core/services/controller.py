@@ -0,0 +1,235 @@
+# core/services/controller.py
+"""
+Mixing controllers used by core.services.mix.start_mix.
+
+控制器決定「第一次加多少」與「每次量測後再加多少」。每個混色 session 建立一個
+新的控制器實例 (可保存 session 內的狀態)，介面如下：
+
+- start(palette_latent, target_latent, recipe_model) → 記錄本次 session 的
+  palette、目標與初始配方修正模型 (見 core/services/recipe_model.py，可為 None)
+- initial_volumes() → 各顏料初始體積 (mL)
+- next_volumes(current_latent, dispensed) → 各顏料本輪追加體積 (mL)，
+  全為 0 代表無法再改善
+
+palette_latent 為 (m×n) 矩陣，dispensed 為目前各顏料累積出料 (n,)，順序與
+palette_latent 欄位一致。
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+import mixbox
+import numpy as np
+from scipy.optimize import minimize, nnls
+
+import metrics
+
+DOSE_DECIMALS = 3  # 體積精度 (mL)
+
+NNLS_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 1e-2, 0.1, 1.0)
+NNLS_SECONDS = metrics.histogram(
+    "nnls_solve_seconds",
+    "Time spent solving NNLS recipes (initial, correction or batch).",
+    ("kind",),
+    NNLS_BUCKETS,
+)
+
+
+class MixController(ABC):
+    """Base class for mixing controllers."""
+
+    name = "base"
+
+    def __init__(self, start_volume: float, max_volume: float, batch_volume: float):
+        self.start_volume = start_volume
+        self.max_volume = max_volume
+        self.batch_volume = batch_volume
+        self.palette_latent: Optional[np.ndarray] = None
+        self.target_latent: Optional[np.ndarray] = None
+        self.recipe_model = None
+
+    def start(
+        self, palette_latent: np.ndarray, target_latent: np.ndarray, recipe_model=None
+    ) -> None:
+        self.palette_latent = palette_latent
+        self.target_latent = target_latent
+        self.recipe_model = recipe_model
+
+    def initial_proportions(self) -> np.ndarray:
+        """NNLS mixing proportions, corrected by the learned recipe model if any."""
+        with NNLS_SECONDS.time("initial"):
+            coeffs, _ = nnls(self.palette_latent, self.target_latent)
+        props = coeffs / np.sum(coeffs)
+        if self.recipe_model is not None:
+            props = self.recipe_model.correct(props, self.target_latent)[0]
+        return props
+
+    @abstractmethod
+    def initial_volumes(self) -> np.ndarray:
+        """Initial volume of each paint (mL)."""
+
+    @abstractmethod
+    def next_volumes(
+        self, current_latent: np.ndarray, dispensed: np.ndarray
+    ) -> np.ndarray:
+        """Volume of each paint to add this round (mL); all zero = cannot improve."""
+
+
+class IterativeController(MixController):
+    """
+    Original strategy: dose the NNLS recipe for START_VOLUME, then add at most
+    BATCH_VOLUME per round in the direction of the remaining latent delta.
+    """
+
+    name = "iterative"
+
+    def initial_volumes(self):
+        return np.round(self.initial_proportions() * self.start_volume)
+
+    def next_volumes(self, current_latent, dispensed):
+        total_volume = float(np.sum(dispensed))
+        delta_latent = self.target_latent - current_latent
+        cur_palette_latent = np.hstack(
+            [self.palette_latent, current_latent[:, np.newaxis]]
+        )
+        with NNLS_SECONDS.time("correction"):
+            coeffs_rem, _ = nnls(cur_palette_latent, delta_latent)
+        if np.sum(coeffs_rem) <= 0:
+            return np.zeros(self.palette_latent.shape[1])
+        props_rem = coeffs_rem / np.sum(coeffs_rem)
+        print(f"Remaining proportions: {props_rem}")
+
+        batch_volume = self.batch_volume
+        if props_rem[-1] != 0:
+            batch_volume = min(self.batch_volume, total_volume / props_rem[-1])
+            print(f"Adjusting batch volume to {batch_volume} ml based on current color")
+
+        batch_volume = min(batch_volume, self.max_volume - total_volume)
+        return np.round(props_rem[:-1] * batch_volume, decimals=DOSE_DECIMALS)
+
+
+class PredictiveController(MixController):
+    """
+    Model-predictive strategy: solve for the full corrective dose in one step.
+
+    以 mixbox 預測「混合後量測到的 latent」：f(v) = latent(rgb(A v / Σv))。
+    latent 空間的線性混合在轉回 RGB 再量測時並非線性，因此線性 NNLS 的解
+    即使在模擬器上也有約 0.05 的誤差；改以 NNLS 解為起點，在 f 上做帶約束的
+    最小平方 (SLSQP) 求出配比 / 追加量。
+
+    - 初始配方：單純形上 min ‖t − f(p)‖ (有 recipe_model 時沿用其修正後的配比，
+      該模型由實機紀錄學得，優先於 mixbox 預測)
+    - 追加：以感測讀值與 f(v) 的差估計模型偏差 b (指數平滑)，求 d ≥ 0 使
+      f(v + d) ≈ t − b。每步的總量不超過剩餘可加量的 STEP_BUDGET 倍，
+      並乘上自適應步長 α：誤差變大 (過衝或偏差估計錯誤) 時減半，否則逐步放大回 1。
+    """
+
+    name = "predictive"
+
+    STEP_INIT = 1.0  # 初始步長 α
+    STEP_MIN = 0.25
+    STEP_GROWTH = 1.5
+    STEP_BUDGET = 0.5  # 每步最多使用剩餘可加量的比例，保留後續修正的空間
+    BIAS_SMOOTHING = 0.6  # 新觀測偏差的權重
+    SOLVER_OPTIONS = {"ftol": 1e-12, "maxiter": 100}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.step = self.STEP_INIT
+        self.bias: Optional[np.ndarray] = None
+        self.last_error: Optional[float] = None
+
+    def predict(self, volumes: np.ndarray) -> np.ndarray:
+        """Latent vector the sensor is expected to read for the given volumes."""
+        mixed = self.palette_latent @ (volumes / np.sum(volumes))
+        return np.array(mixbox.float_rgb_to_latent(mixbox.latent_to_float_rgb(mixed)))
+
+    def initial_volumes(self):
+        props = self.initial_proportions()
+        if self.recipe_model is None:
+            with NNLS_SECONDS.time("initial"):
+                props = self._fit_proportions(props)
+        return np.round(props * self.start_volume, decimals=DOSE_DECIMALS)
+
+    def _fit_proportions(self, props: np.ndarray) -> np.ndarray:
+        t = self.target_latent
+        result = minimize(
+            lambda p: np.sum((t - self.predict(p)) ** 2),
+            props,
+            method="SLSQP",
+            bounds=[(0.0, 1.0)] * len(props),
+            constraints=[{"type": "eq", "fun": lambda p: np.sum(p) - 1.0}],
+            options=self.SOLVER_OPTIONS,
+        )
+        fitted = np.clip(result.x, 0.0, None)
+        if np.sum(fitted) <= 0:
+            return props
+        fitted /= np.sum(fitted)
+        # 最佳化失敗時保留較好的一方
+        if np.sum((t - self.predict(fitted)) ** 2) > np.sum(
+            (t - self.predict(props)) ** 2
+        ):
+            return props
+        return fitted
+
+    def next_volumes(self, current_latent, dispensed):
+        A = self.palette_latent
+        total_volume = float(np.sum(dispensed))
+        remaining = self.max_volume - total_volume
+        if total_volume <= 0 or remaining <= 0:
+            return np.zeros(A.shape[1])
+
+        # 1. 模型偏差估計
+        observed_bias = current_latent - self.predict(dispensed)
+        if self.bias is None:
+            self.bias = observed_bias
+        else:
+            w = self.BIAS_SMOOTHING
+            self.bias = w * observed_bias + (1 - w) * self.bias
+
+        # 2. 自適應步長
+        error = float(np.linalg.norm(self.target_latent - current_latent))
+        if self.last_error is not None:
+            if error > self.last_error:
+                self.step = max(self.STEP_MIN, self.step * 0.5)
+            else:
+                self.step = min(1.0, self.step * self.STEP_GROWTH)
+        self.last_error = error
+
+        # 3. 一次求出完整修正量：線性 NNLS 為起點，再以 mixbox 預測修正
+        target = self.target_latent - self.bias
+        budget = self.STEP_BUDGET * remaining
+        with NNLS_SECONDS.time("correction"):
+            d, _ = nnls(
+                A - target[:, np.newaxis], target * total_volume - A @ dispensed
+            )
+            if np.sum(d) > budget:
+                d *= budget / np.sum(d)
+            d = self._fit_correction(target, dispensed, d, budget)
+        d *= self.step
+        print(f"Predictive dose (step {self.step:.2f}): {d}")
+        return np.round(d, decimals=DOSE_DECIMALS)
+
+    def _fit_correction(
+        self, target: np.ndarray, dispensed: np.ndarray, d0: np.ndarray, budget: float
+    ) -> np.ndarray:
+        def loss(d):
+            return np.sum((target - self.predict(dispensed + d)) ** 2)
+
+        result = minimize(
+            loss,
+            d0,
+            method="SLSQP",
+            bounds=[(0.0, budget)] * len(d0),
+            constraints=[{"type": "ineq", "fun": lambda d: budget - np.sum(d)}],
+            options=self.SOLVER_OPTIONS,
+        )
+        d = np.clip(result.x, 0.0, None)
+        if np.sum(d) > budget:
+            d *= budget / np.sum(d)
+        return d if loss(d) <= loss(d0) else d0
+
+
+CONTROLLERS: Dict[str, Type[MixController]] = {
+    IterativeController.name: IterativeController,
+    PredictiveController.name: PredictiveController,
+}
@@ -1,30 +1,284 @@
 # core/services/hw_client.py
+import asyncio
+import contextvars
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 import httpx
-from typing import Optional, Any, Dict, List
+from typing import Optional, Any, Awaitable, Callable, Dict, List, Tuple
 from core.config import settings
+import metrics
+
+STATUS_POLL_INTERVAL = 0.1  # long-poll 不可用時的輪詢間隔 (s)
+MAX_LONG_POLL = (
+    60.0  # 單次 long-poll 的上限 (s)，與 agent GET /status 的 timeout 上限相同
+)
+RETRY_STATUS = frozenset({502, 503, 504})  # 可重試的回應 (agent 前的 proxy / 重啟中)
+
+HW_CLIENT_LATENCY = metrics.histogram(
+    "hw_client_request_duration_seconds",
+    "Time until the hardware agent's response headers arrive, by endpoint.",
+    ("method", "endpoint", "status"),
+)
+HW_CLIENT_CALLS = metrics.histogram(
+    "hw_client_call_duration_seconds",
+    "End-to-end time of hw_client calls, including retries and coalesced waits.",
+    ("call",),
+)
+
+
+# --------------------------------------------------------------------------- #
+# Instrumentation (httpx event hooks)
+# --------------------------------------------------------------------------- #
+async def _start_timer(request: httpx.Request) -> None:
+    request.extensions["metrics_start"] = time.perf_counter()
+
+
+async def _observe(response: httpx.Response) -> None:
+    request = response.request
+    start = request.extensions.get("metrics_start")
+    if start is None:
+        return
+    endpoint = request.url.path
+    if "wait_for" in request.url.params:
+        endpoint += "?wait_for"  # long-poll，與一般 /status 分開統計
+    HW_CLIENT_LATENCY.labels(request.method, endpoint, response.status_code).observe(
+        time.perf_counter() - start
+    )
+
+
+_EVENT_HOOKS = {"request": [_start_timer], "response": [_observe]}
 
 # --------------------------------------------------------------------------- #
-# Shared AsyncClient instance
+# Shared AsyncClient instances
 # --------------------------------------------------------------------------- #
-_client: Optional[httpx.AsyncClient] = None
+_client: Optional[httpx.AsyncClient] = None  # settings.hw_agent_base_url
+_station_clients: Dict[str, httpx.AsyncClient] = {}  # 其他工作站，以 base_url 為鍵
+
+# 目前 task 要呼叫的 agent；None 代表預設的 settings.hw_agent_base_url。
+# asyncio.Task 建立時會複製 context，因此每個混色工作可各自指定工作站。
+_agent_url: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "hw_agent_base_url", default=None
+)
+
+
+@contextmanager
+def use_agent(base_url: Optional[str]):
+    """Route hw_client calls made inside the block to the agent at `base_url`."""
+    token = _agent_url.set(base_url)
+    try:
+        yield
+    finally:
+        _agent_url.reset(token)
+
+
+def _http2_enabled() -> bool:
+    """HW_CLIENT_HTTP2 requested and the optional h2 package is installed."""
+    if not settings.hw_client_http2:
+        return False
+    try:
+        import h2  # noqa: F401  (httpx 的 HTTP/2 支援需要 h2，extra "http2")
+    except ImportError:
+        print("HW_CLIENT_HTTP2 is set but h2 is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def _timeout(path: str) -> httpx.Timeout:
+    """Timeout of an endpoint (settings.hw_client_timeouts, else the default)."""
+    return httpx.Timeout(
+        settings.hw_client_timeouts.get(path, settings.hw_client_timeout),
+        connect=settings.hw_client_connect_timeout,
+    )
+
+
+def _new_client(base_url: str) -> httpx.AsyncClient:
+    """AsyncClient with the configured keep-alive pool, timeouts and HTTP/2."""
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=_http2_enabled(),
+        timeout=_timeout(""),
+        limits=httpx.Limits(
+            max_connections=settings.hw_client_max_connections,
+            max_keepalive_connections=settings.hw_client_max_keepalive,
+            keepalive_expiry=settings.hw_client_keepalive_expiry,
+        ),
+        event_hooks=_EVENT_HOOKS,
+    )
 
 
 async def get_client() -> httpx.AsyncClient:
-    """Lazily instantiate and return a shared AsyncClient."""
+    """Lazily instantiate and return the shared AsyncClient of the current agent."""
     global _client
-    if _client is None:
-        _client = httpx.AsyncClient(
-            base_url=settings.hw_agent_base_url,
-        )
-    return _client
+    base_url = _agent_url.get()
+    if base_url is None or base_url == settings.hw_agent_base_url:
+        if _client is None:
+            _client = _new_client(settings.hw_agent_base_url)
+        return _client
+    client = _station_clients.get(base_url)
+    if client is None:
+        client = _station_clients[base_url] = _new_client(base_url)
+    return client
 
 
 async def close_client() -> None:
-    """Close the shared AsyncClient when application shuts down."""
+    """Close the shared AsyncClients when application shuts down."""
     global _client
     if _client is not None:
         await _client.aclose()
         _client = None
+    clients = list(_station_clients.values())
+    _station_clients.clear()
+    for client in clients:
+        await client.aclose()
+    _inflight.clear()  # 進行中的 task 屬於即將結束的 event loop
+    _cache.clear()
+
+
+# --------------------------------------------------------------------------- #
+# Request helpers
+# --------------------------------------------------------------------------- #
+async def _request(
+    method: str, path: str, *, retry: bool = False, **kwargs
+) -> httpx.Response:
+    """
+    Send a request to the current agent and return its (2xx) response.
+
+    retry=True 只用於冪等的請求：連線錯誤、逾時與 502/503/504 會以指數退避
+    加上隨機抖動 (full jitter) 重試最多 settings.hw_client_retries 次。
+    /dose 不重試 —— 讀取逾時時 agent 可能已經開始出料。
+
+    :raises httpx.HTTPError: 不可重試或重試用盡時的最後一個錯誤
+    """
+    client = await get_client()
+    kwargs.setdefault("timeout", _timeout(path))
+    attempts = 1 + (settings.hw_client_retries if retry else 0)
+    for attempt in range(attempts):
+        try:
+            response = await client.request(method, path, **kwargs)
+            response.raise_for_status()
+            return response
+        except httpx.HTTPStatusError as e:
+            if attempt + 1 == attempts or e.response.status_code not in RETRY_STATUS:
+                raise
+            error: httpx.HTTPError = e
+        except httpx.TransportError as e:
+            if attempt + 1 == attempts:
+                raise
+            error = e
+        delay = random.uniform(0.0, settings.hw_client_retry_backoff * 2**attempt)
+        print(f"Retrying {method} {path} in {delay * 1000:.0f} ms: {_describe(error)}")
+        await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def _describe(e: httpx.HTTPError) -> str:
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"{e.response.status_code} - {e.response.text}"
+    return repr(e)
+
+
+def _detail(e: httpx.HTTPError) -> str:
+    """The agent's error detail (FastAPI {"detail": ...}) or a description."""
+    if isinstance(e, httpx.HTTPStatusError):
+        try:
+            return f"{e.response.status_code} - {e.response.json().get('detail', '')}"
+        except ValueError:
+            pass
+    return _describe(e)
+
+
+# --------------------------------------------------------------------------- #
+# Single-flight read cache
+# --------------------------------------------------------------------------- #
+# 以 (agent base_url, 路徑) 為鍵：同時進行的相同讀取共用一個請求 (single-flight)，
+# 成功的結果再依 settings.hw_client_cache_ttls 快取一段時間 (None = 直到
+# invalidate())。失敗的結果 (None / error) 不快取。
+_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+_cache: Dict[Tuple[str, str], Tuple[Optional[float], Any]] = {}  # (到期時間, 值)
+_generation = 0  # invalidate() 時遞增，避免舊請求的結果寫回快取
+_stats: Dict[str, Counter] = defaultdict(Counter)  # 路徑 → 計數
+
+
+async def _read(
+    path: str,
+    fetch: Callable[[], Awaitable[Any]],
+    ok: Callable[[Any], bool] = lambda value: value is not None,
+) -> Any:
+    """
+    Return a cached, shared or freshly fetched agent read of `path`.
+
+    以 shield 等待共用的請求，單一呼叫者被取消不會中斷其他人的請求。
+    """
+    key = (_agent_url.get() or settings.hw_agent_base_url, path)
+    counters = _stats[path]
+    counters["calls"] += 1
+    entry = _cache.get(key)
+    if entry is not None and (entry[0] is None or time.monotonic() < entry[0]):
+        counters["hits"] += 1
+        return entry[1]
+
+    task = _inflight.get(key)
+    if task is None:
+        counters["fetches"] += 1
+        task = _inflight[key] = asyncio.create_task(_fetch(key, fetch, ok))
+        task.add_done_callback(
+            lambda t: _inflight.pop(key) if _inflight.get(key) is t else None
+        )
+    else:
+        counters["shared"] += 1
+    return await asyncio.shield(task)
+
+
+async def _fetch(
+    key: Tuple[str, str],
+    fetch: Callable[[], Awaitable[Any]],
+    ok: Callable[[Any], bool],
+) -> Any:
+    generation = _generation
+    value = await fetch()
+    if not ok(value):
+        _stats[key[1]]["errors"] += 1
+        return value
+    ttl = settings.hw_client_cache_ttls.get(key[1], 0.0)
+    if generation == _generation and (ttl is None or ttl > 0):
+        _cache[key] = (None if ttl is None else time.monotonic() + ttl, value)
+    return value
+
+
+def invalidate(path: Optional[str] = None) -> None:
+    """Drop cached reads of `path` (every path if None) for all agents."""
+    global _generation
+    _generation += 1
+    for key in [k for k in _cache if path is None or k[1] == path]:
+        del _cache[key]
+    for key in [k for k in _inflight if path is None or k[1] == path]:
+        del _inflight[key]  # 之後的呼叫者重新讀取，不沿用失效前送出的請求
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Per-endpoint counters of the read layer.
+
+    calls = 呼叫次數；hits = 由快取回應；shared = 共用進行中的請求；
+    fetches = 實際送往 agent 的讀取 (不含重試)；errors = 失敗的讀取；
+    saved = 因快取與合併而省下的 agent 請求比例。
+    """
+    result = {}
+    for path, counters in sorted(_stats.items()):
+        calls = counters["calls"]
+        saved = counters["hits"] + counters["shared"]
+        result[path] = {
+            "calls": calls,
+            "hits": counters["hits"],
+            "shared": counters["shared"],
+            "fetches": counters["fetches"],
+            "errors": counters["errors"],
+            "ttl": settings.hw_client_cache_ttls.get(path, 0.0),
+            "saved": saved / calls if calls else 0.0,
+        }
+    return result
 
 
 # --------------------------------------------------------------------------- #
@@ -32,71 +286,110 @@ async def close_client() -> None:
 # --------------------------------------------------------------------------- #
 
 
+@metrics.timed(HW_CLIENT_CALLS, "get_status")
 async def get_status() -> Dict[str, Any]:
-    """Fetch status from the hardware agent."""
-    client = await get_client()
-    try:
-        response = await client.get("/status")
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        print(f"Error fetching status: {e.response.status_code} - {e.response.text}")
-        return {"state": "error", "message": "Failed to fetch status"}
+    """Fetch status from the hardware agent (single-flight, briefly cached)."""
+
+    async def fetch() -> Dict[str, Any]:
+        try:
+            response = await _request("GET", "/status", retry=True)
+            return response.json()
+        except httpx.HTTPError as e:
+            print(f"Error fetching status: {_describe(e)}")
+            return {"state": "error", "message": "Failed to fetch status"}
+
+    return await _read("/status", fetch, lambda status: status.get("state") != "error")
+
+
+@metrics.timed(HW_CLIENT_CALLS, "wait_for_status")
+async def wait_for_status(state: str, timeout: float = 10.0) -> Dict[str, Any]:
+    """
+    Wait until the hardware agent reports `state`, or until `timeout` seconds pass.
 
+    優先使用 agent 的 long-poll (`GET /status?wait_for=`)，狀態一變更即返回；
+    若 agent 不支援 (立即回傳其他狀態) 或連線失敗，則退回每
+    STATUS_POLL_INTERVAL 秒輪詢一次。`timeout` 超過 MAX_LONG_POLL 時分成
+    多次 long-poll 直到期限。逾時時回傳最後一次取得的狀態。
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = min(max(0.0, deadline - loop.time()), MAX_LONG_POLL)
+        try:
+            response = await _request(
+                "GET",
+                "/status",
+                params={"wait_for": state, "timeout": remaining},
+                timeout=httpx.Timeout(
+                    remaining + settings.hw_client_timeout,
+                    connect=settings.hw_client_connect_timeout,
+                ),
+            )
+            status = response.json()
+        except httpx.HTTPError as e:
+            print(f"Error waiting for status: {_describe(e)}")
+            status = {"state": "error", "message": "Failed to fetch status"}
 
+        if status.get("state") == state or loop.time() >= deadline:
+            return status
+        await asyncio.sleep(STATUS_POLL_INTERVAL)
+
+
+@metrics.timed(HW_CLIENT_CALLS, "get_color")
 async def get_color() -> Optional[List[int]]:
-    """Fetch RGB color from the hardware agent."""
-    client = await get_client()
-    try:
-        response = await client.get("/color")
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        print(f"Error fetching color: {e.response.status_code} - {e.response.text}")
-        return None
+    """Fetch RGB color from the hardware agent (single-flight, briefly cached)."""
 
+    async def fetch() -> Optional[List[int]]:
+        try:
+            response = await _request("GET", "/color", retry=True)
+            return response.json()
+        except httpx.HTTPError as e:
+            print(f"Error fetching color: {_describe(e)}")
+            return None
 
+    return await _read("/color", fetch)
+
+
+@metrics.timed(HW_CLIENT_CALLS, "get_palette")
 async def get_palette() -> List[Dict[str, Any]]:
-    """Fetch the color palette from the hardware agent."""
-    client = await get_client()
-    try:
-        response = await client.get("/palette")
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        print(f"Error fetching palette: {e.response.status_code} - {e.response.text}")
-        return []
+    """Fetch the color palette from the hardware agent (cached until invalidated)."""
 
+    async def fetch() -> List[Dict[str, Any]]:
+        try:
+            response = await _request("GET", "/palette", retry=True)
+            return response.json()
+        except httpx.HTTPError as e:
+            print(f"Error fetching palette: {_describe(e)}")
+            return []
 
+    return await _read("/palette", fetch, bool)
+
+
+@metrics.timed(HW_CLIENT_CALLS, "dose_color")
 async def dose_color(items: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Send a color dose request to the hardware agent."""
-    client = await get_client()
+    """Send a color dose request to the hardware agent (never retried)."""
     try:
-        response = await client.post(
-            "/dose",
-            json=items,
-        )
-        response.raise_for_status()
+        response = await _request("POST", "/dose", json=items)
         return response.json()
-    except httpx.HTTPStatusError as e:
-        print(f"Error dosing color: {e.response.status_code} - {e.response.text}")
-        return {"state": "error", "message": "Failed to send dose request"}
+    except httpx.HTTPError as e:
+        print(f"Error dosing color: {_describe(e)}")
+        return {
+            "state": "error",
+            "message": f"Failed to send dose request: {_detail(e)}",
+        }
 
 
+@metrics.timed(HW_CLIENT_CALLS, "halt_pumps")
 async def halt_pumps() -> Dict[str, Any]:
-    """Halt all pumps immediately."""
-    client = await get_client()
+    """Halt all pumps immediately (idempotent, so transport errors are retried)."""
     try:
-        response = await client.post("/stop")
-        response.raise_for_status()
+        response = await _request("POST", "/stop", retry=True)
         return response.json()
-    except httpx.HTTPStatusError as e:
-        print(f"Error halting pumps: {e.response.status_code} - {e.response.text}")
-        print(e.response)
-
+    except httpx.HTTPError as e:
+        print(f"Error halting pumps: {_describe(e)}")
         return {
             "state": "error",
-            "message": f"Failed to halt pumps: {e.response.status_code} - {e.response.json().get('detail', '')}",
+            "message": f"Failed to halt pumps: {_detail(e)}",
         }
 
 
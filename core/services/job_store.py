@@ -0,0 +1,90 @@
+# core/services/job_store.py
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from core.config import settings
+
+# --------------------------------------------------------------------------- #
+# SQLite persistence of scheduler jobs
+# --------------------------------------------------------------------------- #
+# 每個工作存成一列 (seq 為提交順序，data 為 Job 的 JSON)，排程器在提交、
+# 開始與結束時寫入，重新啟動時據此恢復佇列 (見 core/services/scheduler.py)。
+# 使用 WAL + synchronous=NORMAL：core 當機或重啟不會遺失已提交的工作；
+# 若整台機器斷電，最後幾筆寫入可能回復到前一個狀態。
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+FINAL_STATES = ("finished", "error", "cancelled")
+
+_conn: Optional[sqlite3.Connection] = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq   INTEGER PRIMARY KEY AUTOINCREMENT,
+    id    TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL,
+    data  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+
+def db_path() -> Path:
+    """Location of the job database."""
+    if settings.job_db_path is not None:
+        return Path(settings.job_db_path)
+    return DATA_DIR / "jobs.sqlite3"
+
+
+def open_store(path: Optional[Path] = None) -> None:
+    """Open (creating if needed) the job database."""
+    global _conn
+    if _conn is not None:
+        return
+    path = Path(path or db_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    _conn = conn
+
+
+def close() -> None:
+    """Close the job database."""
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+def save(job: Dict[str, Any]) -> None:
+    """Insert or update a job record (keeps its original submission order)."""
+    if _conn is None:
+        return
+    with _conn:
+        _conn.execute(
+            "INSERT INTO jobs (id, state, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET state = excluded.state, data = excluded.data",
+            (job["id"], job["state"], json.dumps(job)),
+        )
+
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    """Load a single job record."""
+    if _conn is None:
+        return None
+    row = _conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def unfinished() -> List[Dict[str, Any]]:
+    """Jobs that were queued or running when core stopped, in submission order."""
+    if _conn is None:
+        return []
+    marks = ",".join("?" * len(FINAL_STATES))
+    rows = _conn.execute(
+        f"SELECT data FROM jobs WHERE state NOT IN ({marks}) ORDER BY seq",
+        FINAL_STATES,
+    ).fetchall()
+    return [json.loads(row[0]) for row in rows]
@@ -0,0 +1,148 @@
+# core/services/latent_lut.py
+"""
+Precomputed sRGB → mixbox latent lookup table.
+
+以 n×n×n 的格點 (各通道 0–255 均分) 預先計算 mixbox.rgb_to_latent，存成 .npy
+並以 memory-map 方式延遲載入，查詢時以三線性內插一次處理 (N, 3) 個顏色。
+
+誤差上界 (對 mixbox.rgb_to_latent，窮舉整個 8-bit sRGB 立方體的 16.7M 個顏色)：
+- n = 64 (預設，約 7 MB)：格點與 mixbox 內部 LUT 對齊，c0–c3 僅有 float32
+  儲存誤差 (< 1e-7)；後三維 (多項式殘差) 最大絕對誤差約 4.1e-3，平均約 1.4e-5，
+  latent 向量 L2 誤差 < 4.5e-3，約為 mix.TOLERANCE (0.03) 的七分之一。
+- n = 32：最大絕對誤差約 4.4e-2，不建議使用。
+- n = 256：格點即 8-bit 值本身，僅剩 float32 儲存誤差 (< 1e-7)，
+  但檔案約 470 MB。
+實際數值可用 `python -m benchmarks.latent_lut` 重新量測。
+
+在 CPython 下，單一顏色查表的 numpy 固定開銷 (數十 µs) 反而比 mixbox 逐筆計算
+(約 8 µs) 慢，因此 rgb_to_latent() 只在一次轉換至少 LUT_MIN_BATCH 個顏色時
+才查表，少量顏色 (混色迴圈中的目標色與感測讀值) 仍直接呼叫 mixbox。
+"""
+import os
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import mixbox
+import numpy as np
+
+from core.config import settings
+
+LATENT_SIZE = mixbox.LATENT_SIZE
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+LUT_MIN_BATCH = 16  # 少於此數量的顏色直接以 mixbox 計算
+
+ArrayLikeI = Union[Sequence[int], Sequence[Sequence[int]], np.ndarray]
+
+_lut: Optional[np.ndarray] = None  # shape = (n³, LATENT_SIZE)，float32
+
+
+def lut_path(size: Optional[int] = None) -> Path:
+    """Location of the lookup table file for the given grid size."""
+    size = size or settings.latent_lut_size
+    if settings.latent_lut_path is not None:
+        return Path(settings.latent_lut_path)
+    return DATA_DIR / f"latent_lut_{size}.npy"
+
+
+def build(size: int, path: Optional[Path] = None) -> np.ndarray:
+    """
+    Compute the lookup table on a size³ grid and atomically write it to disk.
+
+    :param size: 每個通道的格點數 (≥ 2)
+    :param path: 輸出檔案，預設為 lut_path(size)
+    :return:     float32 ndarray，shape=(size³, LATENT_SIZE)，以 r + g·n + b·n² 排列
+    """
+    if size < 2:
+        raise ValueError(f"size 至少為 2，但收到 {size}")
+    path = Path(path or lut_path(size))
+    axis = np.linspace(0.0, 1.0, size)
+    lut = np.empty((size**3, LATENT_SIZE), dtype=np.float32)
+    i = 0
+    for b in axis:
+        for g in axis:
+            for r in axis:
+                lut[i] = mixbox.float_rgb_to_latent((r, g, b))
+                i += 1
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, lut)
+    os.replace(tmp, path)
+    return lut
+
+
+def get_lut() -> np.ndarray:
+    """Lazily memory-map (building it first if missing) the lookup table."""
+    global _lut
+    if _lut is None:
+        size = settings.latent_lut_size
+        path = lut_path(size)
+        if not path.exists():
+            print(f"Building {size}³ latent lookup table at {path} ...")
+            build(size, path)
+        lut = np.load(path, mmap_mode="r")
+        if lut.shape != (size**3, LATENT_SIZE):
+            # 例如 LATENT_LUT_PATH 指向以其他 latent_lut_size 建立的檔案
+            print(
+                f"{path} has shape {lut.shape}, expected {(size**3, LATENT_SIZE)}; "
+                f"rebuilding the {size}³ latent lookup table ..."
+            )
+            del lut
+            build(size, path)
+            lut = np.load(path, mmap_mode="r")
+        _lut = lut.view(np.ndarray)  # 略過 np.memmap 子類別的索引開銷
+    return _lut
+
+
+def lookup(rgb: ArrayLikeI) -> np.ndarray:
+    """
+    Vectorized sRGB → latent via trilinear interpolation on the lookup table.
+
+    :param rgb: (3,) 或 (N, 3)，各通道 0–255
+    :return:    float ndarray，shape=(LATENT_SIZE,) 或 (N, LATENT_SIZE)
+    """
+    lut = get_lut()
+    n = settings.latent_lut_size
+    arr = np.asarray(rgb, dtype=float)
+    single = arr.ndim == 1
+    arr = np.atleast_2d(arr)
+    if arr.shape[-1] != 3:
+        raise ValueError(f"rgb 最後一維應為 3，但收到 {arr.shape}")
+
+    x = np.clip(arr, 0.0, 255.0) * ((n - 1) / 255.0)
+    i0 = np.minimum(x.astype(np.int64), n - 2)
+    t = x - i0
+    base = i0[:, 0] + i0[:, 1] * n + i0[:, 2] * n * n
+
+    out = np.zeros((arr.shape[0], LATENT_SIZE))
+    for dz in (0, 1):
+        wz = t[:, 2] if dz else 1.0 - t[:, 2]
+        for dy in (0, 1):
+            wy = t[:, 1] if dy else 1.0 - t[:, 1]
+            for dx in (0, 1):
+                wx = t[:, 0] if dx else 1.0 - t[:, 0]
+                idx = base + dx + dy * n + dz * n * n
+                out += (wx * wy * wz)[:, np.newaxis] * lut[idx]
+    return out[0] if single else out
+
+
+def rgb_to_latent(rgb: ArrayLikeI) -> np.ndarray:
+    """
+    sRGB → latent, via the lookup table for batches, otherwise via mixbox.
+
+    :param rgb: (3,) 或 (N, 3)，各通道 0–255
+    :return:    float ndarray，shape=(LATENT_SIZE,) 或 (N, LATENT_SIZE)
+    """
+    arr = np.asarray(rgb)
+    if settings.use_latent_lut and arr.ndim == 2 and len(arr) >= LUT_MIN_BATCH:
+        return lookup(arr)
+    if arr.ndim == 1:
+        return np.array(mixbox.rgb_to_latent(tuple(arr.tolist())))
+    return np.array([mixbox.rgb_to_latent(tuple(c)) for c in arr.tolist()])
+
+
+if __name__ == "__main__":
+    build(settings.latent_lut_size)
+    print("Wrote", lut_path())
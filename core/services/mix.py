@@ -1,16 +1,27 @@
 import asyncio
 import datetime
+import time
+from contextlib import contextmanager
+from typing import Optional
 from fastapi import FastAPI
+from core.config import settings
+from core.services.controller import CONTROLLERS, MixController
 import core.services.hw_client as hw_client
-import mixbox
+import core.services.palette_cache as palette_cache
+import core.services.recipe_cache as recipe_cache
+import core.services.recipe_model as recipe_model
+import core.services.latent_lut as latent_lut
+import core.services.telemetry as telemetry
+from core.services.sampler import SensorSampler, sensor_sampler
 import numpy as np
 from scipy.optimize import nnls
 
 # 初始與最大總體積設定 (ml)
 START_VOLUME = 60
 MAX_VOLUME = 110
-BATCH_VOLUME = 5  # 每次迭代加料總量
+BATCH_VOLUME = 5  # iterative 控制器每次迭代加料總量上限
 TOLERANCE = 0.03  # 誤差容忍度
+STATUS_WAIT_MARGIN = 10.0  # 等待 agent 回到 idle 時，在預估出料時間之外多等的秒數
 
 
 def get_ratio(palette_latent: np.ndarray, target_latent: np.ndarray) -> np.ndarray:
@@ -28,142 +39,256 @@ def get_ratio(palette_latent: np.ndarray, target_latent: np.ndarray) -> np.ndarr
     return coeffs
 
 
-async def _set_state(app: FastAPI, state: str, message: str) -> None:
+async def _set_state(holder, state: str, message: str) -> None:
     """
-    Safely update the mixing status on app.state with a timestamp.
+    Safely update the mixing status on `holder` (app.state or a scheduler Job)
+    with a timestamp, waking up waiters of `holder.status_changed` and
+    subscribers of `holder.status_feed` (/ws/status) if present.
     """
     print(f"Setting state to {state} with message: {message}")
-    async with app.state.status_lock:
-        app.state.status_state = state
-        app.state.status_message = message
-        app.state.timestamp = datetime.datetime.now().isoformat()
+    async with holder.status_lock:
+        holder.status_state = state
+        holder.status_message = message
+        holder.timestamp = datetime.datetime.now().isoformat()
+        changed = getattr(holder, "status_changed", None)
+        if changed is not None:
+            changed.notify_all()
+        feed = getattr(holder, "status_feed", None)
+        if feed is not None:
+            feed.publish(state, message, holder.timestamp)
 
 
-async def start_mix(app: FastAPI, target_rgb: list[int]) -> None:
+@contextmanager
+def _timed(timings: dict, phase: str):
+    """Accumulate the wall time spent inside the block into timings[phase]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+def make_controller(name: Optional[str] = None) -> MixController:
+    """Instantiate the named mixing controller (default: settings.mix_controller)."""
+    name = name or settings.mix_controller
+    if name not in CONTROLLERS:
+        raise ValueError(f"Unknown mix controller: {name}")
+    return CONTROLLERS[name](START_VOLUME, MAX_VOLUME, BATCH_VOLUME)
+
+
+def _to_recipe(palette: list[dict], volumes: np.ndarray) -> list[dict]:
+    return [
+        {"id": color["id"], "name": color["name"], "volume": float(vol)}
+        for color, vol in zip(palette, volumes)
+        if vol > 0
+    ]
+
+
+def _from_recipe(palette: list[dict], recipe: list[dict]) -> np.ndarray:
+    volumes = {item["id"]: item["volume"] for item in recipe}
+    return np.array([float(volumes.get(color["id"], 0.0)) for color in palette])
+
+
+async def start_mix(
+    app: FastAPI,
+    target_rgb: list[int],
+    controller_name: Optional[str] = None,
+    job=None,
+    sampler: Optional[SensorSampler] = None,
+) -> None:
     """
     Iteratively mix colors to reach the target RGB.
 
     - 初始劑量: START_VOLUME ml
-    - 每輪最多加 BATCH_VOLUME ml，直到總量或達到目標。
+    - 之後每輪由控制器 (見 core/services/controller.py) 決定追加量，
+      直到總量達 MAX_VOLUME 或誤差小於 TOLERANCE。
+
+    每次 session 的目標、配方、感測讀值與各階段耗時 (palette_fetch, latent,
+    nnls, dose, status_wait, sensor_read) 會記錄在 app.state.last_mix_report，
+    結束時並交給 telemetry.record() 寫入混色紀錄 (見 core/services/telemetry.py)。
+
+    由排程器 (core/services/scheduler.py) 執行時，狀態與報告改寫入 `job`，
+    感測讀值來自該工作站的 `sampler`，hw_client 則由呼叫端以
+    hw_client.use_agent() 指向該工作站；結束後不做 finished 停留，
+    直接保留最終狀態。
     """
     print(f"Starting mix to target RGB: {target_rgb}")
+    holder = app.state if job is None else job
+    sampler = sampler or sensor_sampler
+    started = time.perf_counter()
+    setup: dict = {}
+    report = {
+        "target": list(target_rgb),
+        "controller": controller_name or settings.mix_controller,
+        "job": job.id if job is not None else None,
+        "station": job.station if job is not None else None,
+        "started_at": datetime.datetime.now().isoformat(),
+        "setup": setup,
+        "initial_recipe": [],
+        "dispensed": [],
+        "iterations": [],
+        "converged": False,
+        "total_volume": 0,
+        "duration": None,
+        "state": "running",
+    }
+    holder.last_mix_report = report
     try:
-        await _set_state(app, "running", f"Mixing to target RGB: {target_rgb}")
+        # 控制器名稱錯誤也要經由下方的 except 轉為 error 狀態
+        controller = make_controller(controller_name)
+        await _set_state(holder, "running", f"Mixing to target RGB: {target_rgb}")
 
-        palette = await hw_client.get_palette()
+        with _timed(setup, "palette_fetch"):
+            palette = await hw_client.get_palette()
         if not palette:
-            await _set_state(app, "error", "Failed to fetch color palette")
+            await _set_state(holder, "error", "Failed to fetch color palette")
             return
 
-        # 1. 生成 latent 矩陣
-        target_latent = np.array(mixbox.rgb_to_latent(target_rgb))
-        palette = sorted(palette, key=lambda c: c["id"])
-        palette_latent = np.column_stack(
-            [mixbox.rgb_to_latent(color["rgb"]) for color in palette]
-        )  # shape = (m, n)
-
-        # 2. 初始配比與加料
-        coeffs = get_ratio(palette_latent, target_latent)
-        props = coeffs / np.sum(coeffs)
-        init_volumes = np.round(props * START_VOLUME).astype(int)
-        recipe = [
-            {"id": color["id"], "name": color["name"], "volume": int(vol)}
-            for color, vol in zip(palette, init_volumes)
-            if vol > 0
-        ]
+        # 1. 生成 latent 矩陣 (palette 部分由快取提供)
+        with _timed(setup, "latent"):
+            target_latent = latent_lut.rgb_to_latent(target_rgb)
+            palette, palette_latent = palette_cache.get_palette_latent(
+                palette
+            )  # shape = (m, n)
+        report["palette"] = palette
+
+        # 2. 初始配比與加料 (相同 palette、控制器、修正模型與目標色的配方
+        #    由 LRU 快取提供)
+        model = recipe_model.get_model(palette)
+        report["recipe_model"] = model.version if model is not None else None
+        cache_key = recipe_cache.make_key(
+            f"{palette_cache.palette_hash(palette)}/{controller.name}"
+            f"/{report['recipe_model']}",
+            target_rgb,
+        )
+        controller.start(palette_latent, target_latent, model)
+        recipe = recipe_cache.get(cache_key)
+        if recipe is None:
+            with _timed(setup, "nnls"):
+                recipe = _to_recipe(palette, controller.initial_volumes())
+            recipe_cache.put(cache_key, recipe)
         print(f"Initial recipe: {recipe}")
-        total_volume = int(np.sum(init_volumes))
+        dispensed = _from_recipe(palette, recipe)
+        total_volume = float(np.sum(dispensed))
+        report["initial_recipe"] = recipe
+        report["dispensed"] = recipe
+        report["total_volume"] = total_volume
 
-        response = await hw_client.dose_color(recipe)
+        with _timed(setup, "dose"):
+            response = await hw_client.dose_color(recipe)
+        if response.get("state") != "accepted":
+            await _set_state(
+                holder, "error", f"Failed to dose colors: {response.get('message','')}"
+            )
+            return
+        # agent 回傳出料計畫的預估時間 (eta)，據此決定等待上限
+        dose_eta = float(response.get("eta") or 0.0)
 
         # 3. 迭代加料
-        while total_volume < MAX_VOLUME:
-            status = await hw_client.get_status()
+        timings: dict = {}
+        # 每次加料後都會量測一次 (包括達到 MAX_VOLUME 的最後一次)
+        while True:
+            with _timed(timings, "status_wait"):
+                status = await hw_client.wait_for_status(
+                    "idle", timeout=dose_eta + STATUS_WAIT_MARGIN
+                )
             if status.get("state") != "idle":
-                await asyncio.sleep(0.1)
                 continue
             print(f"Current total volume: {total_volume} ml")
 
-            current_rgb = await hw_client.get_color()
+            with _timed(timings, "sensor_read"):
+                # agent 回到 idle 前已靜置並換新取樣；不沿用 idle 之前的讀值
+                hw_client.invalidate("/color")
+                current_rgb = await sampler.get_color(max_age=0)
             if current_rgb is None:
                 print("Failed to fetch current color")
-                await _set_state(app, "error", "Failed to fetch current color")
+                await _set_state(holder, "error", "Failed to fetch current color")
                 return
             print(f"Current RGB: {current_rgb}")
 
-            current_latent = np.array(mixbox.rgb_to_latent(current_rgb))
+            with _timed(timings, "latent"):
+                current_latent = latent_lut.rgb_to_latent(current_rgb)
             delta_latent = target_latent - current_latent
-            print(f"Delta latent vector: {delta_latent}", np.linalg.norm(delta_latent))
-            if np.linalg.norm(delta_latent) < TOLERANCE:
+            error = float(np.linalg.norm(delta_latent))
+            iteration = {
+                "rgb": list(current_rgb),
+                "delta_latent": delta_latent.tolist(),
+                "error": error,
+                "recipe": [],
+                "volume": total_volume,
+                "timings": timings,
+            }
+            report["iterations"].append(iteration)
+            print(f"Delta latent vector: {delta_latent}", error)
+            if error < TOLERANCE:
                 print("Target color reached within tolerance.")
+                report["converged"] = True
+                break
+            if total_volume >= MAX_VOLUME:
+                print("Maximum volume reached.")
                 break
 
-            cur_palette_latent = np.hstack(
-                [palette_latent, current_latent[:, np.newaxis]]
-            )
-
-            coeffs_rem = get_ratio(cur_palette_latent, delta_latent)
-            props_rem = coeffs_rem / np.sum(coeffs_rem)
-            print(f"Remaining proportions: {props_rem}")
-
-            batch_volume = BATCH_VOLUME
-            if props_rem[-1] != 0:
-                batch_volume = min(BATCH_VOLUME, total_volume / props_rem[-1])
-                print(
-                    f"Adjusting batch volume to {batch_volume} ml based on current color"
-                )
-
-            batch_volume = min(batch_volume, MAX_VOLUME - total_volume)
-            deltas = np.round(props_rem[:-1] * batch_volume, decimals=3)
+            with _timed(timings, "nnls"):
+                deltas = controller.next_volumes(current_latent, dispensed)
 
-            batch_recipe = [
-                {"id": color["id"], "name": color["name"], "volume": float(vol)}
-                for color, vol in zip(palette, deltas)
-                if vol > 0
-            ]
+            batch_recipe = _to_recipe(palette, deltas)
+            if not batch_recipe:
+                print("Controller cannot improve the mix any further.")
+                break
+            iteration["recipe"] = batch_recipe
             print(f"Batch recipe: {batch_recipe}")
             await _set_state(
-                app,
+                holder,
                 "running",
-                f"Mixing batch: {batch_recipe} (total volume: {total_volume + int(np.sum(deltas))} ml)",
+                f"Mixing batch: {batch_recipe} (total volume: {total_volume + float(np.sum(deltas)):.1f} ml)",
             )
 
-            response = await hw_client.dose_color(batch_recipe)
+            with _timed(timings, "dose"):
+                response = await hw_client.dose_color(batch_recipe)
             if response.get("state") != "accepted":
                 await _set_state(
-                    app, "error", f"Failed to dose colors: {response.get('message','')}"
+                    holder,
+                    "error",
+                    f"Failed to dose colors: {response.get('message','')}",
                 )
                 return
+            dose_eta = float(response.get("eta") or 0.0)
 
-            added = int(np.sum(deltas))
-            total_volume += added
+            dispensed = dispensed + np.clip(deltas, 0, None)
+            total_volume = float(np.sum(dispensed))
+            report["dispensed"] = _to_recipe(palette, dispensed)
+            report["total_volume"] = total_volume
             await asyncio.sleep(0.5)
+            timings = {}
 
+        await _set_state(holder, "running", "Waiting for pumps to finish")
         while True:
-            status = await hw_client.get_status()
+            status = await hw_client.wait_for_status("idle")
             if status.get("state") == "idle":
                 break
             await _set_state(
-                app,
+                holder,
                 "running",
                 f"Waiting for pumps to finish, current state: {status.get('state')}",
             )
-            # print(f"Waiting for pumps to finish, current state: {status.get('state')}")
-            await asyncio.sleep(0.1)
 
-        await _set_state(app, "finished", "Mixing completed successfully")
+        await _set_state(holder, "finished", "Mixing completed successfully")
 
     except asyncio.CancelledError:
         print("Mixing session was cancelled")
-        await _set_state(app, "cancelling", "Mixing session is cancelling")
+        await _set_state(holder, "cancelling", "Mixing session is cancelling")
 
         await hw_client.halt_pumps()
         raise
 
     except Exception as e:
         print(f"Error during mixing: {e}")
-        await _set_state(app, "error", f"Error during mixing: {e}")
+        await _set_state(holder, "error", f"Error during mixing: {e}")
 
     finally:
-        await asyncio.sleep(3)
-        await _set_state(app, "idle", "Core is idle")
+        report["state"] = holder.status_state
+        report["duration"] = time.perf_counter() - started
+        telemetry.record(report)
+        if job is None:
+            await asyncio.sleep(3)
+            await _set_state(holder, "idle", "Core is idle")
@@ -0,0 +1,91 @@
+# core/services/palette_cache.py
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.services import latent_lut
+
+# --------------------------------------------------------------------------- #
+# Shared palette → latent cache
+# --------------------------------------------------------------------------- #
+# 以 palette 內容的 hash 作為 key，跨混色 session 共用。
+# 當 agent 回報的 palette 內容改變 (hash 不同) 時，舊的 entry 會被丟棄。
+_entry: Optional[Tuple[str, List[Dict[str, Any]], np.ndarray]] = None
+_hits = 0
+_misses = 0
+
+
+def palette_hash(palette: List[Dict[str, Any]]) -> str:
+    """Stable content hash of a palette, independent of item order."""
+    items = sorted(
+        ({"id": c["id"], "name": c["name"], "rgb": list(c["rgb"])} for c in palette),
+        key=lambda c: c["id"],
+    )
+    blob = json.dumps(items, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def get_palette_latent(
+    palette: List[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Return the palette sorted by id and its latent matrix.
+
+    Args:
+        palette: palette as reported by the hardware agent.
+
+    Returns:
+        (sorted_palette, palette_latent)，palette_latent shape = (m, n)，
+        欄向量為各顏料的 latent vector (唯讀，跨 session 共用)。
+    """
+    global _entry, _hits, _misses
+    key = palette_hash(palette)
+    if _entry is not None and _entry[0] == key:
+        _hits += 1
+        return _entry[1], _entry[2]
+
+    _misses += 1
+    ordered, latent = latent_matrix(palette)
+    _entry = (key, ordered, latent)
+    return ordered, latent
+
+
+def latent_matrix(
+    palette: List[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    (sorted_palette, palette_latent) of any palette, without touching the cache.
+
+    用於請求中自帶的 palette：快取只保存 agent 回報的 palette，避免
+    /recipes/batch 等呼叫端的 palette 被之後的請求或模型訓練誤用。
+    """
+    ordered = sorted(palette, key=lambda c: c["id"])
+    latent = np.ascontiguousarray(
+        latent_lut.rgb_to_latent([c["rgb"] for c in ordered]).T
+    )
+    latent.setflags(write=False)  # 共用矩陣，避免被呼叫端意外修改
+    return ordered, latent
+
+
+def current() -> Optional[Tuple[List[Dict[str, Any]], np.ndarray]]:
+    """Most recently cached (sorted_palette, palette_latent), if any."""
+    if _entry is None:
+        return None
+    return _entry[1], _entry[2]
+
+
+def invalidate() -> None:
+    """Drop the cached palette latent matrix."""
+    global _entry
+    _entry = None
+
+
+def stats() -> Dict[str, Any]:
+    """Hit/miss counters of the palette latent cache."""
+    return {
+        "hits": _hits,
+        "misses": _misses,
+        "palette_hash": _entry[0] if _entry is not None else None,
+    }
@@ -0,0 +1,230 @@
+# core/services/raw_stream.py
+"""
+Consumer of the agent's binary raw RGBC frame stream (WebSocket /ws/raw).
+
+格式見 hw_agent/services/raw_stream.py：先收一則 JSON hello (格式、感測器設定
+與校正值)，之後每則 binary 訊息為一或多個 20 bytes 的 packed frame。
+binary 訊息以 np.frombuffer 直接解讀為 structured array (不複製、不經 JSON /
+pydantic)，再整批寫入固定大小的 ring buffer。
+
+raw 讀值以 hello 中的校正值在 core 端轉為 float RGB，不經 agent GET /color 的
+8-bit 取整，因此可用來取得比 JSON 輪詢更高頻率、更高精度的回饋。
+
+agent 重啟後 seq 從 1 重新計數，因此 seq 只在 hello 的 epoch 內可比較：
+重新連線時一併送出 epoch，收到不同 epoch 的 hello 時捨棄先前的 frame 與 seq。
+"""
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+import numpy as np
+from websockets.asyncio.client import connect
+
+from core.config import settings
+
+PROTOCOL_VERSION = 1
+FRAME_DTYPE = np.dtype(
+    [("seq", "<u4"), ("timestamp", "<f8"), ("rgbc", "<u2", (4,))]
+)  # packed，itemsize 20，與 agent 的 struct "<Id4H" 相同
+RECONNECT_DELAY = 0.5  # 斷線後第一次重連前的等待 (s)，之後倍增
+MAX_RECONNECT_DELAY = 5.0
+
+
+def decode(message: bytes) -> np.ndarray:
+    """Zero-copy (read-only) view of the frames in one binary message."""
+    if len(message) % FRAME_DTYPE.itemsize:
+        raise ValueError(
+            f"Message of {len(message)} bytes is not a whole number of frames"
+        )
+    return np.frombuffer(message, dtype=FRAME_DTYPE)
+
+
+def calibrate(rgbc: np.ndarray, calibration: Dict[str, Any]) -> np.ndarray:
+    """
+    Calibrated RGB (N, 3) float, 0–255, of raw RGBC readings (N, 4).
+
+    與 agent 的 Calibration.apply_batch() 相同的轉換 (white / black 正規化 →
+    除以 clear channel → 色彩校正矩陣)，但不做 8-bit 截斷。
+    """
+    black = np.asarray(calibration["black"], dtype=float)
+    span = np.asarray(calibration["white"], dtype=float) - black
+    norm = np.maximum((np.asarray(rgbc, dtype=float) - black) / span, 0.0)
+    clear = norm[:, 3:]
+    rgb = np.divide(
+        norm[:, :3] * 255.0, clear, out=np.zeros_like(norm[:, :3]), where=clear > 0
+    )
+    np.clip(rgb, 0.0, 255.0, out=rgb)
+    return np.clip(rgb @ np.asarray(calibration["matrix"], dtype=float), 0.0, 255.0)
+
+
+def _ws_url(base_url: str) -> str:
+    if base_url.startswith("https://"):
+        return "wss://" + base_url[len("https://") :].rstrip("/") + "/ws/raw"
+    return "ws://" + base_url.removeprefix("http://").rstrip("/") + "/ws/raw"
+
+
+class RawStream:
+    """
+    Background consumer of one agent's /ws/raw with a ring buffer of frames.
+
+    start() 後持續連線 (斷線時以指數退避重連，並以 ?since=&epoch= 接續最後的
+    seq)；frames() / reading() 讀取目前 epoch 最近的 frame，age() 為最新一批
+    frame 收到至今的秒數。
+    """
+
+    def __init__(self, base_url: str, capacity: int = 1024):
+        self.base_url = base_url
+        self.hello: Optional[Dict[str, Any]] = None
+        self._ring = np.zeros(capacity, dtype=FRAME_DTYPE)
+        self._count = 0  # 累計寫入 ring 的 frame 數
+        self._epoch_start = 0  # 目前 epoch 第一個 frame 的 _count
+        self._last_seq: Optional[int] = None
+        self._received: Optional[float] = None  # 最新一批 frame 的 loop.time()
+        self._task: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+        self.connected = False
+        self.messages = 0
+        self.bytes = 0
+        self.missed = 0  # 依 seq 間隔推算遺漏的 frame 數
+        self.reconnects = 0
+
+    # ---- lifecycle --------------------------------------------------------- #
+    def start(self) -> None:
+        """Start the background connection task (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.connected = False
+
+    async def _run(self) -> None:
+        delay = RECONNECT_DELAY
+        while True:
+            url = _ws_url(self.base_url)
+            if self._last_seq is not None:
+                url += f"?since={self._last_seq}&epoch={self.hello['epoch']}"
+            try:
+                async with connect(url, max_size=None) as ws:
+                    await self._consume(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Raw frame stream from {self.base_url} failed: {e!r}")
+            if self.connected:
+                delay = RECONNECT_DELAY  # 曾經連上則重新計算退避
+            self.connected = False
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def _consume(self, ws) -> None:
+        self._set_hello(await ws.recv())
+        self.connected = True
+        async for message in ws:
+            if isinstance(message, str):
+                self._set_hello(message)  # 校正值更新
+                continue
+            self.messages += 1
+            self.bytes += len(message)
+            self._append(decode(message))
+
+    def _set_hello(self, message) -> None:
+        hello = json.loads(message)
+        if (
+            hello.get("version") != PROTOCOL_VERSION
+            or hello.get("frame_size") != FRAME_DTYPE.itemsize
+        ):
+            raise ValueError(f"Unsupported raw frame stream: {hello}")
+        if self.hello is not None and hello.get("epoch") != self.hello.get("epoch"):
+            print(f"Raw frame stream from {self.base_url} restarted; dropping frames.")
+            self._epoch_start = self._count  # 舊 epoch 的 frame 不再讀取
+            self._last_seq = None
+            self._received = None
+        self.hello = hello
+
+    def _append(self, frames: np.ndarray) -> None:
+        if not len(frames):
+            return
+        if self._last_seq is not None:
+            self.missed += max(0, int(frames["seq"][0]) - self._last_seq - 1)
+        self._last_seq = int(frames["seq"][-1])
+
+        capacity = len(self._ring)
+        frames = frames[-capacity:]
+        start = self._count % capacity
+        first = min(len(frames), capacity - start)
+        self._ring[start : start + first] = frames[:first]
+        self._ring[: len(frames) - first] = frames[first:]
+        self._count += len(frames)
+        self._received = asyncio.get_running_loop().time()
+
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    # ---- readers ----------------------------------------------------------- #
+    def frames(self, n: Optional[int] = None) -> np.ndarray:
+        """The latest `n` frames (all buffered if None), oldest first (copy)."""
+        available = min(self._count - self._epoch_start, len(self._ring))
+        n = available if n is None else min(n, available)
+        if n <= 0:
+            return self._ring[:0].copy()
+        indices = np.arange(self._count - n, self._count) % len(self._ring)
+        return self._ring[indices]
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the next message; False on timeout."""
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def age(self) -> Optional[float]:
+        """Seconds since the newest frame arrived; None if there is none."""
+        if self._received is None:
+            return None
+        return asyncio.get_running_loop().time() - self._received
+
+    def reading(self, n: int) -> Optional[Dict[str, Any]]:
+        """
+        Median calibrated float RGB (and raw RGBC) over the latest `n` frames.
+
+        :return: {"rgb", "rgbc", "samples", "seq", "timestamp"}；尚無 frame 時為 None
+        """
+        frames = self.frames(n)
+        if not len(frames) or self.hello is None:
+            return None
+        rgbc = frames["rgbc"]
+        rgb = calibrate(rgbc, self.hello["calibration"])
+        return {
+            "rgb": np.median(rgb, axis=0).tolist(),
+            "rgbc": np.median(rgbc, axis=0).tolist(),
+            "samples": len(frames),
+            "seq": int(frames["seq"][-1]),
+            "timestamp": float(frames["timestamp"][-1]),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection state and counters of the stream."""
+        return {
+            "connected": self.connected,
+            "frames": self._count,
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "missed": self.missed,
+            "reconnects": self.reconnects,
+            "last_seq": self._last_seq,
+            "epoch": self.hello["epoch"] if self.hello is not None else None,
+            "age": self.age(),
+        }
+
+
+# 預設 agent 的 raw frame 串流，第一次需要時才連線
+raw_stream = RawStream(settings.hw_agent_base_url, settings.raw_stream_buffer)
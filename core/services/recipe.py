@@ -0,0 +1,157 @@
+# core/services/recipe.py
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.optimize import nnls
+
+from core.services import latent_lut
+from core.services.controller import NNLS_SECONDS
+
+# 顏料數量不超過此值時，以「枚舉所有 support 子集」的方式一次向量化求解 NNLS；
+# 超過時改用逐筆 nnls，並在目標數量夠多時分散到 process pool
+# (由 core lifespan 以 start_pool() 建立一次，跨請求共用)。
+MAX_SUBSET_PAINTS = 8
+POOL_MIN_TARGETS = 2000  # 少於此數量時直接在本 process 內求解
+FEASIBLE_EPS = 1e-12
+
+_subset_cache: Dict[bytes, List[tuple]] = {}
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+
+# --------------------------------------------------------------------------- #
+# Process pool (large palettes only)
+# --------------------------------------------------------------------------- #
+def start_pool(workers: Optional[int] = None) -> None:
+    """Create the shared NNLS process pool (idempotent; workers 預設為 CPU 數量)."""
+    global _pool, _pool_workers
+    workers = workers or os.cpu_count() or 1
+    if _pool is None and workers > 1:
+        _pool = ProcessPoolExecutor(max_workers=workers)  # worker 於第一次使用時才啟動
+        _pool_workers = workers
+
+
+def stop_pool() -> None:
+    """Shut the process pool down (blocking; call via to_thread)."""
+    global _pool, _pool_workers
+    pool, _pool, _pool_workers = _pool, None, 0
+    if pool is not None:
+        pool.shutdown()
+
+
+def targets_to_latent(targets: Sequence[Sequence[int]]) -> np.ndarray:
+    """
+    Convert N target RGBs to latent vectors, converting each distinct color once.
+
+    :param targets: N 筆 (R, G, B)，各通道 0–255
+    :return:        float ndarray，shape=(N, m)
+    """
+    arr = np.asarray(targets, dtype=np.int64).reshape(-1, 3)
+    uniq, inverse = np.unique(arr, axis=0, return_inverse=True)
+    return latent_lut.rgb_to_latent(uniq)[inverse.reshape(-1)]
+
+
+def _subset_solvers(palette_latent: np.ndarray) -> List[tuple]:
+    """Pseudo-inverses of every non-empty column subset of the palette matrix."""
+    key = palette_latent.tobytes() + bytes(str(palette_latent.shape), "ascii")
+    solvers = _subset_cache.get(key)
+    if solvers is None:
+        n = palette_latent.shape[1]
+        solvers = []
+        for k in range(1, n + 1):
+            for cols in itertools.combinations(range(n), k):
+                cols = np.array(cols)
+                sub = palette_latent[:, cols]
+                solvers.append((cols, sub, np.linalg.pinv(sub)))
+        _subset_cache.clear()  # 只保留最近一組 palette
+        _subset_cache[key] = solvers
+    return solvers
+
+
+def _solve_subsets(palette_latent: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Exact batched NNLS for small palettes.
+
+    NNLS 的最優解等於其 support 上的無約束最小平方解；因此對每個子集求一次
+    (向量化於所有目標上) 最小平方解，在可行 (全非負) 的解中取殘差最小者即可。
+    """
+    N, n = targets.shape[0], palette_latent.shape[1]
+    best = np.zeros((N, n))
+    best_res = np.einsum("ij,ij->i", targets, targets)  # 空集合 (x = 0) 的殘差
+    for cols, sub, pinv in _subset_solvers(palette_latent):
+        x = targets @ pinv.T  # (N, k)
+        feasible = np.all(x >= -FEASIBLE_EPS, axis=1)
+        r = targets - x @ sub.T
+        res = np.einsum("ij,ij->i", r, r)
+        better = feasible & (res < best_res - FEASIBLE_EPS)
+        if np.any(better):
+            best_res[better] = res[better]
+            best[better] = 0.0
+            best[np.ix_(better, cols)] = np.clip(x[better], 0.0, None)
+    return best
+
+
+def _nnls_chunk(palette_latent: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    return np.array([nnls(palette_latent, t)[0] for t in targets])
+
+
+def solve_ratios(palette_latent: np.ndarray, targets_latent: np.ndarray) -> np.ndarray:
+    """
+    Solve palette_latent @ x ≈ t (x >= 0) for every row t of targets_latent.
+
+    Args:
+        palette_latent: (m×n) 矩陣，欄向量為基底 latent vectors。
+        targets_latent: (N×m) 目標 latent vectors。
+
+    Returns:
+        coeffs: (N×n) 非負最小平方係數。
+    """
+    targets_latent = np.atleast_2d(np.asarray(targets_latent, dtype=float))
+    with NNLS_SECONDS.time("batch"):
+        if palette_latent.shape[1] <= MAX_SUBSET_PAINTS:
+            return _solve_subsets(palette_latent, targets_latent)
+
+        pool = _pool
+        if pool is None or len(targets_latent) < POOL_MIN_TARGETS:
+            return _nnls_chunk(palette_latent, targets_latent)
+
+        chunks = np.array_split(targets_latent, _pool_workers * 4)
+        parts = pool.map(_nnls_chunk, itertools.repeat(palette_latent), chunks)
+        return np.vstack(list(parts))
+
+
+def batch_recipes(
+    palette: List[Dict[str, Any]],
+    palette_latent: np.ndarray,
+    targets: Sequence[Sequence[int]],
+    total_volume: float,
+    model=None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Compute the initial recipe (same rule as mix.start_mix) for each target.
+
+    :param palette:        依 id 排序的 palette，順序與 palette_latent 欄位一致
+    :param palette_latent: (m×n) palette latent 矩陣
+    :param targets:        N 筆目標 RGB
+    :param total_volume:   每筆配方的總體積 (mL)
+    :param model:          選用的 recipe_model.RecipeModel，一次修正全部配比
+    :return:               N 筆配方，每筆為 DoseItem 形式的 dict list
+    """
+    targets_latent = targets_to_latent(targets)
+    coeffs = solve_ratios(palette_latent, targets_latent)
+    sums = coeffs.sum(axis=1, keepdims=True)
+    props = np.divide(coeffs, sums, out=np.zeros_like(coeffs), where=sums > 0)
+    if model is not None:
+        props = model.correct(props, targets_latent)
+    volumes = np.round(props * total_volume).astype(int)
+    return [
+        [
+            {"id": color["id"], "name": color["name"], "volume": int(vol)}
+            for color, vol in zip(palette, row)
+            if vol > 0
+        ]
+        for row in volumes
+    ]
@@ -0,0 +1,132 @@
+# core/services/recipe_cache.py
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.config import settings
+
+# --------------------------------------------------------------------------- #
+# LRU cache: (palette hash, quantized target RGB) → initial recipe
+# --------------------------------------------------------------------------- #
+Key = Tuple[str, Tuple[int, int, int]]
+Recipe = List[Dict[str, Any]]
+
+_cache: "OrderedDict[Key, Recipe]" = OrderedDict()
+_loaded = False
+_hits = 0
+_misses = 0
+_evictions = 0
+
+
+def make_key(palette_key: str, target_rgb: Sequence[int]) -> Key:
+    """Build a cache key, quantizing the target to settings.recipe_cache_quantum."""
+    q = max(1, settings.recipe_cache_quantum)
+    rgb = tuple(int(round(int(c) / q)) * q for c in target_rgb)
+    return palette_key, rgb
+
+
+def get(key: Key) -> Optional[Recipe]:
+    """Return a copy of the cached recipe and mark it most recently used."""
+    global _hits, _misses
+    _ensure_loaded()
+    recipe = _cache.get(key)
+    if recipe is None:
+        _misses += 1
+        return None
+    _hits += 1
+    _cache.move_to_end(key)
+    return [dict(item) for item in recipe]
+
+
+def put(key: Key, recipe: Recipe) -> None:
+    """Insert a recipe, evicting the least recently used entries if full."""
+    global _evictions
+    _ensure_loaded()
+    _cache[key] = [dict(item) for item in recipe]
+    _cache.move_to_end(key)
+    while len(_cache) > max(0, settings.recipe_cache_size):
+        _cache.popitem(last=False)
+        _evictions += 1
+
+
+def clear() -> None:
+    """Drop every cached recipe (counters are kept)."""
+    _cache.clear()
+
+
+def stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters of the recipe cache."""
+    lookups = _hits + _misses
+    return {
+        "hits": _hits,
+        "misses": _misses,
+        "evictions": _evictions,
+        "size": len(_cache),
+        "capacity": settings.recipe_cache_size,
+        "hit_rate": _hits / lookups if lookups else 0.0,
+    }
+
+
+# --------------------------------------------------------------------------- #
+# Optional on-disk persistence
+# --------------------------------------------------------------------------- #
+def _ensure_loaded() -> None:
+    if not _loaded:
+        load()
+
+
+def load(path: Optional[Path] = None) -> None:
+    """Load persisted entries (oldest first) from the cache file, if configured."""
+    global _loaded
+    _loaded = True
+    path = path or settings.recipe_cache_path
+    if path is None or not Path(path).exists():
+        return
+    try:
+        entries = _parse(json.loads(Path(path).read_text(encoding="utf-8")))
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        # 檔案被截斷或手動修改時從空快取開始，不影響 core 啟動
+        print(f"Ignoring unreadable recipe cache {path}: {e!r}")
+        return
+    _cache.update(entries)
+    while len(_cache) > max(0, settings.recipe_cache_size):
+        _cache.popitem(last=False)
+
+
+def _parse(entries: Any) -> "OrderedDict[Key, Recipe]":
+    """Validate the [[palette_key, [r, g, b], recipe], ...] file content."""
+    if not isinstance(entries, list):
+        raise ValueError("expected a list of entries")
+    parsed: "OrderedDict[Key, Recipe]" = OrderedDict()
+    for palette_key, rgb, recipe in entries:
+        if not isinstance(palette_key, str) or len(rgb) != 3:
+            raise ValueError(f"invalid key {palette_key!r}, {rgb!r}")
+        items = []
+        for item in recipe:
+            if not isinstance(item["volume"], (int, float)):
+                raise ValueError(f"invalid recipe item {item!r}")
+            items.append(
+                {
+                    "id": int(item["id"]),
+                    "name": str(item["name"]),
+                    "volume": item["volume"],
+                }
+            )
+        parsed[(palette_key, tuple(int(c) for c in rgb))] = items
+    return parsed
+
+
+def save(path: Optional[Path] = None) -> None:
+    """Atomically write the cache (in LRU order) to the cache file, if configured."""
+    path = path or settings.recipe_cache_path
+    if path is None:
+        return
+    _ensure_loaded()  # 避免尚未載入時以空快取覆蓋既有檔案
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entries = [[k[0], list(k[1]), recipe] for k, recipe in _cache.items()]
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(entries), encoding="utf-8")
+    os.replace(tmp, path)
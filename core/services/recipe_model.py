@@ -0,0 +1,252 @@
+# core/services/recipe_model.py
+"""
+Learned correction of the initial (mixbox NNLS) recipe.
+
+NNLS 在 mixbox latent 空間求得的初始配比 p₀ 假設每支 pump 依指令出料、顏料
+行為與 palette 的名目 RGB 完全一致；實機上的偏差會讓迴圈需要多次修正。
+這裡以 telemetry (core/services/telemetry.py) 中已收斂 session 的
+「目標色 → 最終出料配比 p*」訓練一個 ridge 迴歸，預測殘差：
+
+    p* − p₀ ≈ φ(p₀, t) W，  φ = [p₀, latent(t), 1]
+
+套用時 p = normalize(max(p₀ + φW, 0))。模型以 palette (id 與 rgb) 為 key，
+palette 不同時不套用；訓練時以 leave-one-out 誤差驗證，只有比 p₀ 更準時才
+會啟用。模型存於 settings.recipe_model_path (預設 core/data/recipe_model.npz)，
+第一次需要時才載入。
+"""
+import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.config import settings
+from core.services import telemetry
+from core.services.recipe import solve_ratios, targets_to_latent
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+MIN_SAMPLES = 20  # 少於此數量的 session 不訓練
+DEFAULT_RIDGE = 1e-2
+
+_TRAIN_COLUMNS = (
+    "target",
+    "converged",
+    "started_at",
+    "palette_offsets",
+    "palette_id",
+    "palette_rgb",
+    "dispensed_offsets",
+    "dispensed_id",
+    "dispensed_volume",
+)
+
+_model: Optional["RecipeModel"] = None
+_loaded = False
+
+
+def palette_key(ids: Sequence[int], rgbs: Sequence[Sequence[int]]) -> str:
+    """Hash of the paints (id and rgb) a model was trained for."""
+    items = sorted((int(i), [int(c) for c in rgb]) for i, rgb in zip(ids, rgbs))
+    return hashlib.sha1(json.dumps(items).encode("ascii")).hexdigest()
+
+
+def _proportions(volumes: np.ndarray) -> np.ndarray:
+    sums = volumes.sum(axis=1, keepdims=True)
+    return np.divide(volumes, sums, out=np.zeros_like(volumes), where=sums > 0)
+
+
+def _features(props: np.ndarray, targets_latent: np.ndarray) -> np.ndarray:
+    return np.hstack([props, targets_latent, np.ones((len(props), 1))])
+
+
+class RecipeModel:
+    """Ridge regression on top of the NNLS proportions of one palette."""
+
+    def __init__(
+        self,
+        palette_ids: Sequence[int],
+        palette_rgb: Sequence[Sequence[int]],
+        weights: np.ndarray,
+        meta: Optional[Dict[str, Any]] = None,
+    ):
+        self.palette_ids = [int(i) for i in palette_ids]
+        self.palette_rgb = [[int(c) for c in rgb] for rgb in palette_rgb]
+        self.weights = np.asarray(weights, dtype=float)  # (n + m + 1, n)
+        self.meta = dict(meta or {})
+        self.key = palette_key(self.palette_ids, self.palette_rgb)
+        self.version = str(self.meta.get("trained_at", ""))
+
+    @property
+    def enabled(self) -> bool:
+        """False when validation showed no gain over the plain NNLS recipe."""
+        return bool(self.meta.get("enabled", True))
+
+    def matches(self, palette: List[Dict[str, Any]]) -> bool:
+        return self.key == palette_key(
+            [c["id"] for c in palette], [c["rgb"] for c in palette]
+        )
+
+    def correct(self, props: np.ndarray, targets_latent: np.ndarray) -> np.ndarray:
+        """
+        Corrected proportions for N targets (vectorized).
+
+        :param props:          (N, n) NNLS 配比，各列總和為 1
+        :param targets_latent: (N, m) 目標 latent
+        :return:               (N, n) 修正後配比；修正後全為 0 的列保留原值
+        """
+        props = np.atleast_2d(props)
+        corrected = (
+            props + _features(props, np.atleast_2d(targets_latent)) @ self.weights
+        )
+        np.clip(corrected, 0.0, None, out=corrected)
+        corrected[props == 0] = 0.0  # 不引入 NNLS 沒有選用的顏料
+        sums = corrected.sum(axis=1, keepdims=True)
+        return np.where(sums > 0, corrected / np.where(sums > 0, sums, 1.0), props)
+
+    def info(self) -> Dict[str, Any]:
+        return {"palette_ids": self.palette_ids, "version": self.version, **self.meta}
+
+    # ---- persistence ------------------------------------------------------- #
+    def save(self, path: Optional[Path] = None) -> None:
+        path = Path(path or model_path())
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            np.savez(
+                f,
+                palette_ids=np.array(self.palette_ids),
+                palette_rgb=np.array(self.palette_rgb),
+                weights=self.weights,
+                meta=np.array(json.dumps(self.meta)),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RecipeModel":
+        with np.load(path) as npz:
+            return cls(
+                npz["palette_ids"],
+                npz["palette_rgb"],
+                npz["weights"],
+                json.loads(str(npz["meta"])),
+            )
+
+
+def model_path() -> Path:
+    """Location of the trained model."""
+    if settings.recipe_model_path is not None:
+        return Path(settings.recipe_model_path)
+    return DATA_DIR / "recipe_model.npz"
+
+
+def current() -> Optional[RecipeModel]:
+    """The trained model, loaded from disk on first use (None if there is none)."""
+    global _model, _loaded
+    if not _loaded:
+        _loaded = True
+        path = model_path()
+        if path.exists():
+            try:
+                _model = RecipeModel.load(path)
+                print(f"Loaded recipe model {_model.version} from {path}")
+            except Exception as e:
+                print(f"Failed to load recipe model from {path}: {e}")
+    return _model
+
+
+def get_model(palette: List[Dict[str, Any]]) -> Optional[RecipeModel]:
+    """The model to apply for this (id-sorted) palette, if enabled and usable."""
+    if not settings.use_recipe_model:
+        return None
+    model = current()
+    if model is None or not model.enabled or not model.matches(palette):
+        return None
+    return model
+
+
+# --------------------------------------------------------------------------- #
+# Training
+# --------------------------------------------------------------------------- #
+def _training_set(palette: List[Dict[str, Any]], since: Optional[float]):
+    """(targets (N, 3), final proportions (N, n)) of matching converged sessions."""
+    ids = [c["id"] for c in palette]
+    key = palette_key(ids, [c["rgb"] for c in palette])
+    column = {paint_id: j for j, paint_id in enumerate(ids)}
+    targets, finals = [], []
+    for shard in telemetry.load(_TRAIN_COLUMNS):
+        po, do = shard["palette_offsets"], shard["dispensed_offsets"]
+        for i in np.flatnonzero(shard["converged"]):
+            if since is not None and not shard["started_at"][i] >= since:
+                continue
+            s_ids = shard["palette_id"][po[i] : po[i + 1]]
+            if palette_key(s_ids, shard["palette_rgb"][po[i] : po[i + 1]]) != key:
+                continue
+            volumes = np.zeros(len(ids))
+            for paint_id, vol in zip(
+                shard["dispensed_id"][do[i] : do[i + 1]],
+                shard["dispensed_volume"][do[i] : do[i + 1]],
+            ):
+                volumes[column[int(paint_id)]] += vol
+            if volumes.sum() > 0:
+                targets.append(shard["target"][i])
+                finals.append(volumes)
+    return np.array(targets).reshape(-1, 3), _proportions(
+        np.array(finals).reshape(-1, len(ids))
+    )
+
+
+def train(
+    palette: List[Dict[str, Any]],
+    palette_latent: np.ndarray,
+    ridge: float = DEFAULT_RIDGE,
+    since: Optional[datetime.datetime] = None,
+) -> RecipeModel:
+    """
+    Fit the correction for `palette` from the recorded sessions.
+
+    :param palette:        依 id 排序的 palette，順序與 palette_latent 欄位一致
+    :param palette_latent: (m×n) palette latent 矩陣
+    :param ridge:          L2 正則化強度
+    :param since:          只使用此時間之後開始的 session
+    :raises ValueError:    符合的 session 少於 MIN_SAMPLES
+    """
+    targets, finals = _training_set(palette, since and since.timestamp())
+    if len(targets) < MIN_SAMPLES:
+        raise ValueError(
+            f"Need at least {MIN_SAMPLES} converged sessions with this palette, "
+            f"found {len(targets)}."
+        )
+
+    targets_latent = targets_to_latent(targets)
+    props = _proportions(solve_ratios(palette_latent, targets_latent))
+    X = _features(props, targets_latent)
+    Y = finals - props
+    reg = ridge * np.eye(X.shape[1])
+    reg[-1, -1] = 0.0  # 截距不做正則化
+    inv = np.linalg.inv(X.T @ X + reg)
+    W = inv @ X.T @ Y
+
+    # ridge 的 leave-one-out 殘差：r_i / (1 − h_ii)
+    hat = np.einsum("ij,jk,ik->i", X, inv, X)
+    loo = (Y - X @ W) / (1.0 - hat)[:, None]
+    baseline_rmse = float(np.sqrt(np.mean(np.square(Y))))
+    loo_rmse = float(np.sqrt(np.mean(np.square(loo))))
+    meta = {
+        "trained_at": datetime.datetime.now().isoformat(),
+        "samples": int(len(targets)),
+        "ridge": float(ridge),
+        "baseline_rmse": baseline_rmse,
+        "loo_rmse": loo_rmse,
+        "enabled": loo_rmse < baseline_rmse,
+    }
+    return RecipeModel([c["id"] for c in palette], [c["rgb"] for c in palette], W, meta)
+
+
+def set_model(model: RecipeModel) -> None:
+    """Persist the model and serve it from now on."""
+    global _model, _loaded
+    model.save()
+    _model, _loaded = model, True
@@ -0,0 +1,94 @@
+# core/services/sampler.py
+import asyncio
+from typing import List, Optional, Set
+
+import core.services.hw_client as hw_client
+from core.config import settings
+
+
+class SensorSampler:
+    """
+    Single background reader of the agent's color sensor with fan-out.
+
+    只要有訂閱者，就以固定頻率向 agent 讀取一次顏色，並推送到每個訂閱者各自的
+    bounded queue；queue 已滿 (客戶端太慢) 時丟棄最舊的一筆，只保留最新讀值。
+    最新讀值同時供 GET /color 與混色迴圈在夠新時直接重用。
+    """
+
+    def __init__(
+        self, rate_hz: float, queue_size: int = 1, agent_url: Optional[str] = None
+    ):
+        self.interval = 1.0 / rate_hz
+        self.agent_url = agent_url  # None = 預設 agent (每個工作站各有一個 sampler)
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._latest: Optional[List[int]] = None
+        self._latest_at = float("-inf")  # loop.time() of the latest reading
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a subscriber queue, starting the sampler task if needed."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """Remove a subscriber queue, stopping the sampler when none are left."""
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def get_color(self, max_age: Optional[float] = None) -> Optional[List[int]]:
+        """
+        Return the latest reading if it is at most `max_age` seconds old,
+        otherwise read the sensor once (and publish that reading).
+        """
+        max_age = settings.sensor_max_age if max_age is None else max_age
+        now = asyncio.get_running_loop().time()
+        if self._latest is not None and now - self._latest_at <= max_age:
+            return self._latest
+        return await self._read()
+
+    async def close(self) -> None:
+        """Stop the sampler task and drop all subscribers."""
+        task, self._task = self._task, None
+        self._subscribers.clear()
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _read(self) -> Optional[List[int]]:
+        with hw_client.use_agent(self.agent_url):
+            payload = await hw_client.get_color()
+        if payload is None:
+            return None
+        self._latest = payload
+        self._latest_at = asyncio.get_running_loop().time()
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()  # 丟棄過時的讀值
+            queue.put_nowait(payload)
+        return payload
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                await self._read()
+            except Exception as e:
+                print(f"Sensor sampler read failed: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
+
+
+# 全域共用一個 sampler
+sensor_sampler = SensorSampler(
+    rate_hz=settings.sensor_sample_rate_hz,
+    queue_size=settings.sensor_queue_size,
+)
@@ -0,0 +1,405 @@
+# core/services/scheduler.py
+"""
+Multi-station mixing job scheduler.
+
+core 管理一組 hw_agent 工作站 (settings.stations)，混色請求以工作 (Job) 的形式
+送入佇列，由每個工作站各自的 worker 取出執行，因此吞吐量隨工作站數線性成長。
+
+排程規則：
+- 優先權 (priority) 高者先執行 (嚴格優先)。
+- 同一優先權內依提交者 (client) 輪流 (round-robin)，單一 client 大量提交
+  不會讓其他 client 餓死；同一 client 的工作則依提交順序 (FIFO)。
+
+每個工作在執行時以 hw_client.use_agent() 指向其工作站，並使用該工作站專屬的
+SensorSampler，狀態與報告寫入 Job 本身 (見 mix.start_mix)。
+
+工作在提交、開始與結束時寫入 SQLite (core/services/job_store.py)。core 重新
+啟動後，尚未開始的工作依原順序重新排入佇列；重啟時正在執行的工作因杯中
+已有顏料，不會自動重跑，而是標記為 error。
+"""
+import asyncio
+import datetime
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from fastapi import FastAPI
+
+import core.services.hw_client as hw_client
+import core.services.job_store as job_store
+import core.services.mix as mix_service
+from core.config import settings
+from core.services.job_store import FINAL_STATES
+from core.services.sampler import SensorSampler, sensor_sampler
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat()
+
+
+def parse_stations(spec: str) -> "OrderedDict[str, str]":
+    """
+    Parse settings.stations ("name=url,url,...") into {name: base_url}.
+
+    未命名的項目依序命名為 station-0、station-1 …；空字串代表只有預設 agent。
+    """
+    stations: "OrderedDict[str, str]" = OrderedDict()
+    for i, item in enumerate(x.strip() for x in spec.split(",")):
+        if not item:
+            continue
+        name, sep, url = item.partition("=")
+        if not sep:
+            name, url = f"station-{i}", item
+        name, url = name.strip(), url.strip().rstrip("/")
+        if name in stations:
+            raise ValueError(f"Duplicate station name: {name}")
+        stations[name] = url
+    if not stations:
+        stations["default"] = settings.hw_agent_base_url.rstrip("/")
+    return stations
+
+
+@dataclass(eq=False)
+class Job:
+    """A queued or running mixing session (also the status holder of start_mix)."""
+
+    id: str
+    target: List[int]
+    controller: Optional[str] = None
+    priority: int = 0
+    client: str = "default"
+    status_state: str = "queued"
+    status_message: str = "Job queued."
+    timestamp: str = field(default_factory=_now)
+    submitted_at: str = field(default_factory=_now)
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    station: Optional[str] = None
+    last_mix_report: Optional[Dict[str, Any]] = None
+    status_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        # mix._set_state 更新狀態後 notify_all()，供 /ws/jobs/{id} 推播
+        self.status_changed = asyncio.Condition(self.status_lock)
+
+    @classmethod
+    def from_record(cls, data: Dict[str, Any]) -> "Job":
+        """Rebuild a job from its job_store record."""
+        return cls(
+            id=data["id"],
+            target=data["target"],
+            controller=data.get("controller"),
+            priority=data.get("priority", 0),
+            client=data.get("client", "default"),
+            status_state=data["state"],
+            status_message=data.get("message") or "",
+            timestamp=data["timestamp"],
+            submitted_at=data["submitted_at"],
+            started_at=data.get("started_at"),
+            finished_at=data.get("finished_at"),
+            station=data.get("station"),
+            last_mix_report=data.get("report"),
+        )
+
+    def to_record(self) -> Dict[str, Any]:
+        """to_dict() plus the full mix report, as stored in job_store."""
+        return {**self.to_dict(), "report": self.last_mix_report}
+
+    def to_dict(self) -> Dict[str, Any]:
+        report = self.last_mix_report or {}
+        return {
+            "id": self.id,
+            "target": self.target,
+            "controller": self.controller,
+            "priority": self.priority,
+            "client": self.client,
+            "state": self.status_state,
+            "message": self.status_message,
+            "timestamp": self.timestamp,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "station": self.station,
+            "converged": report.get("converged"),
+            "total_volume": report.get("total_volume"),
+            "iterations": len(report.get("iterations", [])),
+        }
+
+
+@dataclass(eq=False)
+class Station:
+    """One hardware agent and the bookkeeping of the job it is running."""
+
+    name: str
+    base_url: str
+    sampler: SensorSampler
+    job: Optional[Job] = None
+    manual: bool = False  # 被 /mix、/dose 等手動操作佔用中
+    completed: int = 0
+
+    @property
+    def busy(self) -> bool:
+        return self.manual or self.job is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "busy": self.busy,
+            "job": self.job.id if self.job is not None else None,
+            "completed": self.completed,
+        }
+
+
+class Scheduler:
+    """Priority + per-client round-robin job queue over a pool of stations."""
+
+    def __init__(self, stations: Dict[str, str], history_size: int = 1000):
+        self.stations: List[Station] = []
+        for name, url in stations.items():
+            # 預設 agent 與 /color、/ws/color 共用同一個 sampler
+            if url == settings.hw_agent_base_url.rstrip("/"):
+                sampler = sensor_sampler
+            else:
+                sampler = SensorSampler(
+                    rate_hz=settings.sensor_sample_rate_hz,
+                    queue_size=settings.sensor_queue_size,
+                    agent_url=url,
+                )
+            self.stations.append(Station(name, url, sampler))
+        self.history_size = history_size
+        # priority → OrderedDict[client → deque[Job]]
+        self._queues: Dict[int, "OrderedDict[str, Deque[Job]]"] = {}
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._cond: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._app: Optional[FastAPI] = None
+        self._background: Set[asyncio.Task] = set()
+
+    # ---- lifecycle --------------------------------------------------------- #
+    async def start(self, app: FastAPI) -> None:
+        """Recover persisted jobs and start one worker task per station."""
+        self._app = app
+        self._cond = asyncio.Condition()
+        job_store.open_store()
+        for data in job_store.unfinished():
+            job = Job.from_record(data)
+            self._jobs[job.id] = job
+            if job.status_state == "queued":
+                self._enqueue(job)
+            else:
+                job.finished_at = _now()
+                job.status_state = "error"
+                job.status_message = "Interrupted by a core restart."
+                job_store.save(job.to_record())
+        if self._jobs:
+            print(f"Recovered {self.queued()} queued job(s) from {job_store.db_path()}")
+        self._workers = [
+            asyncio.create_task(self._worker(station)) for station in self.stations
+        ]
+
+    async def stop(self) -> None:
+        """Cancel running jobs and stop all workers."""
+        for station in self.stations:
+            if station.job is not None and station.job.task is not None:
+                station.job.task.cancel()
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for station in self.stations:
+            if station.sampler is not sensor_sampler:
+                await station.sampler.close()
+        job_store.close()
+
+    # ---- queries ----------------------------------------------------------- #
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job by ID; jobs dropped from memory are loaded from job_store."""
+        job = self._jobs.get(job_id)
+        if job is None and (data := job_store.get(job_id)) is not None:
+            job = Job.from_record(data)
+        return job
+
+    def jobs(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    def queued(self) -> int:
+        return sum(
+            len(q) for by_client in self._queues.values() for q in by_client.values()
+        )
+
+    def station_for(self, base_url: str) -> Optional[Station]:
+        """The station served by the agent at `base_url`, if it is in the pool."""
+        base_url = base_url.rstrip("/")
+        for station in self.stations:
+            if station.base_url == base_url:
+                return station
+        return None
+
+    # ---- mutations --------------------------------------------------------- #
+    async def submit(
+        self,
+        target: List[int],
+        controller: Optional[str] = None,
+        priority: int = 0,
+        client: str = "default",
+    ) -> Job:
+        """Queue a mixing job and wake up an idle station."""
+        job = Job(
+            id=uuid.uuid4().hex,
+            target=list(target),
+            controller=controller,
+            priority=priority,
+            client=client,
+        )
+        self._jobs[job.id] = job
+        job_store.save(job.to_record())
+        async with self._cond:
+            self._enqueue(job)
+            self._cond.notify()
+        self._trim_history()
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Remove a queued job, or cancel (and halt the pumps of) a running one."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status_state in FINAL_STATES:
+            return job
+        # 與 _worker 的 _pop() + 建立 task 在同一把鎖內判斷，工作不會處於
+        # 「已離開佇列但尚無 task」的狀態
+        async with self._cond:
+            task = job.task
+            if task is None:
+                by_client = self._queues.get(job.priority, {})
+                queue = by_client.get(job.client)
+                if queue is not None and job in queue:
+                    queue.remove(job)
+                    if not queue:
+                        del by_client[job.client]
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            return job
+        await self._finish(job, "cancelled", "Job cancelled before it started.")
+        return job
+
+    async def reserve(self, station: Station) -> bool:
+        """Mark an idle station as manually in use; False if it is busy."""
+        async with self._cond:
+            if station.busy:
+                return False
+            station.manual = True
+            return True
+
+    async def release(self, station: Station) -> None:
+        """Hand a manually used station back to the scheduler."""
+        station.manual = False
+        await self._wake_workers()
+
+    def release_when_done(self, station: Station, task: asyncio.Task) -> None:
+        """Release `station` once `task` ends (even if cancelled before starting)."""
+
+        def _done(_: asyncio.Task) -> None:
+            station.manual = False  # 立即生效，下一個 /mix 不會誤判為忙碌
+            waking = asyncio.get_running_loop().create_task(self._wake_workers())
+            self._background.add(waking)
+            waking.add_done_callback(self._background.discard)
+
+        task.add_done_callback(_done)
+
+    # ---- internals --------------------------------------------------------- #
+    async def _wake_workers(self) -> None:
+        async with self._cond:
+            self._cond.notify_all()
+
+    def _enqueue(self, job: Job) -> None:
+        by_client = self._queues.setdefault(job.priority, OrderedDict())
+        by_client.setdefault(job.client, deque()).append(job)
+
+    def _pop(self) -> Optional[Job]:
+        """Next job: highest priority first, round-robin across clients."""
+        for priority in sorted(self._queues, reverse=True):
+            by_client = self._queues[priority]
+            if not by_client:
+                continue
+            client, queue = next(iter(by_client.items()))
+            job = queue.popleft()
+            if queue:
+                by_client.move_to_end(client)  # 輪到下一個 client
+            else:
+                del by_client[client]
+            return job
+        return None
+
+    async def _worker(self, station: Station) -> None:
+        while True:
+            async with self._cond:
+                while station.manual or (job := self._pop()) is None:
+                    await self._cond.wait()
+                station.job = job
+                self._start(station, job)
+            try:
+                await self._run(job)
+            except Exception as e:
+                # 單一工作失敗 (例如 job_store 寫入錯誤) 不能讓這個工作站停擺
+                print(f"Job {job.id} on {station.name} failed: {e!r}")
+            finally:
+                async with self._cond:
+                    station.job = None
+                    station.completed += 1
+                    self._cond.notify_all()
+
+    def _start(self, station: Station, job: Job) -> None:
+        """Attach the job's task (called with self._cond held, right after _pop())."""
+        job.station = station.name
+        job.started_at = _now()
+        with hw_client.use_agent(station.base_url):
+            job.task = asyncio.create_task(self._execute(station, job))
+
+    async def _execute(self, station: Station, job: Job) -> None:
+        await mix_service._set_state(job, "running", f"Assigned to {station.name}.")
+        job_store.save(job.to_record())
+        await mix_service.start_mix(
+            self._app, job.target, job.controller, job=job, sampler=station.sampler
+        )
+
+    async def _run(self, job: Job) -> None:
+        """Wait for the job's task and record how it ended."""
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise  # worker 本身被取消 (關機)，工作留待重啟後標記為中斷
+            await self._finish(job, "cancelled", "Job cancelled.")
+        except Exception as e:
+            # start_mix 的 try 之外 (或 _execute 中) 拋出的錯誤
+            print(f"Error during mixing: {e}")
+            await self._finish(job, "error", f"Error during mixing: {e}")
+        else:
+            await self._finish(job, job.status_state, job.status_message)
+
+    async def _finish(self, job: Job, state: str, message: str) -> None:
+        job.finished_at = _now()
+        job.task = None
+        await mix_service._set_state(job, state, message)
+        job_store.save(job.to_record())
+
+    def _trim_history(self) -> None:
+        excess = len(self._jobs) - self.history_size
+        if excess <= 0:
+            return
+        for job_id in [
+            j.id for j in self._jobs.values() if j.status_state in FINAL_STATES
+        ][:excess]:
+            del self._jobs[job_id]
+
+
+# 全域共用一個 scheduler
+scheduler = Scheduler(
+    parse_stations(settings.stations), history_size=settings.job_history_size
+)
@@ -0,0 +1,105 @@
+# core/services/status_feed.py
+"""
+Versioned, change-only status stream behind /ws/status.
+
+mix._set_state() (以及 POST /mix) 每次更新 app.state 的狀態時呼叫
+publish()：版本號加一、保存一份快照，並立即喚醒所有等待中的訂閱者。
+/ws/status 只送出與該客戶端上一次收到的快照不同的欄位 (delta)，
+閒置時每 settings.status_heartbeat 秒送一次 heartbeat。訊息格式：
+
+    {"type": "snapshot", "epoch": "…", "version": 7, "state": …, "message": …, "timestamp": …}
+    {"type": "delta", "version": 8, "state": "running", "message": "…", "timestamp": "…"}
+    {"type": "heartbeat", "version": 8}
+
+客戶端重新連線時以 ?since=<version>&epoch=<epoch> 接續：該版本仍在歷史中
+則依序補送其後的每個 delta (例如只停留 3 秒的 finished 也不會漏掉)，否則
+(core 重啟過或落後太多) 改送一份完整快照。
+"""
+import asyncio
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+HISTORY_SIZE = 128  # 保留的版本數，供重新連線的客戶端補送
+
+Snapshot = Dict[str, Any]
+
+
+class StatusFeed:
+    """Observable status: a version counter, recent snapshots and a change event."""
+
+    def __init__(self, history: int = HISTORY_SIZE):
+        # 每次啟動不同，版本號只在同一 epoch 內有意義
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.snapshot: Snapshot = {}
+        self._history: deque = deque(maxlen=history)  # (version, snapshot)
+        self._changed = asyncio.Event()
+
+    def publish(self, state: Any, message: str, timestamp: Optional[str]) -> int:
+        """Record a new status, wake every subscriber and return its version."""
+        self.version += 1
+        self.snapshot = {
+            "state": getattr(state, "value", state),  # State enum 或字串
+            "message": message,
+            "timestamp": timestamp,
+        }
+        self._history.append((self.version, self.snapshot))
+        self._changed.set()
+        self._changed = asyncio.Event()
+        return self.version
+
+    def resume(
+        self, version: int, epoch: Optional[str]
+    ) -> Optional[Tuple[Snapshot, List[Tuple[int, Snapshot]]]]:
+        """
+        (snapshot at `version`, later (version, snapshot) pairs) for a client
+        resuming from `version`, or None when it needs a full snapshot.
+        """
+        if epoch != self.epoch or not self._history:
+            return None
+        first = self._history[0][0]
+        if not first <= version <= self.version:
+            return None
+        base = self._history[version - first][1]  # 版本號連續
+        return base, self.changes(version)
+
+    def changes(self, version: int) -> List[Tuple[int, Snapshot]]:
+        """(version, snapshot) pairs published after `version` that are still kept."""
+        if version >= self.version:
+            return []
+        count = min(self.version - version, len(self._history))
+        return list(self._history)[-count:]
+
+    def lost(self, version: int) -> bool:
+        """True if versions after `version` have already left the history."""
+        return bool(self._history) and self._history[0][0] > version + 1
+
+    async def wait(self, version: int, timeout: float) -> bool:
+        """Wait until a version newer than `version` exists; False on timeout."""
+        if self.version > version:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ---- messages ---------------------------------------------------------- #
+    def snapshot_message(self) -> Dict[str, Any]:
+        return {
+            "type": "snapshot",
+            "epoch": self.epoch,
+            "version": self.version,
+            **self.snapshot,
+        }
+
+
+def delta_message(version: int, old: Snapshot, new: Snapshot) -> Dict[str, Any]:
+    """Fields of `new` that differ from `old`."""
+    changed = {k: v for k, v in new.items() if old.get(k) != v}
+    return {"type": "delta", "version": version, **changed}
+
+
+def heartbeat_message(version: int) -> Dict[str, Any]:
+    return {"type": "heartbeat", "version": version}
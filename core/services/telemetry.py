@@ -0,0 +1,353 @@
+# core/services/telemetry.py
+"""
+Mix session telemetry recorder.
+
+每次混色結束時 start_mix() 把 session 報告 (app.state.last_mix_report 的內容)
+交給 record()；背景執行緒將報告累積後以欄式 (columnar) 格式寫成不可變的
+NumPy .npz shard (settings.telemetry_dir，預設 core/data/telemetry)：
+
+- session 欄位 (每個 session 一列)：session, station, controller, state,
+  started_at, target, converged, iterations, final_error, total_volume,
+  duration, setup_<phase>
+- iteration 欄位 (每次迭代一列，it_session 指向同一 shard 中的 session 列)：
+  it_session, it_index, it_rgb, it_delta, it_error, it_volume, it_<phase>
+- 長度不固定的清單 (palette、初始配方、最終出料量、每次迭代的加料配方)
+  以 <name>_offsets + 攤平的欄位儲存 (CSR 格式)。
+
+寫入一律在背景執行緒，event loop 只做 queue.put_nowait()。shard 滿
+settings.telemetry_shard_size 個 session 或超過 settings.telemetry_flush_interval
+秒未寫入時寫檔 (暫存檔 + os.replace)。stats() 讀取所有 shard 中需要的欄位
+(已讀過的 shard 不會變動，結果快取於記憶體) 加上尚未寫入的 session，
+回傳收斂統計。
+"""
+import datetime
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import mixbox
+import numpy as np
+
+from core.config import settings
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+SHARD_GLOB = "mix-*.npz"
+
+SETUP_PHASES = ("palette_fetch", "latent", "nnls", "dose")
+ITERATION_PHASES = ("status_wait", "sensor_read", "latent", "nnls", "dose")
+ERROR_CURVE_LENGTH = 20  # error_by_iteration 最多回傳的迭代數
+
+# stats() 需要的欄位；其餘欄位 (配方、latent 差值…) 供離線分析 / 模型訓練使用
+_STATS_COLUMNS = (
+    "controller",
+    "state",
+    "started_at",
+    "converged",
+    "iterations",
+    "final_error",
+    "total_volume",
+    "duration",
+    "it_session",
+    "it_index",
+    "it_error",
+)
+
+_queue: "queue.Queue[Optional[dict]]" = queue.Queue()
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()  # 保護 _pending 與 _shard_cache
+_pending: List[dict] = []  # 已收到、尚未寫入 shard 的報告
+_shard_cache: Dict[str, Dict[str, np.ndarray]] = {}
+_dropped = 0
+
+
+def telemetry_dir() -> Path:
+    """Directory of the telemetry shards."""
+    if settings.telemetry_dir is not None:
+        return Path(settings.telemetry_dir)
+    return DATA_DIR / "telemetry"
+
+
+# --------------------------------------------------------------------------- #
+# Report → columns
+# --------------------------------------------------------------------------- #
+def _ragged(groups: Sequence[Sequence[dict]], prefix: str, fields: dict) -> dict:
+    """CSR-encode a list of lists of dicts: offsets + one flat array per field."""
+    lengths = [len(g) for g in groups]
+    columns = {f"{prefix}_offsets": np.cumsum([0] + lengths).astype(np.int32)}
+    for field, dtype in fields.items():
+        values = [item[field] for g in groups for item in g]
+        columns[f"{prefix}_{field}"] = np.array(values, dtype=dtype)
+    if not any(lengths) and "rgb" in fields:
+        columns[f"{prefix}_rgb"] = np.zeros((0, 3), dtype=fields["rgb"])
+    return columns
+
+
+def _timestamp(iso: Optional[str]) -> float:
+    try:
+        return datetime.datetime.fromisoformat(iso).timestamp()
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _columns(reports: Sequence[dict]) -> Dict[str, np.ndarray]:
+    """Convert mix reports into the columnar shard layout."""
+    iters = [r.get("iterations") or [] for r in reports]
+    flat = [it for its in iters for it in its]
+    nan = float("nan")
+    columns = {
+        "session": np.array([r["session"] for r in reports], dtype=str),
+        "station": np.array([r.get("station") or "" for r in reports], dtype=str),
+        "controller": np.array([r.get("controller", "") for r in reports], dtype=str),
+        "state": np.array([r.get("state", "") for r in reports], dtype=str),
+        "started_at": np.array([_timestamp(r.get("started_at")) for r in reports]),
+        "target": np.array([r["target"] for r in reports], dtype=np.int16).reshape(
+            -1, 3
+        ),
+        "converged": np.array([bool(r.get("converged")) for r in reports]),
+        "iterations": np.array([len(its) for its in iters], dtype=np.int32),
+        "final_error": np.array(
+            [its[-1]["error"] if its else nan for its in iters], dtype=np.float32
+        ),
+        "total_volume": np.array(
+            [r.get("total_volume") or 0.0 for r in reports], dtype=np.float32
+        ),
+        "duration": np.array(
+            [r.get("duration") or nan for r in reports], dtype=np.float32
+        ),
+        # iterations
+        "it_session": np.repeat(
+            np.arange(len(reports), dtype=np.int32), [len(its) for its in iters]
+        ),
+        "it_index": np.array(
+            [i for its in iters for i in range(len(its))], dtype=np.int16
+        ),
+        "it_rgb": np.array([it["rgb"] for it in flat], dtype=np.int16).reshape(-1, 3),
+        "it_delta": np.array(
+            [it["delta_latent"] for it in flat], dtype=np.float32
+        ).reshape(-1, mixbox.LATENT_SIZE),
+        "it_error": np.array([it["error"] for it in flat], dtype=np.float32),
+        "it_volume": np.array([it["volume"] for it in flat], dtype=np.float32),
+    }
+    for phase in SETUP_PHASES:
+        columns[f"setup_{phase}"] = np.array(
+            [(r.get("setup") or {}).get(phase, 0.0) for r in reports], dtype=np.float32
+        )
+    for phase in ITERATION_PHASES:
+        columns[f"it_{phase}"] = np.array(
+            [it["timings"].get(phase, 0.0) for it in flat], dtype=np.float32
+        )
+    recipe = {"id": np.int32, "volume": np.float32}
+    columns.update(
+        _ragged(
+            [r.get("palette") or [] for r in reports],
+            "palette",
+            {"id": np.int32, "rgb": np.int16},
+        )
+    )
+    columns.update(
+        _ragged([r.get("initial_recipe") or [] for r in reports], "initial", recipe)
+    )
+    columns.update(
+        _ragged([r.get("dispensed") or [] for r in reports], "dispensed", recipe)
+    )
+    columns.update(_ragged([it["recipe"] for it in flat], "it_recipe", recipe))
+    return columns
+
+
+# --------------------------------------------------------------------------- #
+# Background writer
+# --------------------------------------------------------------------------- #
+def _write_shard(reports: List[dict]) -> Path:
+    directory = telemetry_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    path = directory / f"mix-{stamp}-{len(reports)}.npz"
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:  # 傳入檔案物件，np.savez 不會另加 .npz 副檔名
+        np.savez_compressed(f, **_columns(reports))
+    os.replace(tmp, path)
+    return path
+
+
+def _flush() -> None:
+    global _pending, _dropped
+    with _lock:
+        reports = list(_pending)
+    if not reports:
+        return
+    try:
+        path = _write_shard(reports)
+        print(f"Wrote {len(reports)} mix sessions to {path}")
+    except OSError as e:
+        print(f"Failed to write mix telemetry: {e}")  # 保留在 _pending，下次再試
+        return
+    except Exception as e:
+        print(f"Dropping {len(reports)} malformed mix reports: {e}")
+        _dropped += len(reports)
+    with _lock:
+        _pending = _pending[len(reports) :]
+
+
+def _writer() -> None:
+    last_flush = time.monotonic()
+    running = True
+    while running:
+        timeout = max(
+            0.0, last_flush + settings.telemetry_flush_interval - time.monotonic()
+        )
+        try:
+            report = _queue.get(timeout=timeout)
+        except queue.Empty:
+            report = False
+        if report is None:
+            running = False  # stop()
+        elif report:
+            with _lock:
+                _pending.append(report)
+        with _lock:
+            full = len(_pending) >= settings.telemetry_shard_size
+        due = time.monotonic() - last_flush >= settings.telemetry_flush_interval
+        if full or due or not running:
+            _flush()
+            last_flush = time.monotonic()
+
+
+def start() -> None:
+    """Start the background shard writer (idempotent)."""
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_writer, name="telemetry", daemon=True)
+        _thread.start()
+
+
+def stop() -> None:
+    """Flush pending sessions and stop the writer (blocking; call via to_thread)."""
+    global _thread
+    if _thread is not None:
+        _queue.put(None)
+        _thread.join()
+        _thread = None
+
+
+def record(report: Dict[str, Any]) -> None:
+    """Queue a finished mix report for writing; never blocks (no-op if stopped)."""
+    global _dropped
+    if _thread is None:
+        return
+    if not report.get("target") or len(report["target"]) != 3:
+        _dropped += 1
+        return
+    _queue.put_nowait({**report, "session": report.get("job") or uuid.uuid4().hex})
+
+
+# --------------------------------------------------------------------------- #
+# Query
+# --------------------------------------------------------------------------- #
+def _load_shard(path: Path, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    with _lock:
+        cached = _shard_cache.setdefault(path.name, {})
+        missing = [k for k in columns if k not in cached]
+    if missing:
+        with np.load(path) as npz:  # npz 成員按需解壓，只讀需要的欄位
+            loaded = {k: npz[k] for k in missing}
+        with _lock:
+            cached.update(loaded)
+    return {k: cached[k] for k in columns}
+
+
+def load(columns: Sequence[str]) -> List[Dict[str, np.ndarray]]:
+    """
+    The given columns of every shard, plus the sessions not yet written.
+
+    :return: 每個 shard 一個 {column: ndarray}；it_session 與 <name>_offsets
+             只在同一個 shard 內有效
+    """
+    paths = sorted(telemetry_dir().glob(SHARD_GLOB))
+    shards = [_load_shard(p, columns) for p in paths]
+    with _lock:
+        pending = list(_pending)
+    if pending:
+        converted = _columns(pending)
+        shards.append({k: converted[k] for k in columns})
+    return shards
+
+
+def _summary(values: np.ndarray) -> Optional[Dict[str, float]]:
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return None
+    p50, p90 = np.percentile(values, [50, 90])
+    return {
+        "mean": float(values.mean()),
+        "p50": float(p50),
+        "p90": float(p90),
+        "max": float(values.max()),
+    }
+
+
+def stats(
+    since: Optional[datetime.datetime] = None, controller: Optional[str] = None
+) -> Dict[str, Any]:
+    """Aggregate convergence statistics over every recorded session."""
+    shards = load(_STATS_COLUMNS)
+    sel, it_sel = [], []
+    for shard in shards:
+        mask = np.ones(len(shard["controller"]), dtype=bool)
+        if since is not None:
+            mask &= shard["started_at"] >= since.timestamp()
+        if controller is not None:
+            mask &= shard["controller"] == controller
+        sel.append({k: v[mask] for k, v in shard.items() if not k.startswith("it_")})
+        it_mask = mask[shard["it_session"]]
+        it_sel.append({k: shard[k][it_mask] for k in ("it_index", "it_error")})
+
+    col = {k: np.concatenate([s[k] for s in sel]) for k in sel[0]} if sel else {}
+    n = len(col.get("controller", ()))
+    if n == 0:
+        return {"sessions": 0, "shards": len(shards), "by_controller": {}}
+
+    it_index = np.concatenate([s["it_index"] for s in it_sel]).astype(np.int64)
+    it_error = np.concatenate([s["it_error"] for s in it_sel]).astype(float)
+    keep = it_index < ERROR_CURVE_LENGTH
+    sums = np.bincount(it_index[keep], it_error[keep], ERROR_CURVE_LENGTH)
+    counts = np.bincount(it_index[keep], minlength=ERROR_CURVE_LENGTH)
+    curve = [float(s / c) for s, c in zip(sums, counts) if c]
+
+    by_controller = {}
+    for name in np.unique(col["controller"]):
+        m = col["controller"] == name
+        by_controller[str(name)] = {
+            "sessions": int(m.sum()),
+            "convergence_rate": float(col["converged"][m].mean()),
+            "iterations_mean": float(col["iterations"][m].mean()),
+        }
+    states, state_counts = np.unique(col["state"], return_counts=True)
+    return {
+        "sessions": n,
+        "shards": len(shards),
+        "converged": int(col["converged"].sum()),
+        "convergence_rate": float(col["converged"].mean()),
+        "states": {str(s): int(c) for s, c in zip(states, state_counts)},
+        "iterations": _summary(col["iterations"].astype(float)),
+        "final_error": _summary(col["final_error"].astype(float)),
+        "total_volume": _summary(col["total_volume"].astype(float)),
+        "duration": _summary(col["duration"].astype(float)),
+        "error_by_iteration": curve,
+        "by_controller": by_controller,
+    }
+
+
+def writer_stats() -> Dict[str, Any]:
+    """State of the background writer."""
+    with _lock:
+        pending = len(_pending)
+    return {
+        "running": _thread is not None and _thread.is_alive(),
+        "pending": pending + _queue.qsize(),
+        "dropped": _dropped,
+        "directory": str(telemetry_dir()),
+    }
@@ -0,0 +1,54 @@
+"""
+Fast-path JSON serialization shared by core and hw_agent.
+
+設定 FAST_RESPONSES=true 時，熱路徑端點 (GET /color、/status 與 /ws/*) 在
+邊界處自行確認資料格式後，以本模組序列化並直接回傳 Response，跳過 FastAPI
+的 response_model 驗證與 jsonable_encoder。安裝 orjson (extra "fast") 時
+使用 orjson，否則退回標準庫 json (緊湊格式)。
+"""
+
+import json
+from typing import Any
+
+from starlette.responses import Response
+from starlette.websockets import WebSocket
+
+try:
+    import orjson
+except ImportError:  # extra "fast" 未安裝
+    orjson = None
+
+__all__ = ["JSONResponse", "dumps", "send_json", "ORJSON"]
+
+ORJSON = orjson is not None
+
+
+def _default(obj: Any) -> Any:
+    # numpy 純量與陣列 (標準庫 json 不支援)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=_default)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize `obj` to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return _encoder.encode(obj).encode()
+
+
+class JSONResponse(Response):
+    """JSON response rendered with dumps(); no response_model validation."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+async def send_json(ws: WebSocket, data: Any) -> None:
+    """WebSocket.send_json() using dumps() (still a text frame)."""
+    await ws.send_text(dumps(data).decode())
@@ -0,0 +1,56 @@
+# hw_agent/config.py
+from pathlib import Path
+from typing import Literal, Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    # 硬體後端：rpi = Raspberry Pi 實機；sim = 模擬 (可在一般 Linux 上執行)
+    hw_backend: Literal["rpi", "sim"] = "rpi"
+
+    # 熱路徑端點跳過 response_model 驗證，以 fast_json (orjson) 直接序列化
+    fast_responses: bool = False
+
+    # 出料規劃 (見 hw_agent/services/dose.py 與 flow.py)
+    pump_calibration_path: Optional[Path] = (
+        None  # 預設 hw_agent/data/pump_calibration.json
+    )
+    default_flow_rate: float = 1.0  # 未校正 pump 的流量 (mL / s)
+    max_active_pumps: int = 6  # 同時開啟的 pump 數上限
+    pump_current: float = 0.5  # 每支 pump 的電流 (A)
+    pump_current_budget: float = 3.0  # 所有 pump 同時可用的總電流 (A)
+    dose_settle_time: float = 1.0  # 出料完成、攪拌停止後回到 idle 前的靜置時間 (s)
+
+    # 色彩感測器校正檔 (見 hw_agent/services/calibration.py)
+    sensor_calibration_path: Optional[Path] = (
+        None  # 預設 hw_agent/data/sensor_calibration.json，不存在時用內建值
+    )
+
+    # 色彩讀值的多次取樣 (見 hw_agent/services/color.py)
+    # ring buffer 長度 K，每筆為感測器的一個 integration 週期
+    sensor_sample_count: int = 5
+    sensor_sample_method: Literal["median", "trimmed_mean"] = "median"
+    sensor_trim_count: int = 1  # trimmed_mean 時兩端各去掉的樣本數
+
+    # pump 校正用的秤 (見 hw_agent/drivers/scale.py)
+    scale_url: str = "http://127.0.0.1:9300/weight"  # 回傳 {"grams": float} 的本機 API
+    paint_density: float = 1.0  # 顏料密度 (g / mL)
+
+    # 模擬硬體 (hw_backend = "sim")
+    sim_speedup: float = 1.0  # 模擬時間相對真實時間的倍率
+    sim_flow_rate: float = 1.0  # 模擬 pump 流量 (mL / s)
+    sim_flow_spread: float = 0.0  # 各 pump 流量的相對差異 (標準差，依 paint id 固定)
+    sim_pump_dead_time: float = 0.0  # 每次開啟後管路充滿前不出料的時間 (s)
+    sim_scale_noise: float = 0.0  # 模擬秤的讀值雜訊 (mL，標準差)
+    sim_sensor_noise: float = 0.002  # raw 讀值的相對雜訊 (標準差)
+    sim_sensor_drift: float = 0.0  # 感測器白 / 黑參考值的各通道相對漂移 (標準差)
+    sim_sensor_latency: float = 0.0  # 每次讀取在 integration time 之外的額外延遲 (s)
+
+    model_config = SettingsConfigDict(
+        env_file=Path(__file__).resolve().parent.parent / ".env",
+        env_file_encoding="utf-8",
+        extra="ignore",  # .env 與 core 共用
+    )
+
+
+settings = Settings()
@@ -1,11 +1,30 @@
+import asyncio
+import threading
 import time
-import RPi.GPIO as GPIO
-import board
-import busio
-from adafruit_tcs34725 import TCS34725
+import uuid
+from collections import deque
+from typing import List, Optional, Tuple
 
-i2c = busio.I2C(board.SCL, board.SDA)
-sensor = TCS34725(i2c)
+from hw_agent.config import settings
+import metrics
+
+SENSOR_READ_SECONDS = metrics.histogram(
+    "sensor_read_seconds",
+    "Blocking color sensor read time (one integration cycle).",
+)
+
+if settings.hw_backend == "sim":
+    from hw_agent.drivers.sim import GPIO, SimTCS34725
+
+    sensor = SimTCS34725()
+else:
+    import RPi.GPIO as GPIO
+    import board
+    import busio
+    from adafruit_tcs34725 import TCS34725
+
+    i2c = busio.I2C(board.SCL, board.SDA)
+    sensor = TCS34725(i2c)
 sensor.gain = 60
 sensor.integration_time = 100
 
@@ -14,16 +33,114 @@ LED_PIN = 17  # BCM17
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(LED_PIN, GPIO.OUT, initial=GPIO.HIGH)  # LOW＝關燈
 
+# ——— 背景讀取執行緒 ———
+# sensor.color_raw 是阻塞的 I²C 讀取 (最長一個 integration time)，
+# 因此由專屬執行緒持續讀取，並把最新一筆放在 _latest，event loop 不會被卡住。
+Frame = Tuple[int, float, Tuple[int, int, int, int]]  # (seq, timestamp, rgbc)
+FRAME_HISTORY = 256  # 保留最近的 frame 數，供 /ws/raw 串流補送
+# seq 每次 agent 啟動都從 1 開始，只在同一 EPOCH 內可比較
+EPOCH = uuid.uuid4().hex[:12]
+
+_lock = threading.Lock()
+_latest: Optional[Frame] = None
+_history: deque = deque(maxlen=FRAME_HISTORY)
+_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _wake(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+def _publish(rgbc: Tuple[int, int, int, int]) -> None:
+    global _latest, _waiters
+    with _lock:
+        seq = _latest[0] + 1 if _latest is not None else 1
+        _latest = (seq, time.time(), rgbc)
+        _history.append(_latest)
+        waiters, _waiters = _waiters, []
+    for loop, fut in waiters:
+        try:
+            loop.call_soon_threadsafe(_wake, fut)
+        except RuntimeError:
+            pass  # event loop 已關閉
+
+
+def _worker() -> None:
+    while not _stop.is_set():
+        try:
+            with SENSOR_READ_SECONDS.time():
+                r, g, b, c = sensor.color_raw
+        except Exception as e:
+            print(f"Color sensor read failed: {e}")
+            _stop.wait(sensor.integration_time / 1000)
+            continue
+        _publish((r, g, b, c))
+
+
+def startSensor() -> None:
+    """Start the background reader thread (idempotent)."""
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        _stop.clear()
+        _thread = threading.Thread(target=_worker, name="colorsensor", daemon=True)
+        _thread.start()
+
+
+def stopSensor() -> None:
+    """Stop the background reader thread."""
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=1.0)
+        _thread = None
+
+
+def latestFrame() -> Optional[Frame]:
+    """Most recent (seq, timestamp, rgbc) frame, without waiting."""
+    return _latest
+
+
+def framesSince(after_seq: int) -> List[Frame]:
+    """Buffered frames whose seq is greater than after_seq (oldest first)."""
+    with _lock:
+        if _latest is None:
+            return []
+        # seq 連續遞增，因此只需取 deque 尾端的 count 個
+        count = min(_latest[0] - after_seq, len(_history))
+        if count <= 0:
+            return []
+        return list(_history)[-count:]
+
+
+async def nextFrame(after_seq: int = 0) -> Frame:
+    """Wait for (and return) the first frame whose seq is greater than after_seq."""
+    startSensor()
+    loop = asyncio.get_running_loop()
+    while True:
+        with _lock:
+            frame = _latest
+            if frame is not None and frame[0] > after_seq:
+                return frame
+            fut = loop.create_future()
+            _waiters.append((loop, fut))
+        await fut
+
 
 async def readSensorRawRGB():
-    r, g, b, c = sensor.color_raw
+    frame = _latest
+    if frame is None:
+        frame = await nextFrame()
+    r, g, b, c = frame[2]
     return r, g, b, c
 
 
 def main():
     try:
         while True:
-            raw = readSensorRawRGB()
+            raw = sensor.color_raw
             print(f"Raw RGBC: {raw}")
             time.sleep(1)
     except KeyboardInterrupt:
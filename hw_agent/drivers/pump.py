@@ -1,6 +1,14 @@
-import RPi.GPIO as GPIO
 import asyncio
-from time import time
+from time import perf_counter
+
+from hw_agent.config import settings
+import metrics
+
+if settings.hw_backend == "sim":
+    from hw_agent.drivers import sim
+    from hw_agent.drivers.sim import GPIO
+else:
+    import RPi.GPIO as GPIO
 
 pump_index = [17, 22, None, 23, 24, 27]  # GPIO pins for pumps
 pump_real_pin = [11, 15, None, 16, 18, 13]  # Real GPIO pins for pumps
@@ -10,6 +18,13 @@ motor_on = False  # Active LOW
 
 pump_on = [False for _ in range(6)]  # Active LOW
 
+PUMP_ON_SECONDS = metrics.histogram(
+    "pump_on_seconds",
+    "Measured pump on-time in hardware seconds, by pump (paint id).",
+    ("pump",),
+    (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+
 GPIO.setmode(GPIO.BCM)
 for pin in pump_index:
     if pin is not None:
@@ -19,19 +34,45 @@ for pin in pump_index:
 GPIO.setup(motor_index, GPIO.OUT)
 GPIO.output(motor_index, GPIO.HIGH)  # Set motor to OFF initially
 
+if settings.hw_backend == "sim":
+    sim.bind_pumps({pin: i + 1 for i, pin in enumerate(pump_index) if pin is not None})
+
+
+def wallSeconds(seconds):
+    """Real time taken by `seconds` of hardware time (compressed in sim)."""
+    if settings.hw_backend == "sim":
+        return seconds / settings.sim_speedup
+    return seconds
 
-async def startPump(index, time):
-    print("Started", index, time)
 
-    # 底下 motor
-    GPIO.output(motor_index, GPIO.LOW)
+async def holdFor(seconds):
+    """Sleep for `seconds` of hardware time (compressed by SIM_SPEEDUP in sim)."""
+    if settings.hw_backend == "sim":
+        await sim.sleep(seconds)
+    else:
+        await asyncio.sleep(seconds)
+
+
+def setMotor(on):
+    """Turn the mixer motor under the cup on or off."""
     global motor_on
-    motor_on = True
+    GPIO.output(motor_index, GPIO.LOW if on else GPIO.HIGH)
+    motor_on = bool(on)
+
+
+async def startPump(index, time):
+    """Run pump `index` (1-based) for `time` seconds; the motor is not touched."""
+    print("Started", index, time)
 
     index = int(index) - 1  # Convert to zero-based index
     GPIO.output(pump_index[index], GPIO.LOW)
     pump_on[index] = True
-    await asyncio.sleep(time)
+    started = perf_counter()
+    try:
+        await holdFor(time)
+    finally:  # 被取消時也記錄實際開啟時間 (GPIO 由 haltPumpAll 關閉)
+        elapsed = perf_counter() - started
+        PUMP_ON_SECONDS.labels(index + 1).observe(elapsed / wallSeconds(1.0))
     GPIO.output(pump_index[index], GPIO.HIGH)
     pump_on[index] = False
 
@@ -0,0 +1,22 @@
+import httpx
+
+from hw_agent.config import settings
+
+if settings.hw_backend == "sim":
+    from hw_agent.drivers import sim
+
+
+async def readScale():
+    """
+    Read the volume (mL) currently on the scale used for pump calibration.
+
+    實機以 settings.scale_url 的本機 API 讀取 (回傳 {"grams": float})，
+    再以 settings.paint_density 換算成 mL；模擬模式則回傳模擬杯中的總體積。
+    """
+    if settings.hw_backend == "sim":
+        return sim.scale_volume()
+
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        response = await client.get(settings.scale_url)
+        response.raise_for_status()
+        return float(response.json()["grams"]) / settings.paint_density
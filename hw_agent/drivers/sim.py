@@ -0,0 +1,196 @@
+"""
+Simulated hardware used when HW_BACKEND=sim (no Raspberry Pi required).
+
+- GPIO：取代 RPi.GPIO，記錄每支 pump 的開啟時間並換算成已出料體積 (mL)；
+  可用 SIM_FLOW_SPREAD / SIM_PUMP_DEAD_TIME 讓各 pump 流量不同並有 dead time，
+  以模擬需要校正的實機。
+- scale_volume()：pump 校正用的秤，回傳杯中總體積。
+- SimTCS34725：取代 adafruit_tcs34725.TCS34725，回傳「已出料顏料以 mixbox
+  混合後」的顏色所對應的 raw RGBC，並加上可設定的雜訊與延遲。感測器的實際
+  響應為出廠校正值加上 SIM_SENSOR_DRIFT 的各通道漂移；set_reference() 可在
+  感測器前放白 / 黑參考色卡，供 /calibration/white、/calibration/black 使用。
+- 時間可用 SIM_SPEEDUP 壓縮：pump 開啟時間、感測器 integration time 與
+  agent 的狀態停留時間都會除以 SIM_SPEEDUP，出料體積則依模擬時間計算。
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Literal, Optional
+
+import mixbox
+import numpy as np
+
+from hw_agent.config import settings
+
+# 白紙 (空杯) 的實測 raw RGBC，見 note.txt
+EMPTY_RAW = (4274, 5397, 4253, 14754)
+
+_lock = threading.Lock()
+_pump_pins: Dict[int, int] = {}  # GPIO pin → paint id
+_on_since: Dict[int, float] = {}  # pin → 開啟時的模擬時間
+_dispensed: Dict[int, float] = {}  # paint id → 累積出料 (mL)
+_reference: Optional[str] = None  # 感測器前的參考色卡 ("white" / "black")
+_response = None  # 感測器實際響應 (calibration.Calibration)，見 sensor_response()
+
+
+def now() -> float:
+    """Simulated monotonic clock (seconds), running SIM_SPEEDUP times faster."""
+    return time.monotonic() * settings.sim_speedup
+
+
+async def sleep(seconds: float) -> None:
+    """asyncio.sleep for `seconds` of simulated time."""
+    await asyncio.sleep(seconds / settings.sim_speedup)
+
+
+# --------------------------------------------------------------------------- #
+# Pumps
+# --------------------------------------------------------------------------- #
+class _SimGPIO:
+    """Minimal RPi.GPIO replacement; pumps are active LOW like the real board."""
+
+    BCM = "BCM"
+    OUT = "OUT"
+    HIGH = 1
+    LOW = 0
+
+    def setmode(self, mode) -> None:
+        pass
+
+    def setup(self, pin: int, mode, initial: Optional[int] = None) -> None:
+        if initial is not None:
+            self.output(pin, initial)
+
+    def output(self, pin: int, value: int) -> None:
+        with _lock:
+            if pin not in _pump_pins:
+                return  # motor / LED
+            if value == self.LOW:
+                _on_since.setdefault(pin, now())
+            elif pin in _on_since:
+                _accumulate(pin, now() - _on_since.pop(pin))
+
+    def cleanup(self) -> None:
+        pass
+
+
+GPIO = _SimGPIO()
+
+
+def flow_rate(paint_id: int) -> float:
+    """Simulated flow (mL/s) of a pump; fixed per paint id."""
+    spread = random.Random(paint_id).gauss(0.0, 1.0) * settings.sim_flow_spread
+    return settings.sim_flow_rate * max(0.1, 1.0 + spread)
+
+
+def _volume(paint_id: int, seconds: float) -> float:
+    """Volume dispensed by one pump run of `seconds` (after the dead time)."""
+    return max(0.0, seconds - settings.sim_pump_dead_time) * flow_rate(paint_id)
+
+
+def _accumulate(pin: int, seconds: float) -> None:
+    paint_id = _pump_pins[pin]
+    _dispensed[paint_id] = _dispensed.get(paint_id, 0.0) + _volume(paint_id, seconds)
+
+
+def bind_pumps(pins: Dict[int, int]) -> None:
+    """Declare which GPIO pin drives which paint id."""
+    with _lock:
+        _pump_pins.update(pins)
+
+
+def dispensed_volumes() -> Dict[int, float]:
+    """Volume dispensed so far per paint id (mL), including running pumps."""
+    with _lock:
+        volumes = dict(_dispensed)
+        t = now()
+        for pin, since in _on_since.items():
+            paint_id = _pump_pins[pin]
+            volumes[paint_id] = volumes.get(paint_id, 0.0) + _volume(
+                paint_id, t - since
+            )
+    return volumes
+
+
+def scale_volume() -> float:
+    """Simulated scale reading: total volume in the cup (mL), with noise."""
+    total = sum(dispensed_volumes().values())
+    return total + random.gauss(0.0, settings.sim_scale_noise)
+
+
+def reset() -> None:
+    """Empty the cup: forget everything dispensed so far."""
+    with _lock:
+        _dispensed.clear()
+        for pin in _on_since:
+            _on_since[pin] = now()
+
+
+# --------------------------------------------------------------------------- #
+# Color sensor
+# --------------------------------------------------------------------------- #
+def mixed_rgb() -> Optional[tuple]:
+    """Mixbox mix of everything dispensed so far, or None if the cup is empty."""
+    from hw_agent.services.palette import get_palette
+
+    volumes = dispensed_volumes()
+    total = sum(volumes.values())
+    if total <= 0:
+        return None
+    latent = np.zeros(mixbox.LATENT_SIZE)
+    for paint in get_palette():
+        vol = volumes.get(paint["id"], 0.0)
+        if vol > 0:
+            latent += vol / total * np.array(mixbox.rgb_to_latent(paint["rgb"]))
+    return mixbox.latent_to_rgb(latent)
+
+
+def sensor_response():
+    """Actual response of the simulated sensor: factory references with drift."""
+    global _response
+    if _response is None:
+        from hw_agent.services.calibration import BLACK_REF, WHITE_REF, Calibration
+
+        rng = random.Random("sensor")  # 漂移量固定，重新啟動後仍相同
+        drift = settings.sim_sensor_drift
+        white = [v * max(0.1, 1.0 + rng.gauss(0.0, drift)) for v in WHITE_REF]
+        black = [v * max(0.1, 1.0 + rng.gauss(0.0, drift)) for v in BLACK_REF]
+        _response = Calibration(white, black)
+    return _response
+
+
+def set_reference(target: Optional[Literal["white", "black"]]) -> None:
+    """Place a white / black reference target in front of the sensor (None = cup)."""
+    global _reference
+    _reference = target
+
+
+class SimTCS34725:
+    """Drop-in stand-in for adafruit_tcs34725.TCS34725."""
+
+    def __init__(self, i2c=None):
+        self.gain = 60
+        self.integration_time = 100  # ms
+
+    def _expected_raw(self) -> tuple:
+        response = sensor_response()
+        if _reference is not None:
+            ref = response.white if _reference == "white" else response.black
+            return tuple(ref)
+        rgb = mixed_rgb()
+        if rgb is None:
+            return EMPTY_RAW
+        return tuple(response.inverse(rgb))
+
+    @property
+    def color_raw(self) -> tuple:
+        # 與實機相同：讀取會阻塞一個 integration time (再加上額外延遲)
+        delay = self.integration_time / 1000 + settings.sim_sensor_latency
+        time.sleep(delay / settings.sim_speedup)
+        noise = settings.sim_sensor_noise
+        return tuple(
+            max(0, min(65535, round(v * (1 + random.gauss(0, noise)))))
+            for v in self._expected_raw()
+        )
@@ -3,27 +3,50 @@
 from fastapi import (
     FastAPI,
     HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
 )
 
 from fastapi import status as http_status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
+from typing import Literal, Optional
 import random, datetime
 import asyncio
 
 
 from hw_agent.models import (
     RGBColorArray,
+    ColorStatsResponse,
     DoseRequest,
+    DosePlanResponse,
+    DoseResponse,
+    PumpCalibrationRequest,
+    PumpCalibrationResponse,
+    SensorCalibrationRequest,
+    SensorCalibrationResponse,
+    SensorReferenceResult,
     MessageResponse,
     PaletteResponse,
+    SimStateResponse,
     StatusResponse,
     State,
 )
+from hw_agent.config import settings
+import fast_json
+import metrics
 
 from hw_agent.services import palette as palette_service
 from hw_agent.services import dose as dose_service
 from hw_agent.services import color as color_service
+from hw_agent.services import flow as flow_service
+from hw_agent.services import pump_calibration as pump_calibration_service
+from hw_agent.services import sensor_calibration as sensor_calibration_service
+from hw_agent.services import raw_stream as raw_stream_service
+from hw_agent.services.calibration import get_calibration
+from hw_agent.drivers import pump as pump_driver
 
 
 # --------------------------------------------------------------------------- #
@@ -36,11 +59,16 @@ async def lifespan(app: FastAPI):
     app.state.status_state = State.idle
     app.state.status_message = "Hardware Agent is idle."
     app.state.status_lock = asyncio.Lock()
+    # 狀態變更時 notify_all()，供 /status?wait_for= long-poll 使用
+    app.state.status_changed = asyncio.Condition(app.state.status_lock)
     app.state.current_dose_task = None  # 用於追蹤當前 Dose 任務的 ayncio.Task
+    flow_service.load()  # pump 流量曲線 (hw_agent/data/pump_calibration.json)
+    color_service.start_sampling()
 
     yield
     # -- Shutdown Logic -- #
     print("Shutting down...")
+    await color_service.stop_sampling()
 
 
 # --------------------------------------------------------------------------- #
@@ -66,6 +94,7 @@ PRIVATE_NET_REGEX = (  # Only allow private network origins
     r"(?::\d+)?$"  # allowing :port
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[],
@@ -85,15 +114,43 @@ async def ping() -> MessageResponse:
     return {"ok": True, "message": "Agent is reachable."}
 
 
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def read_metrics():
+    """Latency histograms in Prometheus text format."""
+    return metrics.metrics_response()
+
+
 @app.get("/status", response_model=StatusResponse, tags=["health"])
-async def status() -> StatusResponse:
-    """Current runtime state of the agent."""
+async def status(
+    wait_for: Optional[State] = Query(
+        None, description="Long-poll until the agent reaches this state."
+    ),
+    timeout: float = Query(
+        10.0, ge=0, le=60, description="Maximum seconds to wait for `wait_for`."
+    ),
+) -> StatusResponse:
+    """Current runtime state of the agent, optionally long-polling for a state."""
+    if wait_for is not None:
+        async with app.state.status_changed:
+            try:
+                await asyncio.wait_for(
+                    app.state.status_changed.wait_for(
+                        lambda: app.state.status_state == wait_for
+                    ),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                pass  # 逾時則回傳當下狀態，由呼叫端判斷
+
     timestamp = datetime.datetime.now().isoformat()
     payload = {
         "state": app.state.status_state,
         "message": f"{app.state.status_message}",
         "timestamp": timestamp,
     }
+    if settings.fast_responses:
+        # 其餘欄位皆由 agent 自行產生，只需確認 state 是合法值
+        return fast_json.JSONResponse({**payload, "state": State(payload["state"])})
     return payload
 
 
@@ -105,9 +162,30 @@ async def read_color() -> RGBColorArray:
     """Read sRGB value from the color sensor (scaled 0 - 255)."""
     r, g, b = await color_service.getColor()
     payload = [r, g, b]
+    if settings.fast_responses:
+        # getColor() 回傳已四捨五入並限制在 0–255 的整數
+        return fast_json.JSONResponse(payload)
     return payload
 
 
+@app.get("/color/stats", response_model=ColorStatsResponse, tags=["sensor"])
+async def read_color_stats() -> ColorStatsResponse:
+    """Aggregated sRGB value (median / trimmed mean) plus per-channel variance."""
+    return await color_service.getColorStats()
+
+
+@app.websocket("/ws/raw")
+async def ws_raw(
+    ws: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None
+):
+    """Raw RGBC frames as packed binary (see hw_agent/services/raw_stream.py)."""
+    await ws.accept()
+    try:
+        await raw_stream_service.stream(ws, since, epoch)
+    except WebSocketDisconnect:
+        pass
+
+
 @app.get("/palette", response_model=PaletteResponse, tags=["palette"])
 async def get_palette() -> PaletteResponse:
     """Return the predefined palette used by the mixer."""
@@ -117,30 +195,143 @@ async def get_palette() -> PaletteResponse:
 # --------------------------------------------------------------------------- #
 # Mutating endpoints
 # --------------------------------------------------------------------------- #
-@app.post("/dose", response_model=StatusResponse, status_code=202, tags=["pump"])
-async def dose(req: DoseRequest) -> StatusResponse:
-    """Start a pump dosing session."""
+@app.post("/dose/plan", response_model=DosePlanResponse, tags=["pump"])
+async def plan_dose(req: DoseRequest) -> DosePlanResponse:
+    """Compute the pump schedule of a dose without running any pump."""
+    return dose_service.plan_dose(req.root)
+
+
+@app.post("/dose", response_model=DoseResponse, status_code=202, tags=["pump"])
+async def dose(req: DoseRequest) -> DoseResponse:
+    """Start a pump dosing session; the response carries the predicted finish time."""
     if app.state.current_dose_task and not app.state.current_dose_task.done():
         raise HTTPException(
             status_code=http_status.HTTP_409_CONFLICT,
             detail="A dosing session is already in progress.",
         )
 
+    plan = dose_service.plan_dose(req.root)
     async with app.state.status_lock:
         app.state.status_state = State.running
         app.state.status_message = f"Starting dosing with recipe: {req}"
         app.state.timestamp = datetime.datetime.now().isoformat()
         app.state.current_dose_task = asyncio.create_task(
-            dose_service.start_dose(app, req.root)
+            dose_service.start_dose(app, req.root, plan)
         )
-    timestamp = datetime.datetime.now().isoformat()
+        app.state.status_changed.notify_all()
+    now = datetime.datetime.now()
+    finish_at = now + datetime.timedelta(seconds=pump_driver.wallSeconds(plan["eta"]))
     return {
         "state": State.accepted,
         "message": "Dose request received.",
-        "timestamp": timestamp,
+        "timestamp": now.isoformat(),
+        "eta": plan["eta"],
+        "finish_at": finish_at.isoformat(),
+    }
+
+
+@app.get(
+    "/calibration/pumps", response_model=PumpCalibrationResponse, tags=["calibration"]
+)
+async def get_pump_calibration() -> PumpCalibrationResponse:
+    """Current pump flow curves and the result of the last calibration run."""
+    return {
+        "curves": {k: c.summary() for k, c in flow_service.all_curves().items()},
+        "last_run": pump_calibration_service.last_run,
     }
 
 
+@app.post(
+    "/calibration/pumps",
+    response_model=StatusResponse,
+    status_code=202,
+    tags=["calibration"],
+)
+async def calibrate_pumps(req: PumpCalibrationRequest) -> StatusResponse:
+    """Run each pump for several durations into the scale and fit its flow curve."""
+    if app.state.current_dose_task and not app.state.current_dose_task.done():
+        raise HTTPException(
+            status_code=http_status.HTTP_409_CONFLICT,
+            detail="A dosing session is already in progress.",
+        )
+    paint_ids = [paint["id"] for paint in palette_service.get_palette()]
+    pumps = req.pumps if req.pumps is not None else paint_ids
+    unknown = sorted(set(pumps) - set(paint_ids))
+    if unknown:
+        raise HTTPException(
+            status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown pump ids: {unknown}",
+        )
+
+    async with app.state.status_lock:
+        app.state.status_state = State.running
+        app.state.status_message = f"Starting pump calibration: {pumps}"
+        app.state.timestamp = datetime.datetime.now().isoformat()
+        app.state.current_dose_task = asyncio.create_task(
+            pump_calibration_service.start_calibration(app, pumps, req.durations)
+        )
+        app.state.status_changed.notify_all()
+    return {
+        "state": State.accepted,
+        "message": "Pump calibration started.",
+        "timestamp": datetime.datetime.now().isoformat(),
+    }
+
+
+@app.get(
+    "/calibration/sensor",
+    response_model=SensorCalibrationResponse,
+    tags=["calibration"],
+)
+async def get_sensor_calibration(
+    limit: int = Query(20, ge=0, le=1000, description="History entries to return."),
+) -> SensorCalibrationResponse:
+    """Active white / black references and the recent recalibration history."""
+    return {
+        **get_calibration().to_dict(),
+        "history": sensor_calibration_service.history(limit) if limit else [],
+    }
+
+
+async def _measure_reference(kind: str, req: SensorCalibrationRequest) -> dict:
+    if app.state.current_dose_task and not app.state.current_dose_task.done():
+        raise HTTPException(
+            status_code=http_status.HTTP_409_CONFLICT,
+            detail="A dosing session is already in progress.",
+        )
+    if sensor_calibration_service.busy():
+        raise HTTPException(
+            status_code=http_status.HTTP_409_CONFLICT,
+            detail="A sensor calibration is already in progress.",
+        )
+    try:
+        return await sensor_calibration_service.measure_reference(kind, req.samples)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+
+
+@app.post(
+    "/calibration/white", response_model=SensorReferenceResult, tags=["calibration"]
+)
+async def calibrate_white(
+    req: SensorCalibrationRequest = SensorCalibrationRequest(),
+) -> SensorReferenceResult:
+    """Measure the white reference target now in front of the sensor and apply it."""
+    return await _measure_reference("white", req)
+
+
+@app.post(
+    "/calibration/black", response_model=SensorReferenceResult, tags=["calibration"]
+)
+async def calibrate_black(
+    req: SensorCalibrationRequest = SensorCalibrationRequest(),
+) -> SensorReferenceResult:
+    """Measure the black reference (covered sensor / black target) and apply it."""
+    return await _measure_reference("black", req)
+
+
 @app.post("/stop", response_model=MessageResponse, tags=["pump"])
 async def stop() -> MessageResponse:
     """Immediately stop all pumps and reset the agent."""
@@ -155,3 +346,32 @@ async def stop() -> MessageResponse:
     await app.state.current_dose_task
 
     return {"ok": True, "message": "Stopped."}
+
+
+# --------------------------------------------------------------------------- #
+# Simulation-only endpoints
+# --------------------------------------------------------------------------- #
+if settings.hw_backend == "sim":
+    from hw_agent.drivers import sim
+
+    @app.get("/sim/state", response_model=SimStateResponse, tags=["sim"])
+    async def sim_state() -> SimStateResponse:
+        """Dispensed volumes and resulting color of the simulated cup."""
+        rgb = sim.mixed_rgb()
+        return {"dispensed": sim.dispensed_volumes(), "rgb": rgb and list(rgb)}
+
+    @app.post("/sim/reset", response_model=MessageResponse, tags=["sim"])
+    async def sim_reset() -> MessageResponse:
+        """Empty the simulated cup."""
+        sim.reset()
+        return {"ok": True, "message": "Simulated cup emptied."}
+
+    @app.post("/sim/reference", response_model=MessageResponse, tags=["sim"])
+    async def sim_reference(
+        target: Optional[Literal["white", "black"]] = Query(
+            None, description="Reference target in front of the sensor; none = cup."
+        ),
+    ) -> MessageResponse:
+        """Put a white / black reference target in front of the simulated sensor."""
+        sim.set_reference(target)
+        return {"ok": True, "message": f"Simulated sensor target: {target or 'cup'}."}
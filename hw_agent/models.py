@@ -3,9 +3,9 @@
 from __future__ import annotations
 
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel, Field, RootModel, conint, conlist
+from pydantic import BaseModel, Field, RootModel, confloat, conint, conlist
 
 
 # --------------------------------------------------------------------------- #
@@ -67,6 +67,16 @@ class StatusResponse(BaseModel):
     )
 
 
+class ColorStatsResponse(BaseModel):
+    """Color reading aggregated over the agent's sample ring buffer."""
+
+    rgb: RGBColorArray = Field(..., description="Aggregated sRGB color (0 - 255).")
+    variance: conlist(float, min_length=3, max_length=3) = Field(
+        ..., description="Per-channel variance of the aggregated samples."
+    )
+    samples: int = Field(..., description="Number of samples aggregated.")
+
+
 class PaletteResponse(RootModel[List[PaintItem]]):
     """Complete palette currently available on the agent."""
 
@@ -91,6 +101,122 @@ class DoseRequest(
     """List of colors to be mixed in one operation."""
 
 
+class DoseResponse(StatusResponse):
+    """Accepted dose request with its predicted completion time."""
+
+    eta: float = Field(
+        ..., description="Predicted pump run time of the dose (hardware seconds)."
+    )
+    finish_at: str = Field(
+        ..., description="Predicted completion time of the pumps in ISO 8601 format."
+    )
+
+
+class DosePlanStep(BaseModel):
+    """One pump run in a dose plan."""
+
+    id: int = Field(..., description="ID of the color, starting from 0.")
+    name: str = Field(..., examples=["magenta"])
+    volume: float = Field(..., description="Amount of color to inject (mL).")
+    slot: int = Field(..., description="Concurrency slot the pump runs in.")
+    start: float = Field(..., description="Start offset from the dose start (s).")
+    duration: float = Field(..., description="Pump on-time from its flow curve (s).")
+
+
+class DosePlanResponse(BaseModel):
+    """Pump schedule computed for a dose request."""
+
+    eta: float = Field(..., description="Time until all pumps finish (s).")
+    slots: int = Field(
+        ..., description="Maximum number of simultaneously active pumps."
+    )
+    steps: List[DosePlanStep]
+
+
+class PumpCalibrationRequest(BaseModel):
+    """Request to calibrate the flow of one or more pumps against the scale."""
+
+    pumps: Optional[List[int]] = Field(
+        None, description="Paint IDs of the pumps to calibrate; defaults to all."
+    )
+    durations: conlist(confloat(gt=0, le=60), min_length=2) = Field(
+        [1.0, 2.0, 4.0, 8.0], description="Pump on-times to measure (s)."
+    )
+
+
+class PumpFlowCurve(BaseModel):
+    """Calibrated on-time → volume curve of one pump."""
+
+    points: List[conlist(float, min_length=2, max_length=2)] = Field(
+        ..., description="[on_time (s), volume (mL)] points, linearly interpolated."
+    )
+    flow_rate: float = Field(..., description="Flow after the dead time (mL/s).")
+    dead_time: float = Field(..., description="On-time before paint flows (s).")
+
+
+class PumpCalibrationResult(BaseModel):
+    """Fit of one pump from the last calibration run."""
+
+    id: int = Field(..., description="Paint ID of the pump.")
+    flow_rate: float = Field(..., description="Fitted flow (mL/s).")
+    dead_time: float = Field(..., description="Fitted dead time (s).")
+    rms_error: float = Field(..., description="RMS residual of the fit (mL).")
+    samples: List[conlist(float, min_length=2, max_length=2)] = Field(
+        ..., description="Measured [on_time (s), volume (mL)] pairs."
+    )
+
+
+class PumpCalibrationResponse(BaseModel):
+    """Current pump flow curves and the result of the last calibration run."""
+
+    curves: Dict[int, PumpFlowCurve]
+    last_run: Optional[List[PumpCalibrationResult]] = None
+
+
+class SensorCalibrationRequest(BaseModel):
+    """Request to measure a white or black reference target."""
+
+    samples: conint(ge=1, le=100) = Field(
+        10, description="Number of sensor integration cycles to average."
+    )
+
+
+class SensorReferenceResult(BaseModel):
+    """One white / black reference measurement (an entry of the history)."""
+
+    timestamp: str = Field(..., description="Time of the measurement (ISO 8601).")
+    kind: str = Field(..., description='"white" or "black".')
+    reference: List[float] = Field(..., description="New raw RGBC reference.")
+    previous: List[float] = Field(..., description="Replaced raw RGBC reference.")
+    drift: List[float] = Field(
+        ..., description="Relative change per channel, (new - previous) / previous."
+    )
+    stddev: List[float] = Field(..., description="Per-channel std of the samples.")
+    samples: int = Field(..., description="Number of averaged samples.")
+
+
+class SensorCalibrationResponse(BaseModel):
+    """Active color sensor calibration and recent recalibrations."""
+
+    white: List[float] = Field(..., description="Raw RGBC of the white reference.")
+    black: List[float] = Field(..., description="Raw RGBC of the black reference.")
+    matrix: List[List[float]] = Field(..., description="3×3 color correction matrix.")
+    history: List[SensorReferenceResult] = Field(
+        [], description="Recent reference measurements, oldest first."
+    )
+
+
+class SimStateResponse(BaseModel):
+    """State of the simulated hardware (HW_BACKEND=sim only)."""
+
+    dispensed: Dict[int, float] = Field(
+        ..., description="Volume dispensed so far per paint id (mL)."
+    )
+    rgb: Optional[RGBColorArray] = Field(
+        None, description="Mixbox mix of the dispensed paints; null if empty."
+    )
+
+
 class ErrorResponse(BaseModel):
     """Generic error wrapper."""
 
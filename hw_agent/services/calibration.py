@@ -1,11 +1,48 @@
+import json
+import math
+import os
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
 import numpy as np
-from typing import Sequence, Union
+
+from ..config import settings
 
 # ——— 校正參考值 ———
 BLACK_REF = np.array([625 / 2, 807 / 2, 843 / 2, 2289 / 2], dtype=float)
 # WHITE_REF = np.array([5853, 7351, 6247, 20401], dtype=float)
 WHITE_REF = np.array([26574, 36307, 32493, 41984], dtype=float)
 
+# 量測純色值 (V) 與理想純色值 (R)，各 shape=(6,3)
+MEASURED_PRIMARIES = np.array(
+    [
+        [220, 53, 99],  # magenta
+        [201, 161, 62],  # yellow
+        [38, 95, 182],  # cerulean blue
+        [74, 150, 83],  # green
+        [83, 77, 160],  # purple
+        [210, 87, 50],  # orange
+    ],
+    dtype=float,
+)
+TARGET_PRIMARIES = np.array(
+    [
+        [204, 30, 120],  # magenta
+        [252, 230, 60],  # yellow
+        [30, 110, 180],  # cerulean blue
+        [30, 154, 23],  # green
+        [110, 40, 175],  # purple
+        [235, 168, 50],  # orange
+    ],
+    dtype=float,
+)
+
+# R = [ inverse_gamma_correction(c) for c in R ]
+
+# 3×3 校正矩陣 (只在載入時計算一次)
+CALIBRATION_MATRIX = np.linalg.pinv(MEASURED_PRIMARIES) @ TARGET_PRIMARIES
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 
 # 定義一個通用的型別別名
 ArrayLikeF = Union[Sequence[float], np.ndarray]
@@ -82,40 +119,11 @@ def calibrate_rgb(raw_rgb: ArrayLikeF) -> np.ndarray:
     :param raw_rgb: 原始感測器讀值，一維長度 3
     :return:        校正後的線性 RGB，一維長度 3，dtype float
     """
-    # 量測純色值 (V) 與理想純色值 (R)，各 shape=(6,3)
-    V = np.array(
-        [
-            [220, 53, 99],  # magenta
-            [201, 161, 62],  # yellow
-            [38, 95, 182],  # cerulean blue
-            [74, 150, 83],  # green
-            [83, 77, 160],  # purple
-            [210, 87, 50],  # orange
-        ],
-        dtype=float,
-    )
-    R = np.array(
-        [
-            [204, 30, 120],  # magenta
-            [252, 230, 60],  # yellow
-            [30, 110, 180],  # cerulean blue
-            [30, 154, 23],  # green
-            [110, 40, 175],  # purple
-            [235, 168, 50],  # orange
-        ],
-        dtype=float,
-    )
-
-    # R = [ inverse_gamma_correction(c) for c in R ]
-
-    # 計算 3×3 校正矩陣
-    M = np.linalg.pinv(V) @ R
-
     arr = np.asarray(raw_rgb, dtype=float)
     if arr.shape != (3,):
         raise ValueError(f"raw_rgb 形狀應為 (3,) ，但收到 {arr.shape}")
 
-    return arr @ M  # 回傳 float ndarray shape=(3,)
+    return arr @ CALIBRATION_MATRIX  # 回傳 float ndarray shape=(3,)
 
 
 def gamma_correction(linear_rgb: ArrayLikeF) -> np.ndarray:
@@ -139,6 +147,162 @@ def gamma_correction(linear_rgb: ArrayLikeF) -> np.ndarray:
     return np.round(srgb_255).astype(np.uint8)
 
 
+class Calibration:
+    """
+    Raw RGBC → calibrated RGB, precomputed once.
+
+    等同 clip(calibrate_rgb(remove_clear_channel(normalize(raw))), 0, 255)，
+    但白/黑參考值的倒數與校正矩陣都預先算好，單筆讀值以純 Python 純量運算
+    一次完成 (不建立任何 ndarray)，批次讀值則以 apply_batch() 向量化處理。
+    """
+
+    def __init__(
+        self,
+        white: ArrayLikeF = WHITE_REF,
+        black: ArrayLikeF = BLACK_REF,
+        matrix: Optional[ArrayLikeF] = None,
+    ):
+        self.white = np.array(white, dtype=float)
+        self.black = np.array(black, dtype=float)
+        self.matrix = np.array(
+            CALIBRATION_MATRIX if matrix is None else matrix, dtype=float
+        )
+        if self.white.shape != (4,) or self.black.shape != (4,):
+            raise ValueError(
+                f"white, black 形狀應為 (4,)，收到 {self.white.shape}, {self.black.shape}"
+            )
+        if self.matrix.shape != (3, 3):
+            raise ValueError(f"matrix 形狀應為 (3, 3)，收到 {self.matrix.shape}")
+        if np.any(self.white <= self.black):
+            raise ValueError(f"white 必須大於 black，收到 {self.white}, {self.black}")
+
+        self.inv_span = 1.0 / (self.white - self.black)
+        # 單筆路徑使用的 Python float 常數
+        self._black = self.black.tolist()
+        self._inv_span = self.inv_span.tolist()
+        self._rows = self.matrix.T.tolist()  # out[j] = Σ_i x[i] · M[i, j]
+
+    # ---- serialization ----------------------------------------------------- #
+    @classmethod
+    def from_dict(cls, data: dict) -> "Calibration":
+        return cls(data["white"], data["black"], data.get("matrix"))
+
+    def to_dict(self) -> dict:
+        return {
+            "white": self.white.tolist(),
+            "black": self.black.tolist(),
+            "matrix": self.matrix.tolist(),
+        }
+
+    # ---- transforms -------------------------------------------------------- #
+    def apply(self, raw: Sequence[float]) -> list:
+        """
+        Calibrate one raw RGBC reading.
+
+        :param raw: (r, g, b, c) 原始讀值
+        :return:    校正後 RGB，長度 3 的 float list，值域 [0, 255]
+        """
+        r, g, b, c = raw
+        bk, k = self._black, self._inv_span
+        nc = (c - bk[3]) * k[3]
+        if nc <= 0:
+            x0 = x1 = x2 = 0.0
+        else:
+            scale = 255.0 / nc
+            # remove_clear_channel 會截成 uint8，這裡以 floor 保持相同結果
+            x0 = math.floor(min(max((r - bk[0]) * k[0], 0.0) * scale, 255.0))
+            x1 = math.floor(min(max((g - bk[1]) * k[1], 0.0) * scale, 255.0))
+            x2 = math.floor(min(max((b - bk[2]) * k[2], 0.0) * scale, 255.0))
+        return [
+            min(max(m0 * x0 + m1 * x1 + m2 * x2, 0.0), 255.0)
+            for m0, m1, m2 in self._rows
+        ]
+
+    def apply_batch(
+        self, raw: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Vectorized apply() over raw samples.
+
+        :param raw: (N, 4) 原始 RGBC 讀值
+        :param out: 選用的 (N, 3) float 輸出陣列 (重複使用以免配置記憶體)
+        :return:    (N, 3) float ndarray，值域 [0, 255]
+        """
+        arr = np.asarray(raw, dtype=float)
+        if arr.ndim != 2 or arr.shape[1] != 4:
+            raise ValueError(f"raw 形狀應為 (N, 4)，但收到 {arr.shape}")
+        norm = (arr - self.black) * self.inv_span
+        np.maximum(norm, 0.0, out=norm)
+        clear = norm[:, 3:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rgb = np.multiply(norm[:, :3], 255.0 / clear, out=norm[:, :3])
+        rgb[clear[:, 0] <= 0] = 0.0
+        np.clip(rgb, 0.0, 255.0, out=rgb)
+        np.floor(rgb, out=rgb)
+        out = np.matmul(rgb, self.matrix, out=out)
+        return np.clip(out, 0.0, 255.0, out=out)
+
+    def inverse(self, rgb: ArrayLikeF) -> np.ndarray:
+        """
+        apply() 的反函數，供模擬感測器使用：給定希望 getColor() 回傳的 RGB，
+        求出對應的 raw RGBC。
+
+        :param rgb: 目標 RGB，一維長度 3，0–255
+        :return:    raw RGBC，一維長度 4，dtype int
+        """
+        arr = np.asarray(rgb, dtype=float)
+        if arr.shape != (3,):
+            raise ValueError(f"rgb 形狀應為 (3,) ，但收到 {arr.shape}")
+        rc = np.clip(arr @ np.linalg.inv(self.matrix), 0, 254)  # floor 前的 RGB
+        norm = np.append((rc + 0.5) / 255, 1.0)  # clear channel 正規化為 1
+        raw = norm * (self.white - self.black) + self.black
+        return np.round(raw).astype(int)
+
+
+# 出廠 (程式內建) 校正值，沒有校正檔時使用
+FACTORY_CALIBRATION = Calibration()
+
+_active: Optional[Calibration] = None
+
+
+def calibration_path() -> Path:
+    """Location of the sensor calibration file."""
+    if settings.sensor_calibration_path is not None:
+        return Path(settings.sensor_calibration_path)
+    return DATA_DIR / "sensor_calibration.json"
+
+
+def history_path() -> Path:
+    """Append-only log (JSON lines) of reference recalibrations."""
+    return calibration_path().with_name("sensor_calibration_history.jsonl")
+
+
+def get_calibration() -> Calibration:
+    """The active calibration, loaded once from calibration_path() if present."""
+    global _active
+    if _active is None:
+        path = calibration_path()
+        if path.exists():
+            _active = Calibration.from_dict(
+                json.loads(path.read_text(encoding="utf-8"))
+            )
+            print(f"Loaded sensor calibration from {path}")
+        else:
+            _active = FACTORY_CALIBRATION
+    return _active
+
+
+def set_calibration(cal: Calibration, path: Optional[Path] = None) -> None:
+    """Atomically write the calibration and make it active (no restart needed)."""
+    global _active
+    path = Path(path or calibration_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(cal.to_dict(), indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+    _active = cal  # 讀取端每次呼叫 get_calibration()，換掉參照即生效
+
+
 if __name__ == "__main__":
     raw = [75, 143, 84]
     rgb_lin255 = calibrate_rgb(raw)
@@ -1,19 +1,104 @@
+import asyncio
+from collections import deque
+from typing import Optional
+
 from .calibration import *
+from ..config import settings
+from ..drivers import colorsensor
 from ..drivers.colorsensor import readSensorRawRGB
 from ..models import RGBColorArray
 import numpy as np
 
+# ——— 多次取樣 (K、聚合方式見 settings.sensor_sample_*) ———
+# 最近 K 筆 raw RGBC
+_samples: deque = deque(maxlen=max(1, settings.sensor_sample_count))
+_sampler_task: Optional[asyncio.Task] = None
 
-async def getColor():
 
-    r, g, b, c = await readSensorRawRGB()
-    raw = np.array([r, g, b, c], dtype=float)
+def _aggregate(rgbs: np.ndarray) -> np.ndarray:
+    """Robust per-channel estimate over K calibrated samples, shape (K, 3)."""
+    trim = settings.sensor_trim_count
+    if settings.sensor_sample_method == "trimmed_mean" and len(rgbs) > 2 * trim:
+        ordered = np.sort(rgbs, axis=0)
+        return ordered[trim : len(rgbs) - trim].mean(axis=0)
+    return np.median(rgbs, axis=0)
+
+
+async def _sample_loop() -> None:
+    seq = 0
+    while True:
+        seq, _, rgbc = await colorsensor.nextFrame(seq)
+        _samples.append(np.array(rgbc, dtype=float))
+
+
+def start_sampling() -> None:
+    """Start the sensor thread and fill the ring buffer in the background."""
+    global _sampler_task
+    colorsensor.startSensor()
+    if _sampler_task is None or _sampler_task.done():
+        _sampler_task = asyncio.create_task(_sample_loop())
+
+
+async def stop_sampling() -> None:
+    """Stop the background sampler and sensor thread, clearing the ring buffer."""
+    global _sampler_task
+    task, _sampler_task = _sampler_task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await asyncio.to_thread(colorsensor.stopSensor)
+    _samples.clear()
+
 
-    normalized = normalize(raw)  # 0-1
-    clear_removed = remove_clear_channel(normalized)  # 0-255
-    rgb_calibrated = calibrate_rgb(clear_removed)  # 0-255
-    gammaed = gamma_correction(rgb_calibrated)  # 0-255
-    #r, g, b = np.clip(clear_removed, 0, 255)
-    r, g, b = np.clip(rgb_calibrated, 0, 255)
+async def refresh_samples() -> None:
+    """
+    Drop the buffered samples and wait until the ring buffer is refilled with
+    frames read after this call (no-op when background sampling is off).
+    """
+    if _sampler_task is None or _sampler_task.done():
+        return
+    _samples.clear()
 
-    return (round(r), round(g), round(b))
+    async def _fill() -> None:
+        seq = 0
+        while len(_samples) < _samples.maxlen:
+            seq, _, _ = await colorsensor.nextFrame(seq)
+            await asyncio.sleep(0)  # 讓 _sample_loop 先寫入這個 frame
+
+    # 感測器故障時不要讓出料流程卡住：最多等 K 個 integration 週期的兩倍
+    timeout = 2 * _samples.maxlen * colorsensor.sensor.integration_time / 1000 + 1
+    try:
+        await asyncio.wait_for(_fill(), timeout)
+    except asyncio.TimeoutError:
+        print(f"Color samples not refreshed within {timeout:.1f} s")
+
+
+async def getColorStats() -> dict:
+    """
+    Aggregate the buffered samples into one reading.
+
+    ring buffer 為空 (背景取樣尚未啟動) 時，直接讀取一次感測器。
+
+    :return: {"rgb": 校正後 RGB (int), "variance": 各通道變異數, "samples": 樣本數}
+    """
+    samples = list(_samples)
+    if not samples:
+        r, g, b, c = await readSensorRawRGB()
+        samples = [np.array([r, g, b, c], dtype=float)]
+
+    rgbs = get_calibration().apply_batch(np.array(samples))  # (K, 3)，0-255
+    rgb = _aggregate(rgbs)
+    return {
+        "rgb": [round(v) for v in rgb],
+        "variance": rgbs.var(axis=0).tolist(),
+        "samples": len(rgbs),
+    }
+
+
+async def getColor():
+    stats = await getColorStats()
+    r, g, b = stats["rgb"]
+    return (r, g, b)
@@ -1,6 +1,7 @@
 # hw_agent/services/dose.py
 
 import asyncio, datetime
+import heapq
 from fastapi import FastAPI
 from ..models import (
     RGBColorArray,
@@ -12,36 +13,104 @@ from ..models import (
     State,
 )
 
+from ..config import settings
 from ..drivers import pump as pump_driver
+from . import color as color_service
+from . import flow
 
 
-async def start_dose(app: FastAPI, recipe: list[DoseItem]) -> None:
+async def _set_state(app: FastAPI, state: str, message: str) -> None:
+    """
+    Update the agent status and wake up /status long-poll waiters.
+    """
+    async with app.state.status_changed:
+        app.state.status_state = state
+        app.state.status_message = message
+        app.state.timestamp = datetime.datetime.now().isoformat()
+        app.state.status_changed.notify_all()
+
+
+def max_active_pumps() -> int:
+    """Number of pumps that may run at once (count and current limits)."""
+    by_current = int(settings.pump_current_budget // settings.pump_current)
+    return max(1, min(settings.max_active_pumps, by_current))
+
+
+def plan_dose(recipe: list[DoseItem]) -> dict:
+    """
+    Convert a recipe into a deterministic pump schedule.
+
+    依各 pump 的流量曲線把 mL 換算成開啟秒數，再以「最長者優先」的 list
+    scheduling 分配到 max_active_pumps() 個同時開啟的名額：每個名額內依序執行，
+    名額之間並行。
+
+    :return: {"eta": 全部完成所需秒數, "slots": 名額數,
+              "steps": [{id, name, volume, slot, start, duration}, ...]} (依 start 排序)
+    """
+    slots = max_active_pumps()
+    merged = {}  # 同一支 pump 出現多次時合併，避免同時開關同一個 pin
+    for item in recipe:
+        if item.volume > 0:
+            prev = merged.get(item.id)
+            volume = item.volume + (prev.volume if prev else 0.0)
+            merged[item.id] = DoseItem(id=item.id, name=item.name, volume=volume)
+    jobs = sorted(
+        (
+            (flow.get_curve(item.id).on_time(item.volume), item)
+            for item in merged.values()
+        ),
+        key=lambda job: -job[0],
+    )
+    free_at = [(0.0, slot) for slot in range(slots)]  # (名額空出的時間, 名額)
+    steps = []
+    for duration, item in jobs:
+        start, slot = heapq.heappop(free_at)
+        steps.append(
+            {
+                "id": item.id,
+                "name": item.name,
+                "volume": item.volume,
+                "slot": slot,
+                "start": start,
+                "duration": duration,
+            }
+        )
+        heapq.heappush(free_at, (start + duration, slot))
+    steps.sort(key=lambda step: (step["start"], step["slot"]))
+    eta = max((step["start"] + step["duration"] for step in steps), default=0.0)
+    return {"eta": eta, "slots": slots, "steps": steps}
+
+
+async def _run_slot(steps: list[dict]) -> None:
+    for step in steps:
+        await pump_driver.startPump(step["id"], step["duration"])
+
+
+async def start_dose(app: FastAPI, recipe: list[DoseItem], plan: dict = None) -> None:
+    plan = plan or plan_dose(recipe)
     tasks = []
     try:
-        async with app.state.status_lock:
-            app.state.status_state = State.running
-            app.state.status_message = f"Dosing paints with recipe: {recipe}"
-            app.state.timestamp = datetime.datetime.now().isoformat()
+        await _set_state(
+            app,
+            State.running,
+            f"Dosing paints with recipe: {recipe} (ETA {plan['eta']:.1f} s)",
+        )
 
-        tasks = [
-            asyncio.create_task(pump_driver.startPump(item.id, item.volume))
-            for item in recipe
-        ]
+        # 整個出料計畫只開關一次攪拌 motor
+        pump_driver.setMotor(True)
+        by_slot = {}
+        for step in plan["steps"]:
+            by_slot.setdefault(step["slot"], []).append(step)
+        tasks = [asyncio.create_task(_run_slot(steps)) for steps in by_slot.values()]
 
         await asyncio.gather(*tasks)
         await pump_driver.haltPumpAll()
 
-        async with app.state.status_lock:
-            app.state.status_state = "finished"
-            app.state.status_message = "Dosing completed successfully"
-            app.state.timestamp = datetime.datetime.now().isoformat()
+        await _set_state(app, "finished", "Dosing completed successfully")
 
     except asyncio.CancelledError:
         print("Cancelling dosing session...")
-        async with app.state.status_lock:
-            app.state.status_state = "cancelling"
-            app.state.status_message = "Dosing session is cancelling"
-            app.state.timestamp = datetime.datetime.now().isoformat()
+        await _set_state(app, "cancelling", "Dosing session is cancelling")
 
         for t in tasks:
             if not t.done():
@@ -53,18 +122,19 @@ async def start_dose(app: FastAPI, recipe: list[DoseItem]) -> None:
 
     except Exception as e:
         print(str(e))
-        async with app.state.status_lock:
-            app.state.status_state = "error"
-            app.state.status_message = f"Error during mixing: {str(e)}"
-            app.state.timestamp = datetime.datetime.now().isoformat()
+        await _set_state(app, "error", f"Error during mixing: {str(e)}")
 
         await pump_driver.haltPumpAll()
 
     finally:
         print("Dosing session finished, resetting state")
-        await asyncio.sleep(3)  # Hold finished state for 3 seconds
+        if app.state.status_state == "finished":
+            # 等顏料靜止，並把 ring buffer 換成靜止後的讀值再回到 idle：
+            # core 在 idle 後立即讀色，讀到的就是這次出料後的穩定顏色
+            await pump_driver.holdFor(settings.dose_settle_time)
+            await color_service.refresh_samples()
+        else:
+            # 錯誤 / 取消狀態保留 3 秒供輪詢端看到
+            await pump_driver.holdFor(3)
 
-        async with app.state.status_lock:
-            app.state.status_state = "idle"
-            app.state.status_message = "Hardware Agent is idle"
-            app.state.timestamp = datetime.datetime.now().isoformat()
+        await _set_state(app, "idle", "Hardware Agent is idle")
@@ -0,0 +1,136 @@
+# hw_agent/services/flow.py
+"""
+Per-pump flow curves: pump on-time (s) ↔ dispensed volume (mL).
+
+每支 pump 以分段線性曲線 [(on_time, volume), ...] 描述，第一點通常為
+(dead_time, 0)，即 pump 開啟後管路充滿前不出料的時間；超出最後一點時沿最後
+一段的斜率外插。曲線存於 settings.pump_calibration_path
+(預設 hw_agent/data/pump_calibration.json)，格式為
+
+    {"<paint id>": {"points": [[t0, v0], [t1, v1], ...]}, ...}
+
+未校正的 pump 使用 settings.default_flow_rate (mL/s)、無 dead time 的直線。
+"""
+import bisect
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from hw_agent.config import settings
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+
+class FlowCurve:
+    """Monotonic piecewise-linear map between on-time and volume."""
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        pts = sorted((float(t), float(v)) for t, v in points)
+        if len(pts) < 2:
+            raise ValueError("流量曲線至少需要 2 個點")
+        if any(b[1] < a[1] or b[0] <= a[0] for a, b in zip(pts, pts[1:])):
+            raise ValueError(f"流量曲線必須單調遞增：{pts}")
+        if pts[-1][1] <= pts[0][1]:
+            raise ValueError(f"流量曲線的出料量沒有增加：{pts}")
+        self.points: List[Tuple[float, float]] = pts
+        self._times = [t for t, _ in pts]
+        self._volumes = [v for _, v in pts]
+
+    @classmethod
+    def linear(cls, flow_rate: float, dead_time: float = 0.0) -> "FlowCurve":
+        """Constant flow of `flow_rate` mL/s after `dead_time` seconds."""
+        return cls([(dead_time, 0.0), (dead_time + 1.0, flow_rate)])
+
+    @property
+    def dead_time(self) -> float:
+        return self.points[0][0] if self.points[0][1] <= 0 else 0.0
+
+    @property
+    def flow_rate(self) -> float:
+        """Flow (mL/s) of the last segment, also used for extrapolation."""
+        (t0, v0), (t1, v1) = self.points[-2:]
+        return (v1 - v0) / (t1 - t0)
+
+    def on_time(self, volume: float) -> float:
+        """Seconds the pump must run to dispense `volume` mL (0 for no volume)."""
+        if volume <= 0:
+            return 0.0
+        return max(0.0, self._interp(volume, self._volumes, self._times))
+
+    def volume(self, on_time: float) -> float:
+        """Volume (mL) dispensed by running the pump for `on_time` seconds."""
+        return max(0.0, self._interp(on_time, self._times, self._volumes))
+
+    @staticmethod
+    def _interp(x: float, xs: List[float], ys: List[float]) -> float:
+        i = bisect.bisect_right(xs, x) - 1
+        i = min(max(i, 0), len(xs) - 2)
+        while i > 0 and xs[i + 1] == xs[i]:
+            i -= 1  # 平坦段 (volume 相同) 時往前找斜率非零的一段
+        x0, x1, y0, y1 = xs[i], xs[i + 1], ys[i], ys[i + 1]
+        if x1 == x0:
+            return y1
+        return y0 + (x - x0) * (y1 - y0) / (x1 - x0)
+
+    def to_dict(self) -> dict:
+        return {"points": [list(p) for p in self.points]}
+
+    def summary(self) -> dict:
+        return {
+            **self.to_dict(),
+            "flow_rate": self.flow_rate,
+            "dead_time": self.dead_time,
+        }
+
+
+_curves: Optional[Dict[int, FlowCurve]] = None
+
+
+def calibration_path() -> Path:
+    """Location of the pump calibration file."""
+    if settings.pump_calibration_path is not None:
+        return Path(settings.pump_calibration_path)
+    return DATA_DIR / "pump_calibration.json"
+
+
+def load(path: Optional[Path] = None) -> Dict[int, FlowCurve]:
+    """(Re)load the calibrated flow curves from disk."""
+    global _curves
+    path = Path(path or calibration_path())
+    curves: Dict[int, FlowCurve] = {}
+    if path.exists():
+        data = json.loads(path.read_text(encoding="utf-8"))
+        curves = {int(k): FlowCurve(v["points"]) for k, v in data.items()}
+        print(f"Loaded flow curves for pumps {sorted(curves)} from {path}")
+    _curves = curves
+    return curves
+
+
+def save(curves: Dict[int, FlowCurve], path: Optional[Path] = None) -> None:
+    """Atomically write the flow curves and make them current."""
+    global _curves
+    path = Path(path or calibration_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    blob = {str(k): c.to_dict() for k, c in sorted(curves.items())}
+    tmp.write_text(json.dumps(blob, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+    _curves = dict(curves)
+
+
+def all_curves() -> Dict[int, FlowCurve]:
+    """Copy of the calibrated flow curves, by pump (paint) id."""
+    if _curves is None:
+        load()
+    return dict(_curves)
+
+
+def get_curve(pump_id: int) -> FlowCurve:
+    """Flow curve of a pump (default linear curve if it is not calibrated)."""
+    if _curves is None:
+        load()
+    curve = _curves.get(int(pump_id))
+    if curve is None:
+        curve = FlowCurve.linear(settings.default_flow_rate)
+    return curve
@@ -0,0 +1,109 @@
+# hw_agent/services/pump_calibration.py
+"""
+Pump flow-rate calibration.
+
+對每支 pump 依序以數個開啟時間出料，出料前後讀取秤 (drivers/scale.py) 求得
+每次的出料量，再以最小平方擬合
+
+    volume = flow_rate · (on_time − dead_time)
+
+結果以 flow.FlowCurve 存入 pump_calibration.json (與 palette.json 同目錄)，
+之後的出料計畫 (dose.plan_dose) 立即改用新曲線。
+"""
+import asyncio
+import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import FastAPI
+
+from ..drivers import pump as pump_driver
+from ..drivers import scale as scale_driver
+from ..models import State
+from . import flow
+from .dose import _set_state
+
+DEFAULT_DURATIONS = (1.0, 2.0, 4.0, 8.0)  # 每支 pump 的出料時間 (s)
+SETTLE_TIME = 1.0  # 出料後等待秤讀值穩定的時間 (s)
+MIN_SAMPLE_VOLUME = 0.05  # 低於此量 (仍在 dead time 內) 的樣本不參與擬合 (mL)
+
+last_run: Optional[List[dict]] = None  # 最近一次校正的結果
+
+
+def fit_curve(samples: Sequence[Tuple[float, float]]) -> Tuple[flow.FlowCurve, dict]:
+    """
+    Least-squares fit of a linear flow model with dead time.
+
+    :param samples: [(on_time, volume), ...]
+    :return: (FlowCurve, {"flow_rate", "dead_time", "rms_error"})
+    """
+    usable = [(t, v) for t, v in samples if v >= MIN_SAMPLE_VOLUME]
+    if len({t for t, _ in usable}) < 2:
+        raise ValueError(f"有效樣本不足，無法擬合流量：{list(samples)}")
+    t, v = np.array(usable, dtype=float).T
+    (rate, offset), *_ = np.linalg.lstsq(
+        np.column_stack([t, np.ones_like(t)]), v, rcond=None
+    )
+    if rate <= 0:
+        raise ValueError(f"擬合出的流量非正值 ({rate:.4f} mL/s)：{list(samples)}")
+    dead_time = max(0.0, -offset / rate)
+    curve = flow.FlowCurve.linear(rate, dead_time)
+    residuals = [curve.volume(x) - y for x, y in samples]
+    return curve, {
+        "flow_rate": float(rate),
+        "dead_time": float(dead_time),
+        "rms_error": float(np.sqrt(np.mean(np.square(residuals)))),
+    }
+
+
+async def calibrate_pump(
+    pump_id: int, durations: Sequence[float] = DEFAULT_DURATIONS
+) -> Tuple[flow.FlowCurve, dict]:
+    """Run one pump for each duration, weigh the output and fit its flow curve."""
+    samples = []
+    for duration in durations:
+        before = await scale_driver.readScale()
+        await pump_driver.startPump(pump_id, duration)
+        await pump_driver.holdFor(SETTLE_TIME)
+        after = await scale_driver.readScale()
+        samples.append((float(duration), float(after - before)))
+        print(f"Pump {pump_id}: {duration} s → {after - before:.3f} mL")
+    curve, stats = fit_curve(samples)
+    return curve, {"id": int(pump_id), **stats, "samples": samples}
+
+
+async def start_calibration(
+    app: FastAPI, pump_ids: List[int], durations: Sequence[float]
+) -> None:
+    """Calibrate the given pumps in turn (runs as the agent's current dose task)."""
+    global last_run
+    try:
+        curves: Dict[int, flow.FlowCurve] = flow.all_curves()
+        results = []
+        for pump_id in pump_ids:
+            await _set_state(app, State.running, f"Calibrating pump {pump_id}")
+            curve, result = await calibrate_pump(pump_id, durations)
+            curves[pump_id] = curve
+            results.append(result)
+
+        flow.save(curves)
+        last_run = results
+        await _set_state(
+            app,
+            "finished",
+            f"Calibrated pumps {pump_ids} at {datetime.datetime.now().isoformat()}",
+        )
+
+    except asyncio.CancelledError:
+        print("Cancelling pump calibration...")
+        await _set_state(app, "cancelling", "Pump calibration is cancelling")
+        await pump_driver.haltPumpAll()
+
+    except Exception as e:
+        print(str(e))
+        await _set_state(app, "error", f"Error during pump calibration: {str(e)}")
+        await pump_driver.haltPumpAll()
+
+    finally:
+        await pump_driver.holdFor(3)  # Hold finished state for 3 seconds
+        await _set_state(app, "idle", "Hardware Agent is idle")
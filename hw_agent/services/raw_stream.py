@@ -0,0 +1,84 @@
+# hw_agent/services/raw_stream.py
+"""
+Binary stream of raw RGBC sensor frames (WebSocket /ws/raw).
+
+連線後先送一則 JSON 文字訊息 (hello)，說明格式、感測器設定與目前的校正值；
+之後每則 binary 訊息包含一或多個緊密排列的 frame，每個 frame 為
+little-endian packed struct (20 bytes)：
+
+    uint32 seq | float64 timestamp (unix s) | uint16 r, g, b, c
+
+seq 由感測器執行緒每完成一次讀取遞增 1，接收端可由 seq 的間隔得知遺漏的
+frame。接收端跟不上時，下一則訊息一次帶上所有累積的 frame (最多
+colorsensor.FRAME_HISTORY 個)；重新連線時以 ?since=<最後的 seq>&epoch=<epoch>
+接續。seq 只在 hello 的 epoch 內有意義 (agent 重啟後從 1 重新計數)：epoch 不同
+或 since 大於目前最新的 seq 時忽略 since，從最新的 frame 開始。
+校正值改變 (白 / 黑參考重新校正) 時會再送一次 hello。
+"""
+import struct
+from typing import List, Optional
+
+from fastapi import WebSocket
+
+from ..drivers import colorsensor
+from .calibration import get_calibration
+
+PROTOCOL_VERSION = 1
+FRAME_STRUCT = struct.Struct("<Id4H")
+FRAME_FIELDS = ["seq", "timestamp", "r", "g", "b", "c"]
+
+
+def hello() -> dict:
+    """Stream header: frame layout, sensor settings and active calibration."""
+    return {
+        "protocol": "rgbc-frames",
+        "version": PROTOCOL_VERSION,
+        "epoch": colorsensor.EPOCH,
+        "format": FRAME_STRUCT.format,
+        "frame_size": FRAME_STRUCT.size,
+        "fields": FRAME_FIELDS,
+        "integration_time_ms": colorsensor.sensor.integration_time,
+        "gain": colorsensor.sensor.gain,
+        "calibration": get_calibration().to_dict(),
+    }
+
+
+def pack(frames: List[colorsensor.Frame]) -> bytes:
+    """Pack frames back to back into one binary message."""
+    size = FRAME_STRUCT.size
+    buf = bytearray(size * len(frames))
+    for i, (seq, timestamp, rgbc) in enumerate(frames):
+        FRAME_STRUCT.pack_into(buf, i * size, seq & 0xFFFFFFFF, timestamp, *rgbc)
+    return bytes(buf)
+
+
+async def stream(
+    ws: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None
+) -> None:
+    """
+    Send frames to an accepted WebSocket until it disconnects.
+
+    :param since: 從 seq 大於此值的 frame 開始 (仍在歷史中者會補送)；
+                  None 表示從目前最新的一個 frame 開始
+    :param epoch: since 所屬的 epoch；與目前的 epoch 不同時忽略 since
+    """
+    colorsensor.startSensor()
+    calibration = get_calibration()
+    await ws.send_json(hello())
+    latest = colorsensor.latestFrame()
+    latest_seq = latest[0] if latest is not None else 0
+    if (
+        since is None
+        or since > latest_seq
+        or (epoch is not None and epoch != colorsensor.EPOCH)
+    ):
+        since = max(0, latest_seq - 1)  # agent 重啟過：從最新的 frame 開始
+    seq = since
+    while True:
+        frame = await colorsensor.nextFrame(seq)
+        if get_calibration() is not calibration:
+            calibration = get_calibration()
+            await ws.send_json(hello())
+        frames = colorsensor.framesSince(seq) or [frame]
+        await ws.send_bytes(pack(frames))
+        seq = frames[-1][0]
@@ -0,0 +1,98 @@
+# hw_agent/services/sensor_calibration.py
+"""
+White / black reference recalibration of the color sensor.
+
+操作者將白色 (或黑色) 參考色卡放在感測器前，measure_reference() 取連續數個
+新的 integration 週期求平均，取代目前校正中的 white (或 black) 參考值。
+新的校正值經 calibration.set_calibration() 原子性寫入 sensor_calibration.json
+並立即生效；每次校正另外附加一列到 sensor_calibration_history.jsonl，
+記錄新舊參考值與各通道的相對變化，以便追蹤感測器漂移。
+"""
+import asyncio
+import datetime
+import json
+from typing import List, Literal
+
+import numpy as np
+
+from ..drivers import colorsensor
+from . import calibration
+
+DEFAULT_SAMPLES = 10  # 每次校正平均的 integration 週期數
+SATURATION = 0.98 * 65535  # 超過此值視為飽和 (白卡太亮或 gain 太高)
+
+Reference = Literal["white", "black"]
+
+_lock = asyncio.Lock()
+
+
+def busy() -> bool:
+    """True while a reference measurement is running."""
+    return _lock.locked()
+
+
+async def _read_frames(samples: int) -> np.ndarray:
+    """`samples` consecutive fresh raw RGBC frames, shape (samples, 4)."""
+    # 第一個新 frame 可能在參考色卡放好之前就開始 integration，捨棄不用
+    seq, _, _ = await colorsensor.nextFrame((colorsensor.latestFrame() or (0,))[0])
+    frames = []
+    for _ in range(samples):
+        seq, _, rgbc = await colorsensor.nextFrame(seq)
+        frames.append(rgbc)
+    return np.array(frames, dtype=float)
+
+
+def history(limit: int = 20) -> List[dict]:
+    """Most recent recalibrations, oldest first."""
+    path = calibration.history_path()
+    if not path.exists():
+        return []
+    lines = path.read_text(encoding="utf-8").splitlines()
+    return [json.loads(line) for line in lines[-limit:] if line.strip()]
+
+
+def _append_history(entry: dict) -> None:
+    path = calibration.history_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+async def measure_reference(kind: Reference, samples: int = DEFAULT_SAMPLES) -> dict:
+    """
+    Measure a white or black reference target and hot-swap the calibration.
+
+    :param kind:    "white" 或 "black"
+    :param samples: 平均的 frame 數
+    :return:        寫入歷史紀錄的項目
+    :raises ValueError: 讀值飽和，或新的 white 未大於 black
+    """
+    async with _lock:
+        frames = await _read_frames(samples)
+        reference = frames.mean(axis=0)
+        if kind == "white" and np.any(reference >= SATURATION):
+            raise ValueError(f"白色參考值飽和：{reference.round(1).tolist()}")
+
+        current = calibration.get_calibration()
+        previous = current.white if kind == "white" else current.black
+        white = reference if kind == "white" else current.white
+        black = reference if kind == "black" else current.black
+        cal = calibration.Calibration(
+            white, black, current.matrix
+        )  # 驗證 white > black
+
+        calibration.set_calibration(cal)
+        entry = {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "kind": kind,
+            "reference": reference.tolist(),
+            "previous": previous.tolist(),
+            "drift": np.divide(
+                reference - previous, previous, out=np.zeros(4), where=previous != 0
+            ).tolist(),
+            "stddev": frames.std(axis=0).tolist(),
+            "samples": samples,
+        }
+        _append_history(entry)
+        print(f"Sensor {kind} reference: {previous.tolist()} → {reference.tolist()}")
+        return entry
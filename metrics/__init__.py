@@ -0,0 +1,40 @@
+"""
+Low-overhead instrumentation shared by core and hw_agent.
+
+Histograms are kept in process memory and served at ``/metrics`` in the
+Prometheus text format (see metrics.asgi)::
+
+    NNLS_SECONDS = metrics.histogram("nnls_solve_seconds", "...", ("kind",))
+    with NNLS_SECONDS.time("initial"):
+        ...
+"""
+
+from .histogram import (
+    CONTENT_TYPE,
+    LATENCY_BUCKETS,
+    REGISTRY,
+    Histogram,
+    Registry,
+    Series,
+    Timer,
+    histogram,
+    render,
+    timed,
+)
+from .asgi import HTTP_LATENCY, MetricsMiddleware, metrics_response
+
+__all__ = [
+    "CONTENT_TYPE",
+    "HTTP_LATENCY",
+    "LATENCY_BUCKETS",
+    "REGISTRY",
+    "Histogram",
+    "MetricsMiddleware",
+    "Registry",
+    "Series",
+    "Timer",
+    "histogram",
+    "metrics_response",
+    "render",
+    "timed",
+]
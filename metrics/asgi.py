@@ -0,0 +1,52 @@
+# metrics/asgi.py
+import time
+
+from starlette.responses import Response
+
+from .histogram import CONTENT_TYPE, histogram, render
+
+HTTP_LATENCY = histogram(
+    "http_request_duration_seconds",
+    "Time spent handling HTTP requests, by route template.",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording HTTP handler latency into HTTP_LATENCY.
+
+    route 使用 FastAPI 比對到的路徑樣板 (例如 /jobs/{job_id})，避免每個 id 產生
+    一條 series；未比對到任何路由的請求記為 "unmatched"。WebSocket 不記錄。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status,
+            ).observe(time.perf_counter() - start)
+
+
+def metrics_response() -> Response:
+    """Response serving the default registry in Prometheus text format."""
+    return Response(render(), media_type=CONTENT_TYPE)
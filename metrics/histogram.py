@@ -0,0 +1,217 @@
+# metrics/histogram.py
+import asyncio
+import bisect
+import functools
+import math
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# --------------------------------------------------------------------------- #
+# Prometheus-style histograms
+# --------------------------------------------------------------------------- #
+# 熱路徑上只做一次 dict 查找 (labels) 與一次 bisect，不取鎖：
+# 每條 series 在實務上只由單一執行緒 (event loop 或感測器執行緒) 更新，
+# 多執行緒同時更新同一條 series 時極少數觀測值可能遺失，對統計影響可忽略。
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Series:
+    """Bucket counts, sum and count of one label combination."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最後一格為 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "Timer":
+        """Context manager observing the wall time (s) spent inside the block."""
+        return Timer(self)
+
+
+class Timer:
+    """`with series.time():` — a plain class, cheaper than @contextmanager."""
+
+    __slots__ = ("series", "start")
+
+    def __init__(self, series: Series):
+        self.series = series
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.series.observe(time.perf_counter() - self.start)
+
+
+class Histogram:
+    """A histogram metric with optional labels."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        bounds = sorted(float(b) for b in buckets if not math.isinf(b))
+        if not bounds:
+            raise ValueError(f"Histogram {name} needs at least one finite bucket")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(bounds)
+        self._series: Dict[Tuple[str, ...], Series] = {}
+
+    def labels(self, *values) -> Series:
+        """Series of the given label values (in labelnames order)."""
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} expects labels {self.labelnames}, got {values}"
+                )
+            series = self._series.setdefault(
+                tuple(str(v) for v in values), Series(self.bounds)
+            )
+            self._series[values] = series
+        return series
+
+    def observe(self, value: float, *labels) -> None:
+        self.labels(*labels).observe(value)
+
+    def time(self, *labels) -> Timer:
+        return Timer(self.labels(*labels))
+
+    def collect(self) -> List[str]:
+        """Prometheus text exposition lines of this histogram."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        seen = set()
+        for values, series in list(self._series.items()):
+            if id(series) in seen:
+                continue  # 以原始型別與字串查找的別名指向同一條 series
+            seen.add(id(series))
+            base = [f'{k}="{_escape(str(v))}"' for k, v in zip(self.labelnames, values)]
+            cumulative = 0
+            for bound, n in zip(self.bounds + (math.inf,), list(series.counts)):
+                cumulative += n
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                labels = ",".join(base + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{labels}}} {cumulative}")
+            suffix = "{" + ",".join(base) + "}" if base else ""
+            lines.append(f"{self.name}_sum{suffix} {series.sum!r}")
+            lines.append(f"{self.name}_count{suffix} {series.count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+class Registry:
+    """Named collection of histograms rendered together at /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Histogram] = {}
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        """Get or create a histogram (core 與 hw_agent 同 process 時共用同名指標)."""
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Histogram(
+                name, documentation, labelnames, buckets
+            )
+        elif metric.labelnames != tuple(labelnames):
+            raise ValueError(
+                f"Metric {name} already registered with labels {metric.labelnames}"
+            )
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS,
+) -> Histogram:
+    """Get or create a histogram in the default registry."""
+    return REGISTRY.histogram(name, documentation, labelnames, buckets)
+
+
+def render() -> str:
+    """All metrics of the default registry in Prometheus text format."""
+    return REGISTRY.render()
+
+
+def timed(metric: Histogram, *labels) -> Callable:
+    """Decorator observing the run time of a (sync or async) function."""
+
+    def decorate(fn: Callable) -> Callable:
+        series: Optional[Series] = None
+
+        def get_series() -> Series:
+            nonlocal series
+            if series is None:
+                series = metric.labels(*labels)
+            return series
+
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with Timer(get_series()):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Timer(get_series()):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+
+# core.config 需要這兩個設定；測試不連線，與 .env.sample 相同即可
+os.environ.setdefault("CORE_BASE_URL", "http://localhost:8000")
+os.environ.setdefault("HW_AGENT_BASE_URL", "http://localhost:9000")
@@ -0,0 +1,47 @@
+# tests/test_scheduler.py
+import asyncio
+
+import core.services.job_store as job_store
+import core.services.mix as mix_service
+from core.services.scheduler import FINAL_STATES, Scheduler
+
+
+class FlakyScheduler(Scheduler):
+    """Jobs targeting black raise outside start_mix's error handling."""
+
+    async def _execute(self, station, job):
+        if job.target == [0, 0, 0]:
+            raise ValueError("Unknown mix controller: bogus")
+        await mix_service._set_state(job, "finished", "Mixing completed successfully")
+
+
+async def _wait_final(job, timeout: float = 2.0) -> None:
+    async def _wait():
+        async with job.status_changed:
+            await job.status_changed.wait_for(lambda: job.status_state in FINAL_STATES)
+
+    await asyncio.wait_for(_wait(), timeout)
+
+
+def test_failing_job_does_not_stall_the_queue(tmp_path):
+    async def run():
+        job_store.open_store(tmp_path / "jobs.sqlite3")
+        scheduler = FlakyScheduler({"s0": "http://127.0.0.1:1"})
+        await scheduler.start(app=None)
+        try:
+            failing = await scheduler.submit([0, 0, 0])
+            following = await scheduler.submit([10, 20, 30])
+            await _wait_final(failing)
+            await _wait_final(following)
+            assert not scheduler._workers[0].done()
+            return failing, following, job_store.get(failing.id)
+        finally:
+            await scheduler.stop()
+
+    failing, following, stored = asyncio.run(run())
+    assert failing.status_state == "error"
+    assert "Unknown mix controller" in failing.status_message
+    assert failing.finished_at is not None
+    assert stored["state"] == "error"
+    assert following.status_state == "finished"
+    assert following.station == "s0"